@@ -0,0 +1,77 @@
+"""Micro-benchmark of terrain categorization: per-call terrain.json read vs the inverted index.
+
+Run from app/api:  python benchmarks/bench_categorize.py
+"""
+import json
+import os
+import random
+import sys
+import timeit
+
+API_DIR:str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+os.chdir(API_DIR)
+
+from terrain_categories import TerrainClassifier
+
+
+def categorize_terrain_per_call(land_use_types):
+    """The original implementation, which re-reads terrain.json on every call."""
+    with open('terrain.json', 'r') as file:
+        data = json.load(file)
+        terrain_categories = data["terrain_categories"]
+
+    categorized_terrain = set()
+    for category, types in terrain_categories.items():
+        if land_use_types & set(types):
+            categorized_terrain.add(category)
+
+    return categorized_terrain
+
+
+def synthetic_overpass_elements(num_elements:int, seed:int=0) -> list[dict]:
+    """Build an Overpass-like element list: mostly untagged nodes, some tagged ways and relations."""
+    rng = random.Random(seed)
+    land_uses:list[str] = ['residential', 'forest', 'farmland', 'grass', 'water', 'industrial', 'meadow', 'retail', 'wood', 'scrub', 'parking']
+    other_tags:list[dict] = [{'highway': 'residential'}, {'building': 'yes'}, {'amenity': 'parking'}, {'name': 'Main Street'}]
+
+    elements:list[dict] = []
+    for i in range(num_elements):
+        roll:float = rng.random()
+        if roll < 0.7:
+            elements.append({'type': 'node', 'id': i, 'lat': 42.0, 'lon': -71.0})
+        elif roll < 0.9:
+            elements.append({'type': 'way', 'id': i, 'tags': dict(rng.choice(other_tags))})
+        else:
+            key:str = 'natural' if rng.random() < 0.3 else 'landuse'
+            elements.append({'type': rng.choice(['way', 'relation']), 'id': i, 'tags': {key: rng.choice(land_uses)}})
+
+    return elements
+
+
+def land_use_types(elements:list[dict]) -> set[str]:
+    """Extract land use types the same way terrain.terrain_from_elements does."""
+    types:set[str] = set()
+    for element in elements:
+        tags:dict = element.get('tags', {})
+        land_use:str|None = tags.get('landuse') or tags.get('natural')
+        if land_use:
+            types.add(land_use)
+    return types
+
+
+if __name__ == '__main__':
+    classifier = TerrainClassifier('terrain.json')
+
+    # A busy urban/rural fringe returns a few hundred elements per 100 m query
+    responses:list[set[str]] = [land_use_types(synthetic_overpass_elements(400, seed)) for seed in range(165)]
+    assert all(categorize_terrain_per_call(t) == classifier.classify(t) for t in responses)
+
+    number:int = 20
+    per_call:float = timeit.timeit(lambda: [categorize_terrain_per_call(t) for t in responses], number=number) / number
+    indexed:float = timeit.timeit(lambda: [classifier.classify(t) for t in responses], number=number) / number
+
+    print(f'Categorizing {len(responses)} responses (one submission):')
+    print(f'  per-call file read: {per_call * 1e3:8.3f} ms  ({per_call / len(responses) * 1e6:8.2f} us/call)')
+    print(f'  inverted index:     {indexed * 1e3:8.3f} ms  ({indexed / len(responses) * 1e6:8.2f} us/call)')
+    print(f'  speedup:            {per_call / indexed:8.1f}x')
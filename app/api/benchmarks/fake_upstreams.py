@@ -0,0 +1,369 @@
+"""Local stand-ins for the upstream services, for load tests that must not touch the real ones.
+
+Each fake serves realistic payloads (Overpass elements, OpenWeather 3-hourly forecasts, Nominatim
+reverse geocodes and OpenAI chat completions, streamed or not) after a configurable latency with
+jitter, and can inject 5xx errors and 429s with Retry-After. Every fake counts the calls it gets.
+
+Run on their own (from app/api) to point a dev server at them:
+    python benchmarks/fake_upstreams.py --port 9000          # overpass on 9000, openweather on 9001, ...
+    python benchmarks/fake_upstreams.py --set overpass.latency=2 --set openai.rate_limit=0.1
+
+or start them from code with start_fakes() (see load_test.py).
+"""
+import argparse
+import datetime as dt
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+API_DIR:str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(API_DIR, 'terrain.json'), 'r') as _file:
+    LAND_USES:list[str] = sorted({t for types in json.load(_file)['terrain_categories'].values() for t in types if t != 'Unknown'})
+
+WEATHER:list[tuple[int, str, str]] = [
+    (800, 'Clear', 'clear sky'), (801, 'Clouds', 'few clouds'), (804, 'Clouds', 'overcast clouds'),
+    (500, 'Rain', 'light rain'), (502, 'Rain', 'heavy intensity rain'), (300, 'Drizzle', 'light intensity drizzle'),
+    (211, 'Thunderstorm', 'thunderstorm'), (600, 'Snow', 'light snow'), (741, 'Fog', 'fog'), (701, 'Mist', 'mist')
+]
+COUNTRIES:list[tuple[str, str]] = [('United States', 'us'), ('Canada', 'ca'), ('Mexico', 'mx'), ('France', 'fr'), ('Germany', 'de')]
+PLAN_WORDS:list[str] = (
+    'advance along the covered route and hold at the release point until the window opens then move by bounds '
+    'while the support element overwatches from the high ground and the reserve stays ready to reinforce'
+).split()
+
+SERVICES:tuple[str, ...] = ('overpass', 'openweather', 'nominatim', 'openai')
+
+
+@dataclass
+class FaultProfile:
+    """How a fake misbehaves.
+
+    Args:
+        latency (float): mean seconds before a response starts.
+        jitter (float): standard deviation of the latency in seconds (never below zero).
+        error_rate (float): fraction of requests answered with a 500.
+        rate_limit (float): fraction of requests answered with a 429.
+        retry_after (float): Retry-After seconds sent with 429s.
+        token_delay (float): seconds between streamed chunks (OpenAI only).
+    """
+    latency:float = 0.05
+    jitter:float = 0.01
+    error_rate:float = 0.0
+    rate_limit:float = 0.0
+    retry_after:float = 1.0
+    token_delay:float = 0.01
+
+
+# Defaults roughly matching the real services
+DEFAULT_PROFILES:dict[str, FaultProfile] = {
+    'overpass': FaultProfile(latency=0.8, jitter=0.3),
+    'openweather': FaultProfile(latency=0.15, jitter=0.05),
+    'nominatim': FaultProfile(latency=0.2, jitter=0.05),
+    'openai': FaultProfile(latency=1.5, jitter=0.5, token_delay=0.01)
+}
+
+
+@dataclass
+class CallCounter:
+    """Thread-safe count of the calls a fake received, by response status."""
+    statuses:dict[int, int] = field(default_factory=dict)
+    lock:threading.Lock = field(default_factory=threading.Lock)
+
+    def add(self, status:int):
+        with self.lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            statuses:dict[int, int] = dict(self.statuses)
+        return {
+            'calls': sum(statuses.values()),
+            'rate_limited': statuses.get(429, 0),
+            'errors': sum(count for status, count in statuses.items() if status >= 500),
+            'statuses': statuses
+        }
+
+
+def seeded_random(*parts) -> random.Random:
+    """A Random seeded from its arguments, so the same place always gets the same fake data."""
+    return random.Random(hashlib.sha256(repr(parts).encode()).digest())
+
+
+# ---- Payloads ---- #
+
+def overpass_elements(lat:float, lon:float, rng:random.Random) -> list[dict]:
+    """Land use ways around a point; neighbouring points within ~1 km share their land uses, like real terrain."""
+    area:random.Random = seeded_random(round(lat, 2), round(lon, 2))
+    land_uses:list[str] = area.sample(LAND_USES, area.randint(0, 3))
+    return [
+        {
+            'type': 'way',
+            'id': rng.randint(10_000_000, 999_999_999),
+            'tags': {('natural' if land_use in ('water', 'wood', 'scrub', 'wetland', 'bay') else 'landuse'): land_use, 'source': 'survey'}
+        }
+        for land_use in land_uses
+    ]
+
+
+def overpass_payload(query:str, rng:random.Random) -> dict:
+    """Answer an Overpass query, with the per-point sample markers of batched queries (terrain.build_batch_query)."""
+    points:list[tuple[float, float]] = [(float(lat), float(lon)) for lat, lon in re.findall(r'around:\d+,([-\d.e]+),([-\d.e]+)\)', query)]
+    batched:bool = 'make sample' in query
+
+    elements:list[dict] = []
+    for idx, (lat, lon) in enumerate(points if batched else points[:1]):
+        elements.extend(overpass_elements(lat, lon, rng))
+        if batched:
+            elements.append({'type': 'sample', 'id': idx + 1, 'tags': {'idx': str(idx)}})
+
+    return {
+        'version': 0.6,
+        'generator': 'Overpass API (fake)',
+        'osm3s': {'timestamp_osm_base': dt.datetime.now(dt.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')},
+        'elements': elements
+    }
+
+
+def forecast_payload(lat:float, lon:float) -> dict:
+    """Five days of 3-hourly forecasts starting at the current 3-hour slot, like OpenWeather's /forecast."""
+    rng:random.Random = seeded_random(round(lat, 1), round(lon, 1), dt.date.today().isoformat())
+    now:dt.datetime = dt.datetime.now(dt.timezone.utc).replace(minute=0, second=0, microsecond=0)
+    start:dt.datetime = now.replace(hour=now.hour - now.hour % 3)
+
+    entries:list[dict] = []
+    for i in range(40):
+        at:dt.datetime = start + dt.timedelta(hours=3 * i)
+        code, main, description = rng.choice(WEATHER)
+        temp:float = round(rng.uniform(270, 305), 2)
+        entries.append({
+            'dt': int(at.timestamp()),
+            'main': {'temp': temp, 'feels_like': temp - 1.2, 'temp_min': temp - 0.5, 'temp_max': temp + 0.5, 'pressure': 1013,
+                     'humidity': rng.randint(30, 95)},
+            'weather': [{'id': code, 'main': main, 'description': description, 'icon': '01d'}],
+            'clouds': {'all': rng.randint(0, 100)},
+            'wind': {'speed': round(rng.uniform(0, 12), 2), 'deg': rng.randint(0, 359)},
+            'visibility': 10000,
+            'pop': round(rng.random(), 2),
+            'sys': {'pod': 'd' if 6 <= at.hour < 18 else 'n'},
+            'dt_txt': at.strftime('%Y-%m-%d %H:%M:%S')
+        })
+
+    return {'cod': '200', 'message': 0, 'cnt': len(entries), 'list': entries,
+            'city': {'id': 0, 'name': 'Fake City', 'coord': {'lat': lat, 'lon': lon}, 'timezone': 0}}
+
+
+def reverse_geocode_payload(lat:float, lon:float) -> dict:
+    """A Nominatim jsonv2 reverse geocode."""
+    rng:random.Random = seeded_random(round(lat, 1), round(lon, 1))
+    country, code = rng.choice(COUNTRIES)
+    return {
+        'place_id': rng.randint(1_000_000, 99_999_999),
+        'licence': 'Data © OpenStreetMap contributors, ODbL 1.0. https://osm.org/copyright',
+        'osm_type': 'way',
+        'osm_id': rng.randint(1_000_000, 999_999_999),
+        'lat': str(lat),
+        'lon': str(lon),
+        'category': 'highway',
+        'type': 'residential',
+        'display_name': f'Fake Road, Fake Town, {country}',
+        'address': {'road': 'Fake Road', 'town': 'Fake Town', 'state': 'Fake State', 'country': country, 'country_code': code},
+        'boundingbox': [str(lat - 0.001), str(lat + 0.001), str(lon - 0.001), str(lon + 0.001)]
+    }
+
+
+def completion_text(prompt:str, max_tokens:int) -> list[str]:
+    """The pieces of a fake HTML operations plan, about max_tokens words long."""
+    rng:random.Random = seeded_random(prompt)
+    words:list[str] = [rng.choice(PLAN_WORDS) for _ in range(max(1, max_tokens - 8))]
+    return ['<h1>', 'Operations ', 'Plan</h1>', '<p>'] + [f'{word} ' for word in words] + ['</p>']
+
+
+# ---- Servers ---- #
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """Request handler shared by the fakes; the server carries the service name, fault profile and counter."""
+
+    protocol_version = 'HTTP/1.1'   # Keep-alive, like the real services
+
+    def log_message(self, format, *args):
+        pass
+
+
+    def do_GET(self):
+        self._handle()
+
+
+    def do_POST(self):
+        self._handle()
+
+
+    def _send_json(self, status:int, payload:dict, headers:dict|None=None):
+        body:bytes = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.counter.add(status)
+
+
+    def _handle(self):
+        profile:FaultProfile = self.server.profile
+        url = urlparse(self.path)
+        query:dict = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length:int = int(self.headers.get('Content-Length') or 0)
+        body:bytes = self.rfile.read(length) if length else b''
+
+        rng:random.Random = random.Random()
+        time.sleep(max(0.0, rng.gauss(profile.latency, profile.jitter)))
+
+        roll:float = rng.random()
+        if roll < profile.rate_limit:
+            return self._send_json(429, {'error': 'rate limited'}, {'Retry-After': f'{profile.retry_after:g}'})
+        if roll < profile.rate_limit + profile.error_rate:
+            return self._send_json(500, {'error': 'injected failure'})
+
+        service:str = self.server.service
+        if service == 'overpass':
+            overpass_query:str = parse_qs(body.decode()).get('data', [''])[0] if body else query.get('data', '')
+            self._send_json(200, overpass_payload(overpass_query, rng))
+        elif service == 'openweather':
+            self._send_json(200, forecast_payload(float(query['lat']), float(query['lon'])))
+        elif service == 'nominatim':
+            self._send_json(200, reverse_geocode_payload(float(query['lat']), float(query['lon'])))
+        else:
+            self._chat_completion(json.loads(body or b'{}'))
+
+
+    def _chat_completion(self, request:dict):
+        prompt:str = ' '.join(m.get('content', '') for m in request.get('messages', []))
+        pieces:list[str] = completion_text(prompt, int(request.get('max_tokens') or 200))
+        base:dict = {'id': f'chatcmpl-{random.getrandbits(64):x}', 'created': int(time.time()), 'model': request.get('model', 'fake')}
+
+        if not request.get('stream'):
+            return self._send_json(200, {
+                **base,
+                'object': 'chat.completion',
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ''.join(pieces)}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': len(pieces), 'total_tokens': len(prompt.split()) + len(pieces)}
+            })
+
+        # Server-sent events, one chunk per piece
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send(data:str):
+            event:bytes = f'data: {data}\n\n'.encode()
+            self.wfile.write(f'{len(event):x}\r\n'.encode() + event + b'\r\n')
+            self.wfile.flush()
+
+        for i, piece in enumerate(pieces):
+            delta:dict = {'role': 'assistant', 'content': piece} if i == 0 else {'content': piece}
+            send(json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]}))
+            time.sleep(self.server.profile.token_delay)
+        send(json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}))
+        send('[DONE]')
+        self.wfile.write(b'0\r\n\r\n')
+        self.server.counter.add(200)
+
+
+class FakeServer(ThreadingHTTPServer):
+    """One fake upstream service, served from a background thread."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, service:str, host:str, port:int, profile:FaultProfile):
+        super().__init__((host, port), FakeHandler)
+        self.service:str = service
+        self.profile:FaultProfile = profile
+        self.counter:CallCounter = CallCounter()
+        self.thread:threading.Thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+    @property
+    def url(self) -> str:
+        """The URL to configure the API with for this service."""
+        return self.base_url + {
+            'overpass': '/api/interpreter',
+            'openweather': '/data/2.5/forecast',
+            'nominatim': '/reverse',
+            'openai': '/v1'
+        }[self.service]
+
+
+def start_fakes(profiles:dict[str, FaultProfile]|None=None, host:str='127.0.0.1', port:int=0) -> dict[str, FakeServer]:
+    """
+    Start one fake per service on consecutive ports from port (or on free ports if port is 0).
+
+    Returns:
+        dict[str, FakeServer]: service -> running server.
+    """
+    profiles = {**DEFAULT_PROFILES, **(profiles or {})}
+    servers:dict[str, FakeServer] = {}
+    for i, service in enumerate(SERVICES):
+        servers[service] = FakeServer(service, host, port + i if port else 0, profiles[service])
+        servers[service].thread.start()
+    return servers
+
+
+def api_environment(servers:dict[str, FakeServer]) -> dict[str, str]:
+    """Environment variables that point the API at the fakes."""
+    return {
+        'OVERPASS_URL': servers['overpass'].url,
+        'OPENWEATHER_URL': servers['openweather'].url,
+        'NOMINATIM_URL': servers['nominatim'].url,
+        'OPENAI_BASE_URL': servers['openai'].url,
+        'OPENWEATHER_API_KEY': 'fake-openweather-key'
+    }
+
+
+def parse_overrides(overrides:list[str]) -> dict[str, FaultProfile]:
+    """Turn 'service.knob=value' strings (service 'all' for every fake) into fault profiles over the defaults."""
+    profiles:dict[str, FaultProfile] = {service: FaultProfile(**vars(profile)) for service, profile in DEFAULT_PROFILES.items()}
+    for override in overrides:
+        target, value = override.split('=', 1)
+        service, knob = target.split('.', 1)
+        if knob not in FaultProfile.__dataclass_fields__:
+            raise ValueError(f'Unknown fault setting {knob!r} in {override!r}')
+        for name in (SERVICES if service == 'all' else [service]):
+            setattr(profiles[name], knob, float(value))
+    return profiles
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve fake Overpass, OpenWeather, Nominatim and OpenAI APIs.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000, help='port of the first fake, the others follow')
+    parser.add_argument('--set', action='append', default=[], metavar='SERVICE.KNOB=VALUE',
+                        help='fault setting, e.g. overpass.latency=2 or all.error_rate=0.01 (repeatable)')
+    args = parser.parse_args()
+
+    servers:dict[str, FakeServer] = start_fakes(parse_overrides(args.set), args.host, args.port)
+    for name, value in api_environment(servers).items():
+        print(f'export {name}={value}')
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for server in servers.values():
+            server.shutdown()
@@ -0,0 +1,244 @@
+"""End-to-end load test of the planning API against local stand-ins of its upstream services.
+
+Starts the fake Overpass, OpenWeather, Nominatim and OpenAI servers (fake_upstreams.py), starts
+the API in a subprocess with config pointing at them (and throwaway cache files), then submits
+random forms at a target rate for a fixed duration. Reports throughput, latency percentiles and the
+calls each upstream received per request.
+
+Arrivals are open-loop: every request has a scheduled start time and its latency is measured from
+that time, so a saturated server shows up as growing latency rather than a silently lower rate.
+
+Run from app/api:
+    python benchmarks/load_test.py --rps 5 --duration 60
+    python benchmarks/load_test.py --rps 20 --workers 4 --set overpass.latency=2 --set all.rate_limit=0.02
+    python benchmarks/load_test.py --endpoint stream --country-backend nominatim --output benchmarks/load_results.json
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+BENCH_DIR:str = os.path.dirname(os.path.abspath(__file__))
+API_DIR:str = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_upstreams import FakeServer, api_environment, parse_overrides, start_fakes
+
+
+ENDPOINTS:dict[str, str] = {
+    'submit': '/api/submit-form',
+    'stream': '/api/submit-form/stream'
+}
+
+# Region the random missions are drawn from (lat_min, lon_min, lat_max, lon_max), central Massachusetts
+REGION:tuple[float, float, float, float] = (42.0, -72.2, 42.6, -71.3)
+
+
+def random_form(rng:random.Random, region:tuple[float, float, float, float]=REGION) -> dict:
+    """A form submission between two random nearby points in the region."""
+    lat_min, lon_min, lat_max, lon_max = region
+    start:tuple[float, float] = (rng.uniform(lat_min, lat_max), rng.uniform(lon_min, lon_max))
+    end:tuple[float, float] = (start[0] + rng.uniform(-0.15, 0.15), start[1] + rng.uniform(-0.2, 0.2))
+
+    return {
+        'start-lat': f'{start[0]:.5f}',
+        'start-lon': f'{start[1]:.5f}',
+        'end-lat': f'{end[0]:.5f}',
+        'end-lon': f'{end[1]:.5f}',
+        **{vehicle: 'on' for vehicle in rng.sample(['ft', 'lv', 'hc', 'bt'], rng.randint(1, 3))},
+        'openai-api-key': 'fake-openai-key',
+        'openai-model': 'gpt-fake',
+        'personnel': str(rng.randint(4, 40)),
+        'target-time-on-obj': str(rng.randint(2, 12)),
+        'resistance': rng.choice(['low', 'medium', 'high']),
+        'strategy': rng.choice(['stealth', 'aggressive']),
+        'objective': rng.choice(['def', 'hvt', 'inf']),
+        'context': '',
+        'latest-date': (dt.date.today() + dt.timedelta(days=rng.randint(1, 4))).isoformat()
+    }
+
+
+def start_api(env:dict[str, str], port:int, workers:int, log_path:str, timeout:float=60.0) -> subprocess.Popen:
+    """Start the API in a subprocess and wait until it answers."""
+    log = open(log_path, 'w')
+    process:subprocess.Popen = subprocess.Popen(
+        [sys.executable, 'main.py'], cwd=API_DIR, stdout=log, stderr=subprocess.STDOUT,
+        env={**os.environ, **env, 'SERVER_HOST': '127.0.0.1', 'SERVER_PORT': str(port), 'SERVER_WORKERS': str(workers)}
+    )
+
+    deadline:float = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/api/get-input-params', timeout=1).ok:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+
+    stop_api(process)
+    with open(log_path, 'r') as file:
+        raise RuntimeError(f'API did not start, log tail:\n{file.read()[-2000:]}')
+
+
+def stop_api(process:subprocess.Popen):
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def send(session:requests.Session, url:str, endpoint:str, form:dict, timeout:float) -> tuple[bool, int|None]:
+    """Submit a form and read the whole response. Returns whether the plan succeeded and the HTTP status."""
+    try:
+        response:requests.Response = session.post(url, data=form, timeout=timeout, stream=endpoint == 'stream')
+        if endpoint == 'stream':
+            events:list[dict] = [json.loads(line) for line in response.iter_lines() if line]
+            ok:bool = response.ok and bool(events) and events[-1].get('event') == 'result'
+        else:
+            ok = response.ok and response.json().get('status') == 'success'
+        return ok, response.status_code
+    except (requests.RequestException, ValueError):
+        return False, None
+
+
+def run_load(base_url:str, endpoint:str, rps:float, duration:float, concurrency:int, timeout:float, seed:int,
+             poisson:bool=False) -> list[dict]:
+    """
+    Submit forms at rps for duration seconds.
+
+    Returns:
+        list[dict]: one record per request: scheduled offset, latency from the scheduled start,
+            whether it succeeded and its status.
+    """
+    rng:random.Random = random.Random(seed)
+    url:str = base_url + ENDPOINTS[endpoint]
+    sessions:threading.local = threading.local()
+    records:list[dict] = []
+    lock:threading.Lock = threading.Lock()
+
+    def task(scheduled:float, offset:float, form:dict):
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        ok, status = send(sessions.session, url, endpoint, form, timeout)
+        with lock:
+            records.append({'offset': offset, 'latency': time.perf_counter() - scheduled, 'ok': ok, 'status': status})
+
+    started:float = time.perf_counter()
+    offset:float = 0.0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while offset < duration:
+            delay:float = started + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(task, started + offset, offset, random_form(rng))
+            offset += rng.expovariate(rps) if poisson else 1 / rps
+
+    return records
+
+
+def summarize(records:list[dict], elapsed:float, upstream:dict[str, dict]) -> dict:
+    """Throughput, latency percentiles and upstream calls per request of a run."""
+    latencies:np.ndarray = np.array([r['latency'] for r in records if r['ok']])
+    succeeded:int = len(latencies)
+    statuses:dict[str, int] = {}
+    for r in records:
+        statuses[str(r['status'])] = statuses.get(str(r['status']), 0) + 1
+
+    return {
+        'requests': len(records),
+        'succeeded': succeeded,
+        'failed': len(records) - succeeded,
+        'statuses': statuses,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(succeeded / elapsed, 3) if elapsed else 0.0,
+        'latency_s': {
+            name: round(float(np.percentile(latencies, q)), 4) if succeeded else None
+            for name, q in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))
+        },
+        'upstream': {
+            service: {**counts, 'per_request': round(counts['calls'] / len(records), 3) if records else 0.0}
+            for service, counts in upstream.items()
+        }
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load-test the planning API against fake upstreams.')
+    parser.add_argument('--rps', type=float, default=2.0, help='target form submissions per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to submit for')
+    parser.add_argument('--concurrency', type=int, default=256, help='maximum requests in flight')
+    parser.add_argument('--poisson', action='store_true', help='Poisson arrivals instead of evenly spaced ones')
+    parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='submit')
+    parser.add_argument('--timeout', type=float, default=300.0, help='seconds before a request counts as failed')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random forms')
+    parser.add_argument('--port', type=int, default=8765, help='port of the API under test')
+    parser.add_argument('--workers', type=int, default=1, help='SERVER_WORKERS of the API under test')
+    parser.add_argument('--country-backend', choices=['offline', 'nominatim'], default='offline', help='COUNTRY_BACKEND of the API under test')
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE', help='extra API setting (repeatable)')
+    parser.add_argument('--set', action='append', default=[], metavar='SERVICE.KNOB=VALUE',
+                        help='fake upstream fault setting, e.g. overpass.latency=2 or all.error_rate=0.01 (repeatable)')
+    parser.add_argument('--output', help='file the summary is also written to as JSON')
+    args = parser.parse_args()
+
+    servers:dict[str, FakeServer] = start_fakes(parse_overrides(args.set))
+    work_dir:str = tempfile.mkdtemp(prefix='vthax-load-')
+    env:dict[str, str] = {
+        **api_environment(servers),
+        'COUNTRY_BACKEND': args.country_backend,
+        'TERRAIN_CACHE_PATH': os.path.join(work_dir, 'terrain_cache.sqlite'),   # Start cold, leave the real caches alone
+        'SHARED_CACHE_PATH': os.path.join(work_dir, 'shared_cache.sqlite'),
+        **dict(setting.split('=', 1) for setting in args.env)
+    }
+
+    api:subprocess.Popen = start_api(env, args.port, args.workers, os.path.join(work_dir, 'api.log'))
+    print(f'API on :{args.port} ({args.workers} workers), fakes: ' + ', '.join(f'{name} {s.base_url}' for name, s in servers.items()))
+    print(f'Submitting {args.rps:g} forms/s to {ENDPOINTS[args.endpoint]} for {args.duration:g} s...')
+
+    try:
+        before:dict[str, dict] = {name: server.counter.snapshot() for name, server in servers.items()}
+        started:float = time.perf_counter()
+        records:list[dict] = run_load(f'http://127.0.0.1:{args.port}', args.endpoint, args.rps, args.duration, args.concurrency,
+                                      args.timeout, args.seed, args.poisson)
+        elapsed:float = time.perf_counter() - started
+        after:dict[str, dict] = {name: server.counter.snapshot() for name, server in servers.items()}
+    finally:
+        stop_api(api)
+        for server in servers.values():
+            server.shutdown()
+
+    upstream:dict[str, dict] = {
+        name: {key: after[name][key] - before[name][key] for key in ('calls', 'rate_limited', 'errors')} for name in servers
+    }
+    summary:dict = {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        **summarize(records, elapsed, upstream)
+    }
+
+    latency:dict = summary['latency_s']
+    print(f'\n{summary["succeeded"]}/{summary["requests"]} succeeded in {summary["elapsed_s"]:.1f} s, {summary["throughput_rps"]:.2f} plans/s')
+    if summary['succeeded']:
+        print('latency  ' + '  '.join(f'{name} {latency[name] * 1e3:,.0f} ms' for name in ('p50', 'p95', 'p99', 'max')))
+    print(f'statuses {summary["statuses"]}')
+    for name, counts in summary['upstream'].items():
+        print(f'{name:12s} {counts["calls"]:7d} calls  {counts["per_request"]:7.2f}/request  {counts["rate_limited"]:5d} 429s  {counts["errors"]:5d} 5xx')
+    print(f'API log: {os.path.join(work_dir, "api.log")}')
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(summary, file, indent=4)
+        print(f'Wrote {args.output}')
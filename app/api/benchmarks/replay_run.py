@@ -0,0 +1,132 @@
+"""Rerun a recorded form submission through the planning pipeline, deterministically.
+
+Start the API with REPLAY_MODE=record and every form submission is written to an archive in
+REPLAY_DIR (replays/ by default): the form with its RNG seed, the time it ran at, the settings
+that shape it, every Overpass, OpenWeather, Nominatim and OpenAI response with its latency, and
+the result. This script loads an archive, answers the pipeline's upstream calls from it with the
+original latency or none, and checks that every run reproduces the recorded result, so a real
+request can be profiled or compared before and after a change without upstream drift.
+
+Run from app/api:
+    python benchmarks/replay_run.py replays/20261018-101500-123456-3735928559.json.gz
+    python benchmarks/replay_run.py replays/<archive>.json.gz --latency zero --repeat 20
+    python benchmarks/replay_run.py replays/<archive>.json.gz --latency zero --profile replay.prof
+"""
+import argparse
+import cProfile
+import gzip
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR:str = os.path.dirname(os.path.abspath(__file__))
+API_DIR:str = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, API_DIR)
+
+
+def read_archive(path:str) -> dict:
+    """Read an archive (as replay.load_archive does, which can't be imported before configure)."""
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def setting_value(value) -> str:
+    """A setting as the environment variable config reads it from."""
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return str(value)
+
+
+def configure(archive:dict, latency:str):
+    """Point config at the settings of the recording, before the API modules are imported."""
+    os.environ.update({name: setting_value(value) for name, value in archive.get('settings', {}).items()})
+    os.environ.update({
+        'REPLAY_MODE': '',              # Don't record the replays
+        'TERRAIN_CACHE_ENABLED': '0',   # Replayed requests skip the caches anyway, don't open them
+        'SHARED_CACHE_ENABLED': '0',
+        'PRELOAD_IMPORTS': '0'
+    })
+    if latency == 'zero':
+        os.environ['NOMINATIM_MIN_INTERVAL'] = '0'
+
+
+def run_once(main, replay, archive:dict, latency:str) -> tuple[float, dict, object]:
+    """Replay the archive once. Returns the wall time, the result and the replay.Tape it ran from."""
+    tape = replay.replay_tape(archive, latency)
+    started:float = time.perf_counter()
+    with replay.use(tape):
+        if tape.streamed:
+            # Through the same endpoint as the recording, since it makes different upstream calls
+            event:dict = json.loads(list(main.stream_form_data(dict(tape.form)))[-1])
+            if event['event'] != 'result':
+                raise RuntimeError(f'Replay failed: {event["data"]}')
+            result:dict = event['data']
+        else:
+            result = main.process_form_data(dict(tape.form))
+    return time.perf_counter() - started, result, tape
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a recorded form submission.')
+    parser.add_argument('archive', help='archive written with REPLAY_MODE=record')
+    parser.add_argument('--latency', choices=['original', 'zero'], default='original',
+                        help='answer upstream calls after their recorded latency, or at once')
+    parser.add_argument('--repeat', type=int, default=1, help='number of replays')
+    parser.add_argument('--profile', help='file the cProfile stats of the replays are written to')
+    parser.add_argument('--output', help='file the result of the last replay is written to as JSON')
+    args = parser.parse_args()
+
+    archive:dict = read_archive(args.archive)
+    configure(archive, args.latency)
+
+    # The API modules read config when they're imported, so only now
+    import main
+    import replay
+
+    calls:dict[str, int] = {}
+    for exchange in archive['exchanges']:
+        calls[exchange['kind']] = calls.get(exchange['kind'], 0) + 1
+    print(f'{args.archive}: seed {archive["seed"]}, recorded {archive["recorded_at"]}, '
+          + ', '.join(f'{count} {kind}' for kind, count in sorted(calls.items())) + ' calls')
+
+    profiler:cProfile.Profile|None = cProfile.Profile() if args.profile else None
+    seconds:list[float] = []
+    mismatches:int = 0
+    for _ in range(args.repeat):
+        if profiler is not None:
+            profiler.enable()
+        try:
+            elapsed, result, tape = run_once(main, replay, archive, args.latency)
+        except replay.ReplayMissError as e:
+            sys.exit(f'\033[91mThe replay diverged from the recording: {e}\033[0m')
+        finally:
+            if profiler is not None:
+                profiler.disable()
+
+        seconds.append(elapsed)
+        if archive.get('result') is not None and replay.comparable(result) != archive['result']:
+            mismatches += 1
+        if tape.misses:
+            print(f'\033[91m{tape.misses} upstream calls were not in the archive; the replay diverged from the recording\033[0m')
+
+    print(f'{args.repeat} replays ({args.latency} latency): '
+          + '  '.join(f'{name} {float(np.percentile(seconds, q)) * 1e3:,.1f} ms' for name, q in (('min', 0), ('p50', 50), ('max', 100))))
+    if archive.get('result') is None:
+        print('The archive has no result to compare with (the recording failed)')
+    elif mismatches:
+        print(f'\033[91m{mismatches}/{args.repeat} replays differ from the recorded result\033[0m')
+    else:
+        print('Every replay reproduced the recorded result')
+
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+        print(f'Wrote {args.profile}')
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=4, default=float)
+        print(f'Wrote {args.output}')
+
+    sys.exit(1 if mismatches else 0)
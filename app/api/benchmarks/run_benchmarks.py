@@ -0,0 +1,248 @@
+"""Micro-benchmarks of the planning hot paths, with regression checks against a baseline.
+
+Run from app/api:
+    python benchmarks/run_benchmarks.py                        # run and write benchmarks/results.json
+    python benchmarks/run_benchmarks.py --baseline base.json   # also fail (exit 1) on regressions
+    python benchmarks/run_benchmarks.py --quick --only paths   # smaller scales, matching benchmarks only
+
+Each benchmark is timed over several repeats (best and mean wall time, throughput in items/s)
+and run once more under tracemalloc for peak memory. Regression thresholds are read from
+benchmarks/thresholds.json: a benchmark regresses when its best time or peak memory grows by
+more than the configured fraction over the baseline.
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+API_DIR:str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR:str = os.path.join(API_DIR, 'benchmarks')
+sys.path.insert(0, API_DIR)
+os.chdir(API_DIR)
+
+# Benchmarks must never hit the network or the on-disk cache
+os.environ['TERRAIN_CACHE_ENABLED'] = '0'
+
+import numpy as np
+
+import geodesy
+import terrain
+import weather
+from path_model import CostTable, get_top_5_combinations
+from utils import key_with_lowest_sum
+
+
+TERRAINS:list[str] = ['forest', 'water', 'flatlands', 'urban', 'transport', 'military']
+LAND_USES:list[str] = ['forest', 'wood', 'scrub', 'water', 'wetland', 'meadow', 'grass', 'farmland', 'residential',
+                       'industrial', 'commercial', 'retail', 'railway', 'parking', 'military', 'quarry', 'beach']
+VEHICLES:list[str] = ['Foot', 'Land Vehicle', 'Helicopter', 'Boat']
+
+
+# ---- Synthetic inputs ---- #
+
+def synthetic_terrain_data(num_paths:int, rng:random.Random) -> dict:
+    """Terrain counts shaped like fetch_terrain_for_paths output (33 samples per path)."""
+    return {
+        f'Path {i + 1}': {
+            'path': [],
+            'terrain_counts': {t: rng.randint(1, 33) for t in rng.sample(TERRAINS, rng.randint(1, 4))}
+        }
+        for i in range(num_paths)
+    }
+
+
+def synthetic_forecast(num_windows:int, rng:random.Random) -> dict:
+    """A fetch_weather result of num_windows consecutive 3-hour forecasts with a few gaps."""
+    start:dt.datetime = dt.datetime(2024, 9, 15)
+    return {'time_windows': [
+        {'interval': (start + dt.timedelta(hours=3 * i)).strftime('%Y-%m-%d %H:%M:%S'), 'weather': rng.choice(weather.WEATHER_CONDITIONS)}
+        for i in range(num_windows) if rng.random() > 0.02
+    ]}
+
+
+# ---- Benchmarks ---- #
+# Each factory takes a scale and returns (callable, number of items it processes per call)
+
+def bench_paths(num_paths:int, levels:int) -> tuple[Callable, int]:
+    start, end = (42.27, -71.80), (42.45, -71.55)
+    return (lambda: terrain.create_triangular_paths(start, end, num_paths, levels, 0.5, seed=0)), num_paths
+
+
+def bench_paths_array(num_paths:int, levels:int) -> tuple[Callable, int]:
+    start, end = (42.27, -71.80), (42.45, -71.55)
+    return (lambda: terrain.generate_triangular_paths(start, end, num_paths, levels, 0.5, rng=0, with_midpoints=True)), num_paths
+
+
+def bench_segment_lengths(num_paths:int, levels:int) -> tuple[Callable, int]:
+    paths:np.ndarray = terrain.generate_triangular_paths((42.27, -71.80), (42.45, -71.55), num_paths, levels, 0.5, rng=0, with_midpoints=True)
+    return (lambda: geodesy.cumulative_lengths_km(paths)), num_paths
+
+
+def bench_categorize(num_calls:int) -> tuple[Callable, int]:
+    rng = random.Random(0)
+    tag_sets:list[set[str]] = [set(rng.sample(LAND_USES, rng.randint(0, 5))) for _ in range(num_calls)]
+    return (lambda: [terrain.categorize_terrain(tags) for tags in tag_sets]), num_calls
+
+
+def bench_count_categories(num_points:int) -> tuple[Callable, int]:
+    rng = random.Random(0)
+    terrain_info:list[str] = [', '.join(rng.sample(TERRAINS, rng.randint(1, 3))) if rng.random() > 0.2 else 'Unknown' for _ in range(num_points)]
+    return (lambda: terrain.count_terrain_categories(terrain_info)), num_points
+
+
+def bench_top_5(num_paths:int) -> tuple[Callable, int]:
+    with open('../../data/static/cost-matrix.json', 'r') as file:
+        cost_table = CostTable(json.load(file))
+    terrain_data:dict = synthetic_terrain_data(num_paths, random.Random(0))
+    return (lambda: get_top_5_combinations(terrain_data, cost_table, VEHICLES)), num_paths
+
+
+def bench_weather_window(num_windows:int) -> tuple[Callable, int]:
+    forecast:dict = synthetic_forecast(num_windows, random.Random(0))
+    end:dt.datetime = dt.datetime(2024, 9, 15) + dt.timedelta(hours=3 * num_windows)
+
+    def run():
+        # Include parsing: clear the forecast cache and serve the synthetic forecast as the upstream
+        weather.forecast_cache.clear()
+        weather.fetch_weather = lambda *args: forecast
+        return weather.find_best_time_window('', 0, 0, dt.datetime(2024, 9, 15), end, 12, ['land vehicle', 'boat', 'helicopter', 'foot'], 'stealth', 'defensive')
+
+    return run, num_windows
+
+
+def bench_evaluate_cost(num_calls:int) -> tuple[Callable, int]:
+    rng = random.Random(0)
+    windows:list[list[str]] = [[rng.choice(weather.WEATHER_CONDITIONS) for _ in range(4)] for _ in range(num_calls)]
+    return (lambda: [weather.evaluate_cost('Helicopter', w, 'aggressive', 'defensive') for w in windows]), num_calls
+
+
+def bench_lowest_sum(num_paths:int) -> tuple[Callable, int]:
+    rng = random.Random(0)
+    top:dict = {f'Path {i + 1}': {v: rng.uniform(1, 100) for v in rng.sample(VEHICLES, rng.randint(1, 4))} for i in range(num_paths)}
+    return (lambda: key_with_lowest_sum(top)), num_paths
+
+
+# name -> (factory, full scales, quick scales)
+BENCHMARKS:dict[str, tuple[Callable, list[tuple], list[tuple]]] = {
+    'paths': (bench_paths, [(5, 4), (50, 4), (500, 4), (5000, 4), (5, 2), (5, 10), (500, 8)], [(5, 4), (500, 4), (5, 10)]),
+    'paths_array': (bench_paths_array, [(5, 4), (5000, 4), (5000, 6), (500, 10), (5000, 10)], [(5, 4), (5000, 4), (500, 10)]),
+    'segment_lengths': (bench_segment_lengths, [(5, 4), (5000, 4), (5000, 10)], [(5, 4), (5000, 4)]),
+    'categorize_terrain': (bench_categorize, [(165,), (1_650,), (16_500,)], [(165,), (1_650,)]),
+    'count_terrain_categories': (bench_count_categories, [(165,), (16_500,), (165_000,)], [(165,), (16_500,)]),
+    'get_top_5_combinations': (bench_top_5, [(5,), (50,), (500,), (5_000,)], [(5,), (500,)]),
+    'find_best_time_window': (bench_weather_window, [(40,), (200,), (1_000,)], [(40,), (1_000,)]),
+    'evaluate_cost': (bench_evaluate_cost, [(1_000,), (100_000,)], [(1_000,)]),
+    'key_with_lowest_sum': (bench_lowest_sum, [(5,), (500,), (5_000,)], [(5,), (5_000,)])
+}
+
+
+# ---- Runner ---- #
+
+def measure(func:Callable, items:int, min_time:float=0.2, repeats:int=5) -> dict:
+    """Time func over several repeats, then measure its peak memory with tracemalloc."""
+    func()   # Warm up caches and lazy imports
+
+    # Calibrate the loop count so every repeat runs for at least min_time
+    loops:int = 1
+    while True:
+        start:float = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed:float = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1_000_000:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    times:list[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        times.append((time.perf_counter() - start) / loops)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best:float = min(times)
+    return {
+        'best_s': best,
+        'mean_s': sum(times) / len(times),
+        'items': items,
+        'items_per_s': items / best if best > 0 else float('inf'),
+        'peak_memory_bytes': peak,
+        'loops': loops
+    }
+
+
+def compare(results:dict, baseline:dict, thresholds:dict) -> list[str]:
+    """Return a message for every benchmark that regressed past its threshold."""
+    regressions:list[str] = []
+    for key, result in results.items():
+        base:dict|None = baseline.get(key)
+        if base is None:
+            continue
+
+        name:str = key.split('[')[0]
+        threshold:dict = {**thresholds.get('default', {}), **thresholds.get(name, {})}
+        for metric, limit_key in (('best_s', 'time'), ('peak_memory_bytes', 'memory')):
+            limit:float|None = threshold.get(limit_key)
+            if limit is None or not base[metric]:
+                continue
+            change:float = result[metric] / base[metric] - 1
+            if change > limit:
+                regressions.append(f'{key}: {metric} {base[metric]:.4g} -> {result[metric]:.4g} (+{change:.0%}, limit +{limit:.0%})')
+
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the planning hot paths.')
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'results.json'), help='file the results are written to')
+    parser.add_argument('--baseline', help='results file to compare against; exit 1 on regressions')
+    parser.add_argument('--thresholds', default=os.path.join(BENCH_DIR, 'thresholds.json'), help='regression thresholds file')
+    parser.add_argument('--quick', action='store_true', help='run the smaller scales only')
+    parser.add_argument('--only', nargs='*', default=None, help='benchmark names to run')
+    args = parser.parse_args()
+
+    results:dict = {}
+    for name, (factory, scales, quick_scales) in BENCHMARKS.items():
+        if args.only and name not in args.only:
+            continue
+
+        for scale in (quick_scales if args.quick else scales):
+            key:str = f'{name}[{",".join(map(str, scale))}]'
+            func, items = factory(*scale)
+            results[key] = measure(func, items)
+            r:dict = results[key]
+            print(f'{key:40s} {r["best_s"] * 1e3:10.3f} ms  {r["items_per_s"]:14,.0f} items/s  {r["peak_memory_bytes"] / 1024:10,.0f} KiB')
+
+    with open(args.output, 'w') as file:
+        json.dump({
+            'created': dt.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'results': results
+        }, file, indent=4)
+    print(f'Wrote {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline:dict = json.load(file)['results']
+        with open(args.thresholds, 'r') as file:
+            thresholds:dict = json.load(file)
+
+        regressions:list[str] = compare(results, baseline, thresholds)
+        for message in regressions:
+            print(f'REGRESSION {message}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions.')
@@ -0,0 +1,301 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with an optional time-to-live on each entry.
+
+    Args:
+        max_size (int): maximum number of entries kept before the least recently used one is evicted.
+        ttl (float | None): seconds an entry stays valid, or None to keep entries until evicted.
+    """
+
+    def __init__(self, max_size:int=1024, ttl:float|None=None):
+        self.max_size:int = max_size
+        self.ttl:float|None = ttl
+        self._entries:OrderedDict = OrderedDict()   # key -> (expires_at, value)
+        self._lock:threading.Lock = threading.Lock()
+        self.hits:int = 0
+        self.misses:int = 0
+        self.evictions:int = 0
+
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+
+    def set(self, key, value, ttl:float|None=None):
+        """Store value under key, evicting the least recently used entries if the cache is full."""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at:float|None = time.time() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+    def delete(self, key):
+        """Remove key from the cache if it is present."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+    def stats(self) -> dict:
+        """Return the hit/miss/eviction counters and current size of the cache."""
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class SQLiteCache:
+    """Cache stored in a SQLite table, shared by every process that opens the same file.
+
+    Used as the second tier of a TieredCache so results cached by one server worker are seen
+    by the others. Keys are stored by their repr and values pickled, so only use it for values
+    this process produced. The connection is reopened in forked children.
+
+    Args:
+        path (str): path of the SQLite file.
+        table (str): name of the table holding this cache's entries.
+        max_size (int): maximum number of entries; the oldest are evicted first (checked periodically).
+        ttl (float | None): seconds an entry stays valid, or None to keep entries until evicted.
+    """
+
+    def __init__(self, path:str, table:str, max_size:int=100_000, ttl:float|None=None):
+        self.path:str = path
+        self.table:str = table
+        self.max_size:int = max_size
+        self.ttl:float|None = ttl
+        self._lock:threading.Lock = threading.Lock()
+        self._writes_since_evict:int = 0
+        self.hits:int = 0
+        self.misses:int = 0
+
+        self._connect()
+        os.register_at_fork(after_in_child=self._connect)
+
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        self._db:sqlite3.Connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(f'CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL, stored_at REAL NOT NULL)')
+        self._db.commit()
+
+
+    def get_entry(self, key) -> tuple[object, float|None]|None:
+        """Return (value, expires_at) for key, or None if it is missing or expired."""
+        with self._lock:
+            row = self._db.execute(f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (repr(key),)).fetchone()
+
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return pickle.loads(row[0]), row[1]
+
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if it is missing or expired."""
+        entry:tuple|None = self.get_entry(key)
+        return entry[0] if entry is not None else default
+
+
+    def set(self, key, value, ttl:float|None=None):
+        """Store value under key for every process sharing the file."""
+        ttl = self.ttl if ttl is None else ttl
+        now:float = time.time()
+        with self._lock:
+            self._db.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at, stored_at) VALUES (?, ?, ?, ?)',
+                (repr(key), pickle.dumps(value), now + ttl if ttl is not None else None, now)
+            )
+            self._db.commit()
+
+            # Checking the table size on every write is wasteful, so only evict periodically
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= 1000:
+                self._writes_since_evict = 0
+                self._db.execute(f'DELETE FROM {self.table} WHERE expires_at < ?', (now,))
+                self._db.execute(
+                    f'DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY stored_at DESC LIMIT -1 OFFSET ?)',
+                    (self.max_size,)
+                )
+                self._db.commit()
+
+
+    def delete(self, key):
+        """Remove key from the cache if it is present."""
+        with self._lock:
+            self._db.execute(f'DELETE FROM {self.table} WHERE key = ?', (repr(key),))
+            self._db.commit()
+
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        with self._lock:
+            self._db.execute(f'DELETE FROM {self.table}')
+            self._db.commit()
+
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+
+    def stats(self) -> dict:
+        """Return the hit/miss counters (of this process) and current size of the cache."""
+        return {'size': len(self), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+
+class TieredCache:
+    """An in-memory LRUCache in front of a SQLiteCache shared between processes.
+
+    Has the same interface as LRUCache. Misses in memory fall through to the shared tier and
+    are copied into memory for the rest of their lifetime; writes go to both tiers.
+    """
+
+    def __init__(self, memory:LRUCache, shared:SQLiteCache):
+        self.memory:LRUCache = memory
+        self.shared:SQLiteCache = shared
+
+
+    def get(self, key, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        entry:tuple|None = self.shared.get_entry(key)
+        if entry is None:
+            return default
+
+        value, expires_at = entry
+        self.memory.set(key, value, ttl=expires_at - time.time() if expires_at is not None else None)
+        return value
+
+
+    def set(self, key, value, ttl:float|None=None):
+        self.memory.set(key, value, ttl)
+        self.shared.set(key, value, ttl if ttl is not None else self.memory.ttl)
+
+
+    def delete(self, key):
+        self.memory.delete(key)
+        self.shared.delete(key)
+
+
+    def clear(self):
+        self.memory.clear()
+        self.shared.clear()
+
+
+    def __len__(self) -> int:
+        return len(self.memory)
+
+
+    def stats(self) -> dict:
+        """Return the memory tier's stats, plus the hits served by the shared tier."""
+        memory_stats:dict = self.memory.stats()
+        return {
+            **memory_stats,
+            'hits': memory_stats['hits'] + self.shared.hits,
+            'misses': self.shared.misses,
+            'shared_hits': self.shared.hits,
+            'shared_size': len(self.shared)
+        }
+
+
+def shareable(memory:LRUCache, table:str, enabled:bool, path:str, max_size:int) -> LRUCache|TieredCache:
+    """Return memory as is, or backed by a shared SQLite table when enabled (multi-worker serving)."""
+    if not enabled:
+        return memory
+    return TieredCache(memory, SQLiteCache(path, table, max_size, memory.ttl))
+
+
+class _Call:
+    def __init__(self):
+        self.event:threading.Event = threading.Event()
+        self.result = None
+        self.error:BaseException|None = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it is in flight wait
+    for it and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._calls:dict = {}
+        self._lock:threading.Lock = threading.Lock()
+        self.shared:int = 0
+
+
+    def do(self, key, func):
+        """Run func() for key, or wait for the call already in flight for key and return its result."""
+        with self._lock:
+            call:_Call|None = self._calls.get(key)
+            leader:bool = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
@@ -0,0 +1,165 @@
+import os
+from urllib.parse import urlparse
+
+
+# Directory of the API modules; relative paths in the settings are resolved against it, so the
+# server finds its files whatever the working directory it's started from
+APP_DIR:str = os.path.dirname(os.path.abspath(__file__))
+
+
+def env_str(name:str, default:str) -> str:
+    """Read a string setting from the environment."""
+    return os.environ.get(name, default)
+
+
+def env_int(name:str, default:int) -> int:
+    """Read an integer setting from the environment."""
+    value:str = os.environ.get(name, '')
+    return int(value) if value else default
+
+
+def env_float(name:str, default:float) -> float:
+    """Read a float setting from the environment."""
+    value:str = os.environ.get(name, '')
+    return float(value) if value else default
+
+
+def env_bool(name:str, default:bool) -> bool:
+    """Read a boolean setting from the environment ("1", "true", "yes" and "on" are truthy)."""
+    value:str = os.environ.get(name, '')
+    if not value:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_path(name:str, default:str) -> str:
+    """Read a file path setting from the environment; relative paths are taken relative to APP_DIR
+    and an empty path is left empty (it disables the file)."""
+    value:str = os.environ.get(name, default)
+    return os.path.join(APP_DIR, value) if value else value
+
+
+# ---- Serving ---- #
+SERVER_HOST:str = env_str('SERVER_HOST', '0.0.0.0')
+SERVER_PORT:int = env_int('SERVER_PORT', 8000)
+SERVER_WORKERS:int = env_int('SERVER_WORKERS', 1)        # Pre-forked worker processes, 1 serves from the main process
+SERVER_BACKLOG:int = env_int('SERVER_BACKLOG', 1024)
+METRICS_SNAPSHOT_INTERVAL:float = env_float('METRICS_SNAPSHOT_INTERVAL', 5.0)   # Seconds between the metrics snapshots each worker writes for the others' scrapes
+
+
+# ---- Static data ---- #
+STATIC_DATA_DIR:str = env_path('STATIC_DATA_DIR', '../../data/static')        # Vehicle, terrain and strategy CSVs and cost-matrix.json
+STATIC_SNAPSHOT_PATH:str = env_path('STATIC_SNAPSHOT_PATH', 'static_data.npz')  # Compiled snapshot of them, empty to always parse the sources
+PRELOAD_IMPORTS:bool = env_bool('PRELOAD_IMPORTS', SERVER_WORKERS > 1)         # Import lazily loaded libraries at boot, so forked workers share them
+
+
+# ---- Responses ---- #
+PATH_POLYLINE_PRECISION:int = env_int('PATH_POLYLINE_PRECISION', 5)   # Decimal places of polyline-encoded paths (~1 m)
+PATH_DELTA_PRECISION:int = env_int('PATH_DELTA_PRECISION', 6)         # Decimal places of delta-encoded paths (~0.1 m)
+INPUT_PARAMS_MAX_AGE:int = env_int('INPUT_PARAMS_MAX_AGE', 300)       # Seconds clients may cache get-input-params
+
+
+# ---- Shared cache ---- #
+# Lets every worker see the weather, geocoding, LLM and job results cached by the others
+SHARED_CACHE_ENABLED:bool = env_bool('SHARED_CACHE_ENABLED', SERVER_WORKERS > 1)
+SHARED_CACHE_PATH:str = env_path('SHARED_CACHE_PATH', 'shared_cache.sqlite')
+SHARED_CACHE_ENTRIES:int = env_int('SHARED_CACHE_ENTRIES', 100_000)   # Per cache
+
+
+# ---- Terrain cache ---- #
+TERRAIN_CACHE_ENABLED:bool = env_bool('TERRAIN_CACHE_ENABLED', True)
+TERRAIN_CACHE_PATH:str = env_path('TERRAIN_CACHE_PATH', 'terrain_cache.sqlite')
+TERRAIN_CACHE_CELL_METERS:float = env_float('TERRAIN_CACHE_CELL_METERS', 100.0)   # Matches the Overpass query radius
+TERRAIN_CACHE_MEMORY_ENTRIES:int = env_int('TERRAIN_CACHE_MEMORY_ENTRIES', 50_000)
+TERRAIN_CACHE_DISK_ENTRIES:int = env_int('TERRAIN_CACHE_DISK_ENTRIES', 2_000_000)
+TERRAIN_CACHE_TTL:float = env_float('TERRAIN_CACHE_TTL', 30 * 24 * 3600)        # Land use changes slowly, 30 days
+
+
+# ---- Overpass ---- #
+OVERPASS_URL:str = env_str('OVERPASS_URL', 'https://overpass-api.de/api/interpreter')
+OVERPASS_BATCH_SIZE:int = env_int('OVERPASS_BATCH_SIZE', 50)         # Sample points folded into one query
+OVERPASS_CONCURRENCY:int = env_int('OVERPASS_CONCURRENCY', 2)        # Overpass only grants a couple of slots per client
+OVERPASS_QUERY_TIMEOUT:int = env_int('OVERPASS_QUERY_TIMEOUT', 90)   # Server-side [timeout:] of a batched query
+
+
+# ---- Terrain backend ---- #
+TERRAIN_BACKEND:str = env_str('TERRAIN_BACKEND', 'overpass')           # 'overpass' or 'offline'
+TERRAIN_INDEX_PATH:str = env_path('TERRAIN_INDEX_PATH', 'terrain_index')  # Path prefix of the files written by terrain_index.py
+
+
+# ---- Terrain sampling ---- #
+TERRAIN_SAMPLING:str = env_str('TERRAIN_SAMPLING', 'adaptive')                       # 'adaptive' or 'fixed' (every vertex and midpoint)
+TERRAIN_SAMPLING_MAX_DEPTH:int = env_int('TERRAIN_SAMPLING_MAX_DEPTH', 2)           # Subdivision levels of a segment; >1 refines boundaries in the km per terrain paths are scored on
+TERRAIN_SAMPLING_MIN_SEGMENT_M:float = env_float('TERRAIN_SAMPLING_MIN_SEGMENT_M', TERRAIN_CACHE_CELL_METERS)   # Shorter segments aren't split
+
+
+# ---- Path generation ---- #
+PATH_MODE:str = env_str('PATH_MODE', 'triangular')              # 'triangular' (random deviations) or 'routing' (grid A*, needs TERRAIN_BACKEND=offline)
+ROUTING_GRID_CELLS:int = env_int('ROUTING_GRID_CELLS', 48)       # Cells along the longer side of the routing grid
+ROUTING_MARGIN:float = env_float('ROUTING_MARGIN', 0.25)         # Padding around the start/end box, fraction of its size
+ROUTING_ROUTES_PER_VEHICLE:int = env_int('ROUTING_ROUTES_PER_VEHICLE', 3)
+
+
+# ---- Upstream APIs ---- #
+OPENWEATHER_URL:str = env_str('OPENWEATHER_URL', 'https://api.openweathermap.org/data/2.5/forecast')
+NOMINATIM_URL:str = env_str('NOMINATIM_URL', 'https://nominatim.openstreetmap.org/reverse')
+
+
+# ---- Outbound HTTP ---- #
+HTTP_CONNECT_TIMEOUT:float = env_float('HTTP_CONNECT_TIMEOUT', 5.0)
+HTTP_READ_TIMEOUT:float = env_float('HTTP_READ_TIMEOUT', OVERPASS_QUERY_TIMEOUT + 10)   # Must outlast the Overpass server timeout
+HTTP_MAX_RETRIES:int = env_int('HTTP_MAX_RETRIES', 3)
+HTTP_BACKOFF:float = env_float('HTTP_BACKOFF', 0.5)
+
+# Maximum concurrent requests per upstream host (keyed on host[:port], so local stand-ins on one address stay apart).
+# These and the intervals below are limits of the whole server: with several workers they're kept in SHARED_CACHE_PATH,
+# or split between the workers if the shared cache is disabled (see http_client.py)
+HTTP_HOST_LIMITS:dict[str, int] = {
+    urlparse(OVERPASS_URL).netloc: env_int('OVERPASS_HOST_LIMIT', 2),
+    urlparse(NOMINATIM_URL).netloc: env_int('NOMINATIM_HOST_LIMIT', 1),
+    urlparse(OPENWEATHER_URL).netloc: env_int('OPENWEATHER_HOST_LIMIT', 8)
+}
+
+# Minimum seconds between requests per upstream host (Nominatim allows 1 request/s)
+HTTP_HOST_INTERVALS:dict[str, float] = {
+    urlparse(NOMINATIM_URL).netloc: env_float('NOMINATIM_MIN_INTERVAL', 1.0)
+}
+
+
+# ---- Country lookup ---- #
+COUNTRY_BACKEND:str = env_str('COUNTRY_BACKEND', 'offline')                 # 'offline' or 'nominatim'
+COUNTRY_BOUNDARIES_PATH:str = env_path('COUNTRY_BOUNDARIES_PATH', '../../data/static/countries.geojson')
+COUNTRY_NOMINATIM_FALLBACK:bool = env_bool('COUNTRY_NOMINATIM_FALLBACK', False)  # Ask Nominatim when no boundary contains the point
+COUNTRY_CACHE_ENTRIES:int = env_int('COUNTRY_CACHE_ENTRIES', 100_000)
+
+
+# ---- Weather ---- #
+OPENWEATHER_API_KEY:str = env_str('OPENWEATHER_API_KEY', '')                      # Falls back to weather_api.json
+WEATHER_CACHE_ENTRIES:int = env_int('WEATHER_CACHE_ENTRIES', 10_000)
+WEATHER_CACHE_DECIMALS:int = env_int('WEATHER_CACHE_DECIMALS', 2)                 # Coordinates rounded to ~1 km
+WEATHER_FORECAST_INTERVAL:int = env_int('WEATHER_FORECAST_INTERVAL', 3 * 3600)    # OpenWeather issues a new forecast every 3 hours
+
+
+# ---- OpenAI ---- #
+OPENAI_BASE_URL:str = env_str('OPENAI_BASE_URL', '')         # Empty uses the OpenAI API
+LLM_CACHE_ENTRIES:int = env_int('LLM_CACHE_ENTRIES', 1_000)     # Completions are cached per API key, never shared between accounts
+LLM_CACHE_TTL:float = env_float('LLM_CACHE_TTL', 24 * 3600)
+LLM_CLIENT_ENTRIES:int = env_int('LLM_CLIENT_ENTRIES', 64)   # Clients kept alive, one per API key
+
+
+# ---- Planning jobs ---- #
+JOB_WORKERS:int = env_int('JOB_WORKERS', 4)
+JOB_QUEUE_DEPTH:int = env_int('JOB_QUEUE_DEPTH', 100)
+JOB_RESULT_TTL:float = env_float('JOB_RESULT_TTL', 3600)
+
+
+# ---- Mission batches ---- #
+BATCH_MAX_MISSIONS:int = env_int('BATCH_MAX_MISSIONS', 100)
+BATCH_WORKERS:int = env_int('BATCH_WORKERS', 8)    # Concurrent weather/geocoding/LLM calls of a batch
+
+
+# ---- Replay ---- #
+# 'record' writes every form submission's upstream responses and seed to an archive in REPLAY_DIR,
+# which benchmarks/replay_run.py reruns deterministically; empty records nothing
+REPLAY_MODE:str = env_str('REPLAY_MODE', '')
+REPLAY_DIR:str = env_path('REPLAY_DIR', 'replays')
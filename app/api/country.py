@@ -1,17 +1,73 @@
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
+import requests
+
+import config
+import replay
+from caching import LRUCache, TieredCache, shareable
+from country_index import CountryIndex
+from http_client import http
+
+
+# Country boundaries, loaded on first use
+_country_index:CountryIndex|None = None
+
+# Resolved countries keyed on coordinates rounded to ~100 m
+country_cache:LRUCache|TieredCache = shareable(
+    LRUCache(config.COUNTRY_CACHE_ENTRIES), 'countries', config.SHARED_CACHE_ENABLED, config.SHARED_CACHE_PATH, config.SHARED_CACHE_ENTRIES
+)
+
+
+def get_country_index() -> CountryIndex:
+    """Return the country boundary index, loading it the first time it is needed."""
+    global _country_index
+    if _country_index is None:
+        _country_index = CountryIndex(config.COUNTRY_BOUNDARIES_PATH)
+    return _country_index
+
 
 def get_country_from_coords(latitude, longitude):
-    geolocator = Nominatim(user_agent="anaygandhi")
+    """Get the name of the country at the given coordinates.
+
+    Uses the local boundary index unless COUNTRY_BACKEND is 'nominatim'; Nominatim is only
+    asked for points outside every boundary when COUNTRY_NOMINATIM_FALLBACK is set."""
+    if config.COUNTRY_BACKEND != 'offline':
+        return get_country_from_nominatim(latitude, longitude)
+
+    # Recorded and replayed requests neither read nor fill the cache (see replay.py)
+    use_cache:bool = not replay.active()
+    key:tuple[float, float] = (round(float(latitude), 3), round(float(longitude), 3))
+    country:str|None = country_cache.get(key) if use_cache else None
+    if country is None:
+        country = get_country_index().lookup(float(latitude), float(longitude))
+        if country is None:
+            if not config.COUNTRY_NOMINATIM_FALLBACK:
+                return "Location not found"
+            country = get_country_from_nominatim(latitude, longitude)
+            if country in ("Location not found", "Geocoding service timed out. Please try again later."):
+                return country
+        if use_cache:
+            country_cache.set(key, country)
+
+    return country
+
+
+def get_country_from_nominatim(latitude, longitude):
     location = None
-    
+
     try:
-        location = geolocator.reverse((latitude, longitude), language='en')
-    except GeocoderTimedOut:
+        response = http.get(
+            config.NOMINATIM_URL,
+            params={'lat': latitude, 'lon': longitude, 'format': 'jsonv2', 'accept-language': 'en'},
+            headers={'User-Agent': 'anaygandhi'}
+        )
+        response.raise_for_status()
+        location = response.json()
+    except requests.Timeout:
         return "Geocoding service timed out. Please try again later."
-    
-    if location and location.raw.get('address'):
-        address = location.raw['address']
+    except (requests.RequestException, ValueError) as e:
+        print(f"Geocoding error: {e}")
+
+    if location and location.get('address'):
+        address = location['address']
         return address.get('country', 'Country not found')
     else:
         return "Location not found"
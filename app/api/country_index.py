@@ -0,0 +1,101 @@
+import json
+import math
+
+import numpy as np
+
+
+def edge_distance(edges:np.ndarray, x:float, y:float) -> float:
+    """Distance (in degrees) from a point to the closest of a set of (x0, y0, x1, y1) edges, projecting
+    the point onto each edge and clamping the projection to the edge's ends."""
+    x0, y0, x1, y1 = edges.T
+    dx:np.ndarray = x1 - x0
+    dy:np.ndarray = y1 - y0
+    length_sq:np.ndarray = dx * dx + dy * dy
+    t:np.ndarray = np.clip(((x - x0) * dx + (y - y0) * dy) / np.where(length_sq > 0, length_sq, 1.0), 0.0, 1.0)
+    return float(np.min(np.hypot(x0 + t * dx - x, y0 + t * dy - y)))
+
+
+class CountryIndex:
+    """Point in polygon country lookup over country boundary polygons (Natural Earth GeoJSON).
+
+    Polygons are bucketed on a grid of cell_degrees cells by bounding box, so a lookup only tests
+    the few polygons whose box covers the point's cell. Points just off a coarse coastline can be
+    snapped to the nearest boundary within snap_degrees.
+
+    Args:
+        path (str): path of a GeoJSON FeatureCollection with a 'name' property per country.
+        cell_degrees (float): size of the bucketing grid cells in degrees.
+        snap_degrees (float): maximum distance in degrees to snap a point outside every polygon
+            to the nearest country, or 0 to disable snapping.
+    """
+
+    def __init__(self, path:str, cell_degrees:float=2.0, snap_degrees:float=0.25):
+        self.cell_degrees:float = cell_degrees
+        self.snap_degrees:float = snap_degrees
+        self.names:list[str] = []
+        self.polygons:list[tuple[int, np.ndarray]] = []   # (country, edges)
+        self.buckets:dict[tuple[int, int], list[int]] = {}
+
+        with open(path, 'r') as file:
+            features:list[dict] = json.load(file)['features']
+
+        for feature in features:
+            geometry:dict = feature['geometry']
+            polygons:list = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+
+            country:int = len(self.names)
+            self.names.append(feature['properties']['name'])
+            for rings in polygons:
+                self._add_polygon(country, rings)
+
+
+    def _cell(self, lon:float, lat:float) -> tuple[int, int]:
+        return math.floor(lon / self.cell_degrees), math.floor(lat / self.cell_degrees)
+
+
+    def _add_polygon(self, country:int, rings:list):
+        # Every edge of every ring as (x0, y0, x1, y1); holes work through the even-odd rule
+        edges:np.ndarray = np.concatenate([
+            np.hstack((ring[:-1], ring[1:])) for ring in (np.asarray(r, dtype=np.float64) for r in rings) if len(ring) > 1
+        ])
+        vertices:np.ndarray = edges[:, :2]
+
+        polygon:int = len(self.polygons)
+        self.polygons.append((country, edges))
+
+        # Pad the box by the snap distance so near-coast points still find the polygon
+        (lon_min, lat_min), (lon_max, lat_max) = vertices.min(axis=0) - self.snap_degrees, vertices.max(axis=0) + self.snap_degrees
+        (c0, r0), (c1, r1) = self._cell(lon_min, lat_min), self._cell(lon_max, lat_max)
+        for col in range(c0, c1 + 1):
+            for row in range(r0, r1 + 1):
+                self.buckets.setdefault((col, row), []).append(polygon)
+
+
+    def lookup(self, lat:float, lon:float) -> str|None:
+        """Return the name of the country containing the point, or None if it's in no country."""
+        candidates:list[int] = self.buckets.get(self._cell(lon, lat), [])
+
+        for polygon in candidates:
+            country, edges = self.polygons[polygon]
+            x0, y0, x1, y1 = edges.T
+            crosses:np.ndarray = (y0 > lat) != (y1 > lat)
+            if not crosses.any():
+                continue
+            x_intersect:np.ndarray = x0[crosses] + (lat - y0[crosses]) * (x1[crosses] - x0[crosses]) / (y1[crosses] - y0[crosses])
+            if np.count_nonzero(lon < x_intersect) % 2 == 1:
+                return self.names[country]
+
+        # Coarse boundaries cut off coastal points, so fall back to the closest boundary edge
+        if self.snap_degrees > 0 and candidates:
+            best_country:int|None = None
+            best_distance:float = self.snap_degrees
+            for polygon in candidates:
+                country, edges = self.polygons[polygon]
+                distance:float = edge_distance(edges, lon, lat)
+                if distance <= best_distance:
+                    best_country, best_distance = country, distance
+
+            if best_country is not None:
+                return self.names[best_country]
+
+        return None
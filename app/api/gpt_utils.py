@@ -1,4 +1,26 @@
-from openai import OpenAI
+import hashlib
+import json
+import threading
+from typing import TYPE_CHECKING
+
+import config
+import replay
+from caching import LRUCache, SingleFlight, shareable
+
+# The openai package takes most of the API's import time, so it's imported when the first client is created
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+
+# One client (and connection pool) per API key, keyed on a hash of the key
+_clients = LRUCache(config.LLM_CLIENT_ENTRIES)
+_clients_lock = threading.Lock()
+
+# Completed responses keyed on a hash of (API key, model, prompt, max_tokens), and the calls in flight
+response_cache = shareable(
+    LRUCache(config.LLM_CACHE_ENTRIES, config.LLM_CACHE_TTL), 'llm_responses', config.SHARED_CACHE_ENABLED, config.SHARED_CACHE_PATH, config.SHARED_CACHE_ENTRIES
+)
+response_calls = SingleFlight()
 
 
 def format_prompt(inputs: dict) -> str:
@@ -41,17 +63,99 @@ def format_prompt(inputs: dict) -> str:
     )
 
 
-def get_chatgpt_response(prompt:str, api_key:str, model:str):
-    client = OpenAI(
-        api_key=api_key
+def get_client(api_key:str) -> 'OpenAI':
+    """Return the OpenAI client for an API key, creating it on first use."""
+    key:str = hashlib.sha256(api_key.encode()).hexdigest()
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            from openai import OpenAI
+
+            client = OpenAI(
+                api_key=api_key,
+                base_url=config.OPENAI_BASE_URL or None
+            )
+            _clients.set(key, client)
+    return client
+
+
+def response_key(prompt:str, model:str, max_tokens:int, api_key:str) -> str:
+    """Content address of a completion request. The API key is part of it, so a completion paid for
+    (and generated) under one account is never served to, or shared in flight with, another."""
+    account:str = hashlib.sha256(api_key.encode()).hexdigest()
+    return hashlib.sha256(json.dumps([account, model, prompt, max_tokens]).encode()).hexdigest()
+
+
+def _complete(prompt:str, api_key:str, model:str, max_tokens:int) -> str:
+    """Request a completion from the API, uncached."""
+    response = get_client(api_key).chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=max_tokens,
     )
+    return response.choices[0].message.content
 
-    response = client.chat.completions.create(
+
+def _stream(prompt:str, api_key:str, model:str, max_tokens:int):
+    """Request a streamed completion from the API, uncached, and yield its pieces."""
+    stream = get_client(api_key).chat.completions.create(
         model=model,
         messages=[
             {"role": "user", "content": prompt}
         ],
-        max_tokens=700,
+        max_tokens=max_tokens,
+        stream=True,
     )
 
-    return response.choices[0].message.content
\ No newline at end of file
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def get_chatgpt_response(prompt:str, api_key:str, model:str, max_tokens:int=700):
+    """Get a completion for the prompt. Identical prompts with the same API key are answered from the
+    response cache, and identical requests in flight at the same time share one upstream call. Recorded and
+    replayed requests (see replay.py) go through their tape instead."""
+    tape:replay.Tape|None = replay.current()
+    if tape is not None:
+        request:dict = {'model': model, 'prompt': prompt, 'max_tokens': max_tokens}
+        return tape.call('openai', request, lambda: _complete(prompt, api_key, model, max_tokens))
+
+    key:str = response_key(prompt, model, max_tokens, api_key)
+
+    content = response_cache.get(key)
+    if content is not None:
+        return content
+
+    def complete() -> str:
+        content = _complete(prompt, api_key, model, max_tokens)
+        response_cache.set(key, content)
+        return content
+
+    return response_calls.do(key, complete)
+
+
+def stream_chatgpt_response(prompt:str, api_key:str, model:str, max_tokens:int=700):
+    """Like get_chatgpt_response, but yields the response piece by piece as the model generates it.
+    A cached response is yielded in one piece."""
+    tape:replay.Tape|None = replay.current()
+    if tape is not None:
+        request:dict = {'model': model, 'prompt': prompt, 'max_tokens': max_tokens}
+        yield from tape.stream('openai', request, lambda: _stream(prompt, api_key, model, max_tokens))
+        return
+
+    key:str = response_key(prompt, model, max_tokens, api_key)
+
+    content = response_cache.get(key)
+    if content is not None:
+        yield content
+        return
+
+    pieces:list[str] = []
+    for piece in _stream(prompt, api_key, model, max_tokens):
+        pieces.append(piece)
+        yield piece
+
+    response_cache.set(key, ''.join(pieces))
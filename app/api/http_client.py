@@ -0,0 +1,343 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+import metrics
+import replay
+
+
+# Responses worth retrying: rate limited or a temporarily unavailable upstream
+RETRY_STATUSES:set[int] = {429, 502, 503, 504}
+
+
+class SharedHostLimits:
+    """Per-host concurrency limits and request spacing shared by every process that opens the same SQLite file.
+
+    Pre-forked server workers each have their own HttpClient, so limits kept in memory would be
+    enforced per worker and the real rate to an upstream would grow with the worker count. Here
+    each request in flight holds a row in a leases table and each host's next free start time is
+    a row in a slots table, both taken in immediate (write-locked) transactions so the workers
+    take turns. Leases expire, so a worker that dies mid-request can't hold its slot forever. The
+    connection is reopened in forked children.
+
+    Args:
+        path (str): path of the SQLite file (the shared cache file).
+        lease_ttl (float): seconds after which a slot that was never released is freed.
+        poll_interval (float): seconds between attempts to take a slot while the host is at its limit.
+    """
+
+    def __init__(self, path:str, lease_ttl:float=120.0, poll_interval:float=0.05):
+        self.path:str = path
+        self.lease_ttl:float = lease_ttl
+        self.poll_interval:float = poll_interval
+
+        self._connect()
+        os.register_at_fork(after_in_child=self._connect)
+
+
+    def _connect(self):
+        self._lock:threading.Lock = threading.Lock()
+        # Autocommit mode, so the transactions below are the ones we open
+        self._db:sqlite3.Connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS http_host_leases (id INTEGER PRIMARY KEY, host TEXT NOT NULL, expires_at REAL NOT NULL)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS http_host_slots (host TEXT PRIMARY KEY, next_slot REAL NOT NULL)')
+
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+
+    def try_acquire(self, host:str, limit:int) -> int|None:
+        """Take one of host's limit slots if one is free. Returns the lease id to release, or None."""
+        now:float = time.time()
+        with self._transaction() as db:
+            db.execute('DELETE FROM http_host_leases WHERE host = ? AND expires_at < ?', (host, now))
+            if db.execute('SELECT COUNT(*) FROM http_host_leases WHERE host = ?', (host,)).fetchone()[0] >= limit:
+                return None
+            return db.execute('INSERT INTO http_host_leases (host, expires_at) VALUES (?, ?)', (host, now + self.lease_ttl)).lastrowid
+
+
+    def acquire(self, host:str, limit:int) -> int:
+        """Wait for one of host's limit slots and return its lease id."""
+        while True:
+            lease:int|None = self.try_acquire(host, limit)
+            if lease is not None:
+                return lease
+            time.sleep(self.poll_interval)
+
+
+    def release(self, lease:int):
+        with self._lock:
+            self._db.execute('DELETE FROM http_host_leases WHERE id = ?', (lease,))
+
+
+    def reserve(self, host:str, interval:float) -> float:
+        """Reserve the next start time of host, at least interval seconds after the previous one (time.time() based)."""
+        now:float = time.time()
+        with self._transaction() as db:
+            row = db.execute('SELECT next_slot FROM http_host_slots WHERE host = ?', (host,)).fetchone()
+            slot:float = max(now, row[0]) if row is not None else now
+            db.execute('INSERT OR REPLACE INTO http_host_slots (host, next_slot) VALUES (?, ?)', (host, slot + interval))
+        return slot
+
+
+class HostState:
+    """Concurrency limit, request spacing and metrics of one upstream host.
+
+    The limit and spacing are kept in this process, or in shared (a SharedHostLimits) so they
+    hold across all server workers.
+    """
+
+    def __init__(self, name:str, max_concurrency:int, min_interval:float, shared:SharedHostLimits|None=None):
+        self.name:str = name
+        self.max_concurrency:int = max_concurrency
+        self.semaphore:threading.BoundedSemaphore = threading.BoundedSemaphore(max_concurrency)
+        self.min_interval:float = min_interval
+        self.shared:SharedHostLimits|None = shared
+        self.next_slot:float = 0.0
+        self.lock:threading.Lock = threading.Lock()
+
+        self.requests:int = 0
+        self.errors:int = 0
+        self.retries:int = 0
+        self.statuses:dict[int, int] = {}
+        self.latency_total:float = 0.0
+        self.latency_max:float = 0.0
+
+
+    def wait_for_slot(self):
+        """Space requests at least min_interval seconds apart (e.g. Nominatim's 1 request/s policy)."""
+        if self.min_interval <= 0:
+            return
+        if self.shared is not None:
+            delay:float = self.shared.reserve(self.name, self.min_interval) - time.time()
+        else:
+            with self.lock:
+                now:float = time.monotonic()
+                slot:float = max(now, self.next_slot)
+                self.next_slot = slot + self.min_interval
+            delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the host's max_concurrency request slots (this process's first, then the shared one)."""
+        with self.semaphore:
+            if self.shared is None:
+                yield
+                return
+            lease:int = self.shared.acquire(self.name, self.max_concurrency)
+            try:
+                yield
+            finally:
+                self.shared.release(lease)
+
+
+    def record(self, seconds:float, status:int|None):
+        with self.lock:
+            self.requests += 1
+            self.latency_total += seconds
+            self.latency_max = max(self.latency_max, seconds)
+            if status is None or status >= 400:
+                self.errors += 1
+            if status is not None:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'retries': self.retries,
+                'statuses': dict(self.statuses),
+                'latency_avg': self.latency_total / self.requests if self.requests else 0.0,
+                'latency_max': self.latency_max
+            }
+
+
+class HttpClient:
+    """Shared outbound HTTP client used for every upstream call.
+
+    Reuses pooled keep-alive connections, applies a timeout to every request, retries connection
+    errors and 429/5xx responses with exponential backoff (honoring Retry-After), and bounds the
+    number of concurrent requests per host so we stay within upstream rate limits under load.
+
+    Args:
+        timeout (tuple[float, float]): default (connect, read) timeout in seconds.
+        max_retries (int): retries after the first attempt.
+        backoff (float): base delay of the exponential backoff in seconds.
+        max_backoff (float): upper bound of a single retry delay in seconds.
+        host_limits (dict[str, int] | None): maximum concurrent requests per host.
+        host_intervals (dict[str, float] | None): minimum seconds between requests per host.
+        default_host_limit (int): concurrency limit of hosts not in host_limits.
+        pool_size (int): keep-alive connections kept per host.
+        shared_limits (SharedHostLimits | None): where to keep the host limits and spacing so they
+            hold across processes, or None to keep them in this process.
+    """
+
+    def __init__(self, timeout:tuple[float, float]=(5.0, 60.0), max_retries:int=3, backoff:float=0.5, max_backoff:float=30.0,
+                 host_limits:dict[str, int]|None=None, host_intervals:dict[str, float]|None=None, default_host_limit:int=8,
+                 pool_size:int=20, shared_limits:SharedHostLimits|None=None):
+        self.timeout:tuple[float, float] = timeout
+        self.max_retries:int = max_retries
+        self.backoff:float = backoff
+        self.max_backoff:float = max_backoff
+        self.host_limits:dict[str, int] = host_limits or {}
+        self.host_intervals:dict[str, float] = host_intervals or {}
+        self.default_host_limit:int = default_host_limit
+        self.shared_limits:SharedHostLimits|None = shared_limits
+
+        self.session:requests.Session = requests.Session()
+        adapter:HTTPAdapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._hosts:dict[str, HostState] = {}
+        self._lock:threading.Lock = threading.Lock()
+
+
+    def _host(self, host:str) -> HostState:
+        with self._lock:
+            state:HostState|None = self._hosts.get(host)
+            if state is None:
+                state = HostState(host, self.host_limits.get(host, self.default_host_limit), self.host_intervals.get(host, 0.0),
+                                  self.shared_limits)
+                self._hosts[host] = state
+            return state
+
+
+    def _record(self, hostname:str, host:HostState, seconds:float, status:int|None):
+        """Record an attempt in the host's stats and the exported metrics."""
+        host.record(seconds, status)
+        metrics.UPSTREAM_SECONDS.observe(seconds, host=hostname)
+        metrics.UPSTREAM_REQUESTS.inc(host=hostname, status=str(status) if status is not None else 'error')
+        if status is None or status >= 400:
+            metrics.UPSTREAM_ERRORS.inc(host=hostname)
+
+
+    def _retry_delay(self, attempt:int, response:requests.Response|None) -> float:
+        """Delay before the next attempt: the upstream's Retry-After if given, else jittered exponential backoff."""
+        retry_after:str|None = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                try:
+                    return min(max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0), self.max_backoff)
+                except (TypeError, ValueError):
+                    pass
+
+        return min(self.backoff * (2 ** attempt), self.max_backoff) * random.uniform(0.5, 1.0)
+
+
+    def _send(self, method:str, url:str, kwargs:dict) -> requests.Response:
+        """Send one attempt, through the tape of the current request if it's recorded or replayed (see replay.py)."""
+        tape:replay.Tape|None = replay.current()
+        if tape is None:
+            return self.session.request(method, url, **kwargs)
+        return tape.http(method, url, kwargs, lambda: self.session.request(method, url, **kwargs))
+
+
+    def request(self, method:str, url:str, **kwargs) -> requests.Response:
+        """
+        Send a request through the shared session.
+
+        Takes the same keyword arguments as requests.Session.request; timeout defaults to the
+        client's timeout.
+
+        Returns:
+            requests.Response: the final response (which may still be an error status once
+                retries are exhausted).
+
+        Raises:
+            requests.RequestException: if the request still fails after all retries.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        hostname:str = urlparse(url).netloc
+        host:HostState = self._host(hostname)
+
+        for attempt in range(self.max_retries + 1):
+            response:requests.Response|None = None
+            host.wait_for_slot()
+            with host.slot():
+                start:float = time.perf_counter()
+                try:
+                    response = self._send(method, url, kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    self._record(hostname, host, time.perf_counter() - start, None)
+                    if attempt == self.max_retries:
+                        raise
+                else:
+                    self._record(hostname, host, time.perf_counter() - start, response.status_code)
+                    if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                        return response
+
+            # Back off outside the semaphore so other requests to the host can proceed
+            with host.lock:
+                host.retries += 1
+            delay:float = self._retry_delay(attempt, response)
+            if response is not None:
+                response.close()   # Return its connection to the pool, or retries drain it
+            if not replay.instant():
+                time.sleep(delay)
+
+
+    def get(self, url:str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+
+    def post(self, url:str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+
+    def stats(self) -> dict:
+        """Return per-host request, error, retry and latency metrics."""
+        with self._lock:
+            hosts:dict[str, HostState] = dict(self._hosts)
+        return {name: state.stats() for name, state in hosts.items()}
+
+
+def worker_host_limits(workers:int) -> tuple[dict[str, int], dict[str, float]]:
+    """The host limits and intervals of config split between worker processes that each enforce their own,
+    so together they stay within the upstreams' rate limits (used when they don't share SHARED_CACHE_PATH).
+    Each worker keeps at least one concurrent request per host."""
+    return (
+        {host: max(1, limit // workers) for host, limit in config.HTTP_HOST_LIMITS.items()},
+        {host: interval * workers for host, interval in config.HTTP_HOST_INTERVALS.items()}
+    )
+
+
+# Shared client for all outbound calls. Server workers take the host limits from the shared cache
+# file; without one, each worker gets its share of them
+host_limits, host_intervals = worker_host_limits(1 if config.SHARED_CACHE_ENABLED else config.SERVER_WORKERS)
+http:HttpClient = HttpClient(
+    timeout=(config.HTTP_CONNECT_TIMEOUT, config.HTTP_READ_TIMEOUT),
+    max_retries=config.HTTP_MAX_RETRIES,
+    backoff=config.HTTP_BACKOFF,
+    host_limits=host_limits,
+    host_intervals=host_intervals,
+    shared_limits=SharedHostLimits(
+        config.SHARED_CACHE_PATH, lease_ttl=2 * (config.HTTP_CONNECT_TIMEOUT + config.HTTP_READ_TIMEOUT)
+    ) if config.SHARED_CACHE_ENABLED else None
+)
@@ -0,0 +1,165 @@
+import itertools
+import queue
+import threading
+import time
+import uuid
+from typing import Callable
+
+from caching import LRUCache, SQLiteCache
+
+
+# Named priorities accepted from the client; lower runs first
+PRIORITIES:dict[str, int] = {'high': 0, 'normal': 1, 'low': 2}
+
+
+def parse_priority(value) -> int:
+    """
+    Parse a priority given as a name in PRIORITIES or a number within their range.
+
+    Raises:
+        ValueError: if the priority is neither, e.g. a number below 'high' that would let a
+            client jump ahead of every other job in the shared queue.
+    """
+    if value in PRIORITIES:
+        return PRIORITIES[value]
+
+    highest, lowest = min(PRIORITIES.values()), max(PRIORITIES.values())
+    message:str = f'Priority must be one of {", ".join(PRIORITIES)} or a number from {highest} to {lowest}'
+    try:
+        priority:int = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(message) from None
+    if not highest <= priority <= lowest:
+        raise ValueError(message)
+    return priority
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its depth limit."""
+
+
+class JobManager:
+    """Runs submitted jobs on a bounded pool of worker threads.
+
+    Jobs wait in a priority queue with a depth limit, so bursts are rejected instead of piling up,
+    and job records (status and result) are kept in an expiring store.
+
+    Args:
+        handler (Callable): function run for each job, called with the job's payload.
+        workers (int): number of worker threads.
+        max_queue (int): maximum number of jobs waiting to run.
+        result_ttl (float): seconds a job record is kept after it was last updated.
+        max_results (int): maximum number of job records kept.
+        store (LRUCache | SQLiteCache | None): where job records are kept, by default in memory.
+            With several server workers pass a SQLiteCache so any worker can report on any job.
+    """
+
+    def __init__(self, handler:Callable, workers:int=4, max_queue:int=100, result_ttl:float=3600, max_results:int=10_000,
+                 store:LRUCache|SQLiteCache|None=None):
+        self.handler:Callable = handler
+        self.num_workers:int = workers
+        self.max_queue:int = max_queue
+        self.jobs:LRUCache|SQLiteCache = store if store is not None else LRUCache(max_results, result_ttl)
+
+        self._queue:queue.PriorityQueue = queue.PriorityQueue()
+        self._sequence = itertools.count()   # Keeps FIFO order within a priority
+        self._lock:threading.Lock = threading.Lock()
+        self._workers:list[threading.Thread] = []
+        self.running:int = 0
+        self.completed:int = 0
+        self.failed:int = 0
+        self.rejected:int = 0
+
+
+    def start(self):
+        """Start the worker threads if they aren't running yet."""
+        with self._lock:
+            while len(self._workers) < self.num_workers:
+                worker = threading.Thread(target=self._work, name=f'job-worker-{len(self._workers)}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+
+    def submit(self, payload, priority:int=PRIORITIES['normal']) -> str:
+        """
+        Queue a job.
+
+        Args:
+            payload: passed to the handler when the job runs.
+            priority (int): lower values run first.
+
+        Returns:
+            str: the job id.
+
+        Raises:
+            JobQueueFull: if max_queue jobs are already waiting.
+        """
+        self.start()
+
+        with self._lock:
+            if self._queue.qsize() >= self.max_queue:
+                self.rejected += 1
+                raise JobQueueFull(f'{self._queue.qsize()} jobs are already queued')
+
+            job_id:str = uuid.uuid4().hex
+            self.jobs.set(job_id, {
+                'id': job_id,
+                'status': 'queued',
+                'priority': priority,
+                'submitted_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'result': None,
+                'error': None
+            })
+            self._queue.put((priority, next(self._sequence), job_id, payload))
+
+        return job_id
+
+
+    def get(self, job_id:str) -> dict|None:
+        """Return the job record, or None if it's unknown or expired."""
+        return self.jobs.get(job_id)
+
+
+    def _update(self, job_id:str, **fields):
+        job:dict|None = self.jobs.get(job_id)
+        if job is not None:
+            self.jobs.set(job_id, {**job, **fields})
+
+
+    def _work(self):
+        while True:
+            _, _, job_id, payload = self._queue.get()
+            with self._lock:
+                self.running += 1
+            self._update(job_id, status='running', started_at=time.time())
+
+            try:
+                result = self.handler(payload)
+                self._update(job_id, status='done', result=result, finished_at=time.time())
+                with self._lock:
+                    self.completed += 1
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+                with self._lock:
+                    self.failed += 1
+            finally:
+                with self._lock:
+                    self.running -= 1
+                self._queue.task_done()
+
+
+    def stats(self) -> dict:
+        """Return queue depth, worker utilisation and job counters."""
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'running': self.running,
+                'workers': self.num_workers,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
@@ -1,24 +1,44 @@
-from flask import Flask, request, jsonify
+import time
+boot_started:float = time.perf_counter()   # Before the other imports, so the boot time includes them
+
+from flask import Flask, Response, request, jsonify, stream_with_context
 from gevent.pywsgi import WSGIServer
 from flask_compress import Compress
 from flask_cors import CORS
 
-import pandas as pd
-import numpy as np
 import json
+import contextvars
 import datetime as dt 
 import random 
-
-from terrain import create_triangular_paths, fetch_terrain_for_paths, calculate_distance
-from utils import df_to_graph, key_with_lowest_sum
-from country import get_country_from_coords
-from gpt_utils import get_chatgpt_response, format_prompt
-from path_model import get_top_5_combinations
-from weather import find_best_time_window
-
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+
+from terrain import create_triangular_paths, fetch_terrain_for_paths, calculate_distance, reported_details, terrain_cache
+from utils import key_with_lowest_sum
+from country import get_country_from_coords, country_cache
+from gpt_utils import get_chatgpt_response, stream_chatgpt_response, format_prompt, response_cache, response_calls
+from path_model import get_top_5_combinations, get_top_5_combinations_many, CostTable
+from weather import find_best_time_window, forecast_cache, forecast_fetches, api_key as weather_api_key
+from pipeline import Pipeline
+from routing import plan_routes, routing_available
+from http_client import http
+from jobs import JobManager, JobQueueFull, parse_priority
+from caching import SQLiteCache
+from static_data import StaticData
+from responses import paths_response, PrecompressedResponse
+from streams import ThreadStream
+import config
+import metrics
+import prefork
+import replay
+
+imports_done:float = time.perf_counter()
 
 # ---- Init flask ---- #
 app = Flask(__name__)
+app.config['COMPRESS_STREAMS'] = False   # Compressing would buffer the streaming endpoint
 compress = Compress()
 compress.init_app(app)
 
@@ -27,121 +47,436 @@ CORS(app, origins=['http://localhost:3000'])
 
 
 # ---- Init backend ---- #
-# Load the data, graph, etc.
-vehicles_df: pd.DataFrame = pd.read_csv('../../data/static/vehicle-definitions.csv')
-terrain_df: pd.DataFrame = pd.read_csv('../../data/static/terrain-definitions.csv')
-terrain_vehicle_matrix: np.matrix = df_to_graph(pd.read_csv('../../data/static/terrain-vehicle-matrix.csv'))
-strategies_df:pd.DataFrame = pd.read_csv('../../data/static/strategy-definitions.csv')
-
-with open('../../data/static/cost-matrix.json', 'r') as file:
-    cost_matrix_json:dict = json.load(file)
+# Load the vehicle/terrain/strategy definitions and the compiled cost matrix from their snapshot,
+# which is rebuilt from data/static whenever the CSV/JSON files change
+static_data:StaticData = StaticData(config.STATIC_DATA_DIR, config.STATIC_SNAPSHOT_PATH)
+cost_table:CostTable = static_data.cost_table
 
 
 # ---- PROCESSING ---- #
 
-def process_form_data(data):
+def generate_paths(data:dict, vehicles:list[str]) -> list:
+    """Create candidate paths between the form's start and end points.
 
-    # -- Generating paths -- #
-    # Create paths with triangular deviations
+    With path mode 'routing' (the form's 'path-mode' or config.PATH_MODE) and the offline terrain
+    backend (see routing.routing_available) these are the cheapest diverse grid routes of the
+    selected vehicles; otherwise, or if no vehicle can reach the end, paths with random triangular
+    deviations."""
     start_point:tuple[float, float] = (float(data['start-lat']), float(data['start-lon']))
     end_point:tuple[float, float] = (float(data['end-lat']), float(data['end-lon']))
 
-    paths = create_triangular_paths(
+    if data.get('path-mode', config.PATH_MODE) == 'routing' and routing_available():
+        routes:dict[str, list[dict]] = plan_routes(
+            start_point, end_point, vehicles, cost_table, config.ROUTING_ROUTES_PER_VEHICLE, config.ROUTING_GRID_CELLS, config.ROUTING_MARGIN
+        )
+
+        # Take the best route of every vehicle first, then the second best, ...
+        paths:list = []
+        for rank in range(config.ROUTING_ROUTES_PER_VEHICLE):
+            for vehicle_routes in routes.values():
+                if rank < len(vehicle_routes) and vehicle_routes[rank]['path'] not in paths:
+                    paths.append(vehicle_routes[rank]['path'])
+        if paths:
+            return paths[:5]
+
+    # A form's 'seed' fixes the deviation factor and the deviations, so its paths can be reproduced
+    seed:int|None = int(data['seed']) if data.get('seed') else None
+    return create_triangular_paths(
         start_point,
         end_point,
-        5,                              # Number of paths
+        5,                                              # Number of paths
         4,
-        round(random.uniform(0,1), 1)   # Deviation factor
+        round(random.Random(seed).uniform(0, 1), 1),    # Deviation factor
+        seed=seed
     )
 
-    # Fetch terrain counts for each path
-    terrain_count_with_paths = fetch_terrain_for_paths(paths)
 
-    # Get the terrains from the terrain counts
+def selected_vehicles(data:dict) -> list[str]:
+    """Get the names of the vehicles selected in the form."""
+    vehicles:list[str] = []
+    for vid in static_data.vehicle_ids: 
+        if vid in data: 
+            vehicles.append(static_data.vehicle_name_by_id[vid])
+
+    return vehicles
+
+
+def terrains_from_counts(terrain_count_with_paths:dict) -> list[str]:
+    """Get the distinct terrains crossed by any of the paths."""
     terrains:list[str] = []
     for d in terrain_count_with_paths.values():
         these_terrains:list[str] = d['terrain_counts'].keys()
         terrains.extend(these_terrains)
     
-    terrains = list(set(terrains))
-    
-    # Get the vehicles based on the inputs 
-    all_vehicle_ids:list[str] = vehicles_df['vehicle_id'].values
-    vehicles:list[str] = []
-    for vid in all_vehicle_ids: 
-        if vid in data: 
-            vehicles.append(vehicles_df.loc[vehicles_df['vehicle_id'] == vid]['vehicle_name'].values[0])
+    return sorted(set(terrains))   # Sorted so the prompt doesn't depend on the order the paths finished in
+
+
+def generate_ai_response(data:dict, vehicles:list[str], terrain_count_with_paths:dict, start_country:str, on_token=None) -> str:
+    """Ask the OpenAI model for an operations plan based on the form and the terrain along the paths.
+    If on_token is given, the response is streamed and on_token is called with each piece of it."""
+
+    # Create a dict with the input params to construct the prompt for the model
+    model_prompt_inputs:dict = {
+        'vehicles': vehicles,
+        'start-location': (data['start-lat'], data['start-lon']),
+        'start-country': start_country,
+        'target-location': (data['end-lat'], data['end-lon']),
+        'straight-distance': calculate_distance(data['start-lat'], data['start-lon'], data['end-lat'], data['end-lon']),
+        'terrains': terrains_from_counts(terrain_count_with_paths),
+        'total-personnel': data['personnel'],
+        'target-time-on-obj': data['target-time-on-obj'],
+        'expected-resistance': data['resistance'],
+        'strategy': data['strategy'], 
+        'strategy-description': static_data.strategy_descriptions[data['strategy']],
+        'primary-objective': data['objective'],
+        'additional-context': data['context']
+    }
+
+    # Use the OpenAI API to get a response from chatgpt
+    if on_token is not None:
+        pieces:list[str] = []
+        for piece in stream_chatgpt_response(format_prompt(model_prompt_inputs), data['openai-api-key'], data['openai-model']):
+            pieces.append(piece)
+            on_token(piece)
+        return ''.join(pieces)
+
+    return get_chatgpt_response(
+        format_prompt(model_prompt_inputs),
+        data['openai-api-key'],
+        data['openai-model']
+    )
+
 
-    # -- Generate an AI response -- #
-    api_key:str = data.get('openai-api-key', '')
-    model_name:str = data.get('openai-model', '')
+def find_weather_window(data:dict, vehicles:list[str]) -> tuple:
+    """Find the best time window to execute the mission weatherwise."""
+
+    current_date = replay.now()
+    end_date = dt.datetime.strptime(data['latest-date'], "%Y-%m-%d")
+    return find_best_time_window(weather_api_key, data['end-lat'], data['end-lon'], current_date, min(end_date, current_date + dt.timedelta(days=10)), int(data['target-time-on-obj']), vehicles, data['strategy'], data['objective'])
+
+
+def build_pipeline(data:dict, vehicles:list[str], emit=None) -> Pipeline:
+    """
+    Build the stage graph of a form submission.
+
+    Weather and geocoding only depend on the form, so they run alongside path generation and
+    terrain fetching; the LLM prompt needs the terrain and country, and scoring needs the terrain.
+    If emit is given, per-path terrain and LLM tokens are reported through emit(event, payload)
+    as they become available.
+    """
+    pipeline:Pipeline = Pipeline()
+    pipeline.add('paths', lambda: generate_paths(data, vehicles))
+    if emit is not None:
+        pipeline.add('terrain', lambda paths: fetch_terrain_for_paths(
+            paths, on_path_done=lambda name, details: emit('terrain', {'name': name, **reported_details(details)})
+        ), deps=['paths'])
+    else:
+        pipeline.add('terrain', fetch_terrain_for_paths, deps=['paths'])
+    pipeline.add('scoring', lambda terrain: get_top_5_combinations(terrain, cost_table, vehicles), deps=['terrain'])
+    pipeline.add('weather', lambda: find_weather_window(data, vehicles))
 
     # If given an API key and model name, generate an AI response
-    if api_key and model_name: 
-
-        # Create a dict with the input params to construct the prompt for the model
-        model_prompt_inputs:dict = {
-            'vehicles': vehicles,
-            'start-location': (data['start-lat'], data['start-lon']),
-            'start-country': get_country_from_coords(data['start-lat'], data['start-lon']),
-            'target-location': (data['end-lat'], data['end-lon']),
-            'straight-distance': calculate_distance(data['start-lat'], data['start-lon'], data['end-lat'], data['end-lon']),
-            'terrains': terrains,
-            'total-personnel': data['personnel'],
-            'target-time-on-obj': data['target-time-on-obj'],
-            'expected-resistance': data['resistance'],
-            'strategy': data['strategy'], 
-            'strategy-description': strategies_df.loc[strategies_df['strategy_name'] == data['strategy']]['strategy_description'].values[0],
-            'primary-objective': data['objective'],
-            'additional-context': data['context']
-        }
-
-        # Use the OpenAI API to get a response from chatgpt
-        response:str = get_chatgpt_response(
-            format_prompt(model_prompt_inputs),
-            data['openai-api-key'],
-            data['openai-model']
-        )
-    else: 
-        response:str = "[Not given OpenAI API key or model name]"
+    if data.get('openai-api-key', '') and data.get('openai-model', ''):
+        pipeline.add('geocode', lambda: get_country_from_coords(data['start-lat'], data['start-lon']))
+        on_token = (lambda piece: emit('ai_token', piece)) if emit is not None else None
+        pipeline.add('llm', lambda terrain, country: generate_ai_response(data, vehicles, terrain, country, on_token), deps=['terrain', 'geocode'])
 
-    # Get the top five paths to return to the client
-    top_five_paths = get_top_5_combinations(terrain_count_with_paths, cost_matrix_json, vehicles)
-    print("The top five paths are as follows: ", top_five_paths)
+    return pipeline
 
-    # Get the API Key for the weather functionality
-    with open('weather_api.json', 'r') as file:
-        weather_api_key = json.load(file)['api_key']
 
-    # Best time window to execute the mission weatherwise
-    print("STARTING TO RUN WEATHER PROCESS")
-    current_date = dt.datetime.now()
-    end_date = dt.datetime.strptime(data['latest-date'], "%Y-%m-%d")
-    best_time_window, best_vehicle, best_cost, best_weather_conditions = find_best_time_window(weather_api_key, data['end-lat'], data['end-lon'], current_date, min(end_date, current_date + dt.timedelta(days=10)), int(data['target-time-on-obj']), vehicles, data['strategy'], data['objective'])
-    
+def format_weather(weather_window:tuple) -> dict:
+    """Format the result of find_best_time_window for the response."""
+    best_time_window, best_vehicle, best_cost, best_weather_conditions = weather_window
     print(f"Best Time Window: {best_time_window}")
     print(f"Best Vehicle: {best_vehicle}")
     print(f"Weather Conditions: {best_weather_conditions}")
 
-    best_weather_conditions = ', '.join(list(set(best_weather_conditions)))
+    return {
+        'weather': ', '.join(dict.fromkeys(best_weather_conditions or [])),
+        'vehicle': best_vehicle,
+        'time_frame': best_time_window
+    }
+
+
+def run_pipeline(data:dict, vehicles:list[str], emit=None, on_stage_done=None) -> tuple[dict, dict, dict|None]:
+    """
+    Run the stages of a form submission and record their timings in the exported metrics.
+
+    Returns:
+        tuple[dict, dict, dict | None]: the stage results, the stage timings, and the breakdown of
+            the finer-grained spans (terrain lookups, upstream queries) when the form asks for it
+            with 'include-timings'.
+    """
+    # Every submission gets a seed for its random paths, so a recording of it (see replay.py) reruns identically
+    data = {**data, 'seed': data.get('seed') or str(random.getrandbits(32))}
+    pipeline:Pipeline = build_pipeline(data, vehicles, emit)
+
+    with replay.session(data, streamed=emit is not None) as tape:
+        if str(data.get('include-timings', '')).lower() in ('1', 'true', 'yes', 'on'):
+            with metrics.record_spans() as recorder:
+                results, timings = pipeline.run(on_stage_done)
+            spans:dict|None = recorder.summary()
+        else:
+            results, timings = pipeline.run(on_stage_done)
+            spans = None
+
+        if tape is not None:
+            tape.result = replay.comparable(build_result(results, timings))
+
+    for stage, seconds in timings.items():
+        metrics.STAGE_SECONDS.observe(seconds, stage=stage)
+
+    return results, timings, spans
+
+
+def build_result(results:dict, timings:dict, spans:dict|None=None) -> dict:
+    """Assemble the response of a form submission from the results of its stages."""
+    terrain_count_with_paths = results['terrain']
+    response:str = results.get('llm', "[Not given OpenAI API key or model name]")
+
+    # Get the top five paths to return to the client
+    top_five_paths = results['scoring']
+    print("The top five paths are as follows: ", top_five_paths)
+
+    weather:dict = format_weather(results['weather'])
 
     # Return the result with paths and terrain counts
     return {
         'status': 'success',
         'message': 'Form submitted successfully',
-        'paths': terrain_count_with_paths,
+        'paths': {name: reported_details(details) for name, details in terrain_count_with_paths.items()},
         'ai_response': response,
         'optimal_set': {
-            'weather': best_weather_conditions,
-            'vehicle': best_vehicle,
-            'time_frame': best_time_window,
+            **weather,
             'path': key_with_lowest_sum(top_five_paths)
-        }
+        },
+        'timings': {stage: round(seconds, 3) for stage, seconds in timings.items()},
+        **({'spans': spans} if spans is not None else {})
         #'top_paths': top_five_paths
     }
 
 
+def process_form_data(data):
+    # Get the vehicles based on the inputs 
+    vehicles:list[str] = selected_vehicles(data)
+
+    # Run the independent stages concurrently
+    results, timings, spans = run_pipeline(data, vehicles)
+
+    return build_result(results, timings, spans)
+
+
+def stream_form_data(data):
+    """
+    Process a form submission, yielding NDJSON events as partial results become available:
+    'paths', one 'terrain' per path (its name, path and terrain_counts), 'scores', 'weather', 'ai_token' pieces of the AI plan,
+    and finally 'result' with the same payload process_form_data returns (or 'error').
+    """
+    # Waited on without blocking the worker's other connections (see streams.py)
+    events:ThreadStream = ThreadStream()
+
+    def emit(event:str, payload):
+        events.put({'event': event, 'data': payload})
+
+    def on_stage_done(name:str, result, seconds:float):
+        if name == 'paths':
+            emit('paths', result)
+        elif name == 'scoring':
+            emit('scores', result)
+        elif name == 'weather':
+            emit('weather', format_weather(result))
+
+    def run():
+        try:
+            vehicles:list[str] = selected_vehicles(data)
+            results, timings, spans = run_pipeline(data, vehicles, emit, on_stage_done)
+            emit('result', build_result(results, timings, spans))
+        except Exception as e:
+            print(f"Error processing form submission: {e}")
+            emit('error', str(e))
+        finally:
+            events.finish()
+
+    # In a copy of this context, so a replay in progress (see replay.py) carries over to the thread
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True).start()
+
+    for event in events:
+        yield json.dumps(event, default=float) + '\n'
+
+
+def mission_form(mission:dict, defaults:dict) -> dict:
+    """Turn a mission of a batch into the form fields a single submission takes: defaults are
+    filled in, values become strings and a 'vehicles' list of ids becomes the vehicle checkboxes."""
+    form:dict = {key: str(value) for key, value in {**defaults, **mission}.items() if key != 'vehicles'}
+    for vehicle_id in mission.get('vehicles', defaults.get('vehicles', [])):
+        form[vehicle_id] = 'on'
+    return form
+
+
+def stream_mission_batch(forms:list[dict]):
+    """
+    Plan many missions (given as form fields, see mission_form) together, yielding NDJSON events: a 'mission' event with the mission's
+    index and the same result process_form_data returns as each mission completes (or
+    'mission_error' with its index and error), then a 'summary' of the batch (or 'error').
+
+    The candidate paths of all missions are sampled in one pass, so terrain sample points are
+    deduplicated across missions on the terrain cache grid and a batch costs one lookup per
+    distinct cell however many missions cross it. The paths of all missions are scored in one
+    matrix product, and weather windows (shared per location by the forecast cache) and AI plans
+    run concurrently while terrain is resolved.
+    """
+    # Waited on without blocking the worker's other connections (see streams.py)
+    events:ThreadStream = ThreadStream()
+
+    def emit(event:str, payload):
+        events.put({'event': event, 'data': payload})
+
+    def run():
+        batch_start:float = time.perf_counter()
+        timings:dict[str, float] = {}
+        terrain_stats:dict = {}
+        emitted:set[int] = set()
+
+        def finish(i:int, futures:dict[str, Future]):
+            # Emit a mission once its weather window (and AI plan) are known
+            try:
+                results:dict = {'terrain': terrain_list[i], 'scoring': scores_list[i], 'weather': futures['weather'].result()}
+                if 'llm' in futures:
+                    results['llm'] = futures['llm'].result()
+                emit('mission', {'index': i, 'result': build_result(results, timings)})
+            except Exception as e:
+                print(f"Error planning mission {i}: {e}")
+                emit('mission_error', {'index': i, 'error': str(e)})
+            emitted.add(i)
+
+        try:
+            vehicles_list:list[list[str]] = [selected_vehicles(form) for form in forms]
+
+            # Leaf calls on one pool, AI plans (which wait for the geocoding) on another so they can't starve it
+            with ThreadPoolExecutor(max_workers=config.BATCH_WORKERS) as upstream, ThreadPoolExecutor(max_workers=config.BATCH_WORKERS) as llm_pool:
+                mission_futures:list[dict[str, Future]] = []
+                for form, vehicles in zip(forms, vehicles_list):
+                    futures:dict[str, Future] = {'weather': upstream.submit(metrics.in_context(find_weather_window), form, vehicles)}
+                    if form.get('openai-api-key', '') and form.get('openai-model', ''):
+                        futures['geocode'] = upstream.submit(metrics.in_context(get_country_from_coords), form['start-lat'], form['start-lon'])
+                    mission_futures.append(futures)
+
+                start:float = time.perf_counter()
+                paths_list:list[list] = []
+                for i, (form, vehicles) in enumerate(zip(forms, vehicles_list)):
+                    try:
+                        paths_list.append(generate_paths(form, vehicles))
+                    except Exception as e:
+                        # A malformed mission fails on its own without holding up the batch
+                        print(f"Error planning mission {i}: {e}")
+                        emit('mission_error', {'index': i, 'error': str(e)})
+                        emitted.add(i)
+                        paths_list.append([])
+                timings['paths'] = time.perf_counter() - start
+
+                # Resolve the terrain of every mission's paths in one pass, then split it back per mission
+                start = time.perf_counter()
+                all_details:list[dict] = list(fetch_terrain_for_paths([path for paths in paths_list for path in paths], stats=terrain_stats).values())
+                terrain_list:list[dict] = []
+                offset:int = 0
+                for paths in paths_list:
+                    terrain_list.append({f'Path {j + 1}': details for j, details in enumerate(all_details[offset:offset + len(paths)])})
+                    offset += len(paths)
+                timings['terrain'] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                scores_list:list[dict] = get_top_5_combinations_many(terrain_list, cost_table, vehicles_list)
+                timings['scoring'] = time.perf_counter() - start
+
+                for i, (form, vehicles, terrain_data, futures) in enumerate(zip(forms, vehicles_list, terrain_list, mission_futures)):
+                    if 'geocode' in futures and i not in emitted:
+                        futures['llm'] = llm_pool.submit(metrics.in_context(
+                            lambda form=form, vehicles=vehicles, terrain_data=terrain_data, geocode=futures['geocode']:
+                                generate_ai_response(form, vehicles, terrain_data, geocode.result())
+                        ))
+
+                # Stream missions back as they complete
+                pending:set[Future] = {f for futures in mission_futures for f in futures.values()}
+                while len(emitted) < len(forms):
+                    for i, futures in enumerate(mission_futures):
+                        if i not in emitted and all(f.done() for f in futures.values()):
+                            finish(i, futures)
+                    pending = {f for f in pending if not f.done()}
+                    if pending:
+                        wait(pending, return_when=FIRST_COMPLETED)
+
+            timings['total'] = time.perf_counter() - batch_start
+            for stage, seconds in timings.items():
+                metrics.STAGE_SECONDS.observe(seconds, stage=f'batch_{stage}')
+
+            emit('summary', {
+                'missions': len(forms),
+                'paths': sum(len(paths) for paths in paths_list),
+                'terrain': terrain_stats,
+                'timings': {stage: round(seconds, 3) for stage, seconds in timings.items()}
+            })
+        except Exception as e:
+            print(f"Error processing mission batch: {e}")
+            emit('error', str(e))
+        finally:
+            events.finish()
+
+    threading.Thread(target=run, daemon=True).start()
+
+    for event in events:
+        yield json.dumps(event, default=float) + '\n'
+
+
+# Bounded pool of planning workers behind the job API
+job_manager:JobManager = JobManager(
+    process_form_data,
+    workers=config.JOB_WORKERS,
+    max_queue=config.JOB_QUEUE_DEPTH,
+    result_ttl=config.JOB_RESULT_TTL,
+    store=SQLiteCache(config.SHARED_CACHE_PATH, 'jobs', config.SHARED_CACHE_ENTRIES, config.JOB_RESULT_TTL) if config.SHARED_CACHE_ENABLED else None
+)
+
+
+def cache_metrics() -> list[str]:
+    """Cache and job queue counters, read from their owners at scrape time."""
+    caches:dict[str, dict] = {
+        'weather': forecast_cache.stats(),
+        'llm': response_cache.stats(),
+        'country': country_cache.stats()
+    }
+    if terrain_cache is not None:
+        caches['terrain'] = terrain_cache.stats()
+    jobs:dict = job_manager.stats()
+
+    return [
+        *metrics.gauge_lines('vthax_cache_hits_total', 'Cache hits', 'cache', {name: c['hits'] for name, c in caches.items()}, 'counter'),
+        *metrics.gauge_lines('vthax_cache_misses_total', 'Cache misses', 'cache', {name: c['misses'] for name, c in caches.items()}, 'counter'),
+        *metrics.gauge_lines('vthax_shared_calls_total', 'Upstream calls collapsed into an identical call in flight', 'call',
+                             {'forecast': forecast_fetches.shared, 'llm': response_calls.shared}, 'counter'),
+        *metrics.gauge_lines('vthax_jobs', 'Planning jobs by state', 'state', {'queued': jobs['queued'], 'running': jobs['running']}),
+        *metrics.gauge_lines('vthax_jobs_total', 'Finished planning jobs by outcome', 'outcome',
+                             {'completed': jobs['completed'], 'failed': jobs['failed'], 'rejected': jobs['rejected']}, 'counter')
+    ]
+
+metrics.registry.register_collector(cache_metrics)
+
+
 # ---- ENDPOINTS ---- #
+@app.before_request
+def start_request_timer():
+    request.environ['vthax.start'] = time.perf_counter()
+
+
+@app.after_request
+def record_request_time(response):
+    # For the streaming endpoint this is the time until the response starts, not until it ends
+    start:float|None = request.environ.get('vthax.start')
+    if start is not None:
+        endpoint:str = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+
 @app.route('/api/submit-form', methods=['POST'])
 def submit_form():
     print(f'\n\033[0m[{dt.datetime.now().strftime("%H:%M:%S")}] \033[92mForm submission.\033[0m')
@@ -152,18 +487,119 @@ def submit_form():
     # Info print
     print(f'\033[0m[{dt.datetime.now().strftime("%H:%M:%S")}] \033[92mDone. Returning.\033[0m\n')
 
-    return jsonify(result)
+    return paths_response(result)
 
 
-@app.route('/api/get-input-params', methods=['GET'])
-def get_input_params():
+@app.route('/api/submit-form/stream', methods=['POST'])
+def submit_form_stream():
+    print(f'\n\033[0m[{dt.datetime.now().strftime("%H:%M:%S")}] \033[92mStreaming form submission.\033[0m')
+
+    # Read the form before streaming starts, the request context is gone once the body is being sent
+    data:dict = dict(request.form)
+
+    return Response(stream_with_context(stream_form_data(data)), mimetype='application/x-ndjson')
+
+
+@app.route('/api/missions/batch', methods=['POST'])
+def submit_mission_batch():
+    body:dict = request.get_json(silent=True) or {}
+    missions = body.get('missions')
+    if not isinstance(missions, list) or not missions or not all(isinstance(m, dict) for m in missions):
+        return jsonify({'status': 'error', 'message': 'Expected a JSON body with a non-empty "missions" list'}), 400
+    if len(missions) > config.BATCH_MAX_MISSIONS:
+        return jsonify({'status': 'error', 'message': f'At most {config.BATCH_MAX_MISSIONS} missions per batch'}), 400
+
+    print(f'\n\033[0m[{dt.datetime.now().strftime("%H:%M:%S")}] \033[92mBatch of {len(missions)} missions.\033[0m')
+
+    # Fields shared by all missions (e.g. the API key or latest date) can be given once as 'defaults'
+    defaults:dict = body.get('defaults') or {}
+    forms:list[dict] = [mission_form(mission, defaults) for mission in missions]
+
+    return Response(stream_with_context(stream_mission_batch(forms)), mimetype='application/x-ndjson')
+
+
+@app.route('/api/routes', methods=['POST'])
+def find_routes():
+    if not routing_available():
+        return jsonify({'status': 'error', 'message': 'Routing requires the offline terrain backend (TERRAIN_BACKEND=offline)'}), 400
+
+    data:dict = dict(request.form)
+    start_point:tuple[float, float] = (float(data['start-lat']), float(data['start-lon']))
+    end_point:tuple[float, float] = (float(data['end-lat']), float(data['end-lon']))
+    k:int = int(data.get('routes', config.ROUTING_ROUTES_PER_VEHICLE))
+
+    routes:dict[str, list[dict]] = plan_routes(
+        start_point, end_point, selected_vehicles(data), cost_table, k, config.ROUTING_GRID_CELLS, config.ROUTING_MARGIN
+    )
+
+    return paths_response({'status': 'success', 'routes': routes})
+
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    data:dict = dict(request.form)
+
+    # Priority is 'high', 'normal' or 'low' (or a number in their range, lower runs first)
+    try:
+        priority:int = parse_priority(data.pop('priority', 'normal'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    try:
+        job_id:str = job_manager.submit(data, priority)
+    except JobQueueFull as e:
+        response = jsonify({'status': 'error', 'message': f'Planning queue is full ({e}), try again later'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    print(f'\033[0m[{dt.datetime.now().strftime("%H:%M:%S")}] \033[92mQueued job {job_id}.\033[0m')
+
+    return jsonify({
+        'status': 'queued',
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}',
+        'result_url': f'/api/jobs/{job_id}/result'
+    }), 202
+
+
+@app.route('/api/jobs', methods=['GET'])
+def job_stats():
+    return jsonify(job_manager.stats())
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id:str):
+    job:dict|None = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown or expired job'}), 404
+
+    return jsonify({k: v for k, v in job.items() if k != 'result'})
+
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id:str):
+    job:dict|None = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown or expired job'}), 404
+
+    if job['status'] == 'done':
+        return paths_response(job['result'])
+    if job['status'] == 'failed':
+        return jsonify({'status': 'error', 'message': job['error']}), 500
+
+    # Not finished yet
+    return jsonify({'status': job['status'], 'job_id': job_id}), 202
+
+
+def input_params_payload() -> dict:
+    """The vehicles, strategies and objectives offered by the form."""
     data: dict = {
         'vehicles': [
             {
-                'vehicle-id': r['vehicle_id'],
-                'vehicle-name': r['vehicle_name'],
-                'vehicle-description': r['description']
-            } for idx, r in vehicles_df.iterrows()
+                'vehicle-id': vehicle_id,
+                'vehicle-name': vehicle_name,
+                'vehicle-description': description
+            } for vehicle_id, vehicle_name, description in zip(static_data.vehicle_ids, static_data.vehicle_names, static_data.vehicle_descriptions)
         ],
         'strategies': [
             {
@@ -191,10 +627,73 @@ def get_input_params():
         ]
     }
 
-    return jsonify({'data': data})
+    return {'data': data}
+
+
+# The form's options only change with the static data, so the response is serialized and compressed once
+input_params:PrecompressedResponse = PrecompressedResponse(input_params_payload(), config.INPUT_PARAMS_MAX_AGE)
+
+
+@app.route('/api/get-input-params', methods=['GET'])
+def get_input_params():
+    return input_params.response()
+
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        'terrain': terrain_cache.stats() if terrain_cache is not None else None,
+        'weather': {**forecast_cache.stats(), 'shared_fetches': forecast_fetches.shared},
+        'llm': {**response_cache.stats(), 'shared_calls': response_calls.shared},
+        'country': country_cache.stats()
+    })
+
+
+@app.route('/api/upstream-stats', methods=['GET'])
+def upstream_stats():
+    return jsonify(http.stats())
+
 
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.registry.expose(), mimetype='text/plain; version=0.0.4')
 
-# ---- Run forever ---- $
+
+# ---- Boot time ---- #
+def preload_imports():
+    """Import the libraries that are otherwise imported on first use, so forked workers inherit
+    them instead of each paying for the import on its first request."""
+    import openai
+
+
+boot_seconds:dict[str, float] = {
+    'imports': imports_done - boot_started,
+    'init': time.perf_counter() - imports_done
+}
+metrics.registry.register_collector(
+    lambda: metrics.gauge_lines('vthax_boot_seconds', 'Seconds spent starting the process, by phase', 'phase', boot_seconds)
+)
+print(
+    f'\033[0m[{dt.datetime.now().strftime("%H:%M:%S")}] \033[92mLoaded in {sum(boot_seconds.values()) * 1000:.0f} ms '
+    f'(imports {boot_seconds["imports"] * 1000:.0f} ms, init {boot_seconds["init"] * 1000:.0f} ms, '
+    f'static data {"rebuilt" if static_data.rebuilt else "from snapshot"}).\033[0m'
+)
+
+
+# ---- Run forever ---- #
 if __name__ == '__main__':
-    http_server = WSGIServer(('0.0.0.0', 8000), app)
-    http_server.serve_forever()
\ No newline at end of file
+    if config.PRELOAD_IMPORTS:
+        preload_imports()
+
+    if config.SERVER_WORKERS > 1:
+        # Workers inherit the static tables copy-on-write and share the caches in SHARED_CACHE_PATH;
+        # each scrape of /api/metrics exposes the metrics of every worker, labeled by worker
+        metrics_dir:str = tempfile.mkdtemp(prefix='vthax-metrics-')
+        prefork.serve(
+            app, config.SERVER_HOST, config.SERVER_PORT, config.SERVER_WORKERS, config.SERVER_BACKLOG,
+            on_worker_start=lambda slot: metrics.registry.share_with_workers(metrics_dir, slot, config.METRICS_SNAPSHOT_INTERVAL),
+            on_exit=lambda: shutil.rmtree(metrics_dir, ignore_errors=True)
+        )
+    else:
+        http_server = WSGIServer((config.SERVER_HOST, config.SERVER_PORT), app)
+        http_server.serve_forever()
\ No newline at end of file
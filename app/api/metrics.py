@@ -0,0 +1,299 @@
+import contextvars
+import glob
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+
+# Latency buckets in seconds, from cache hits up to slow upstream calls
+DEFAULT_BUCKETS:tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames:tuple[str, ...], values:tuple, le:str|None=None) -> str:
+    pairs:list[str] = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _label_key(labelnames:tuple[str, ...], labels:dict) -> tuple[str, ...]:
+    """Label values as strings, so samples labeled with ints (status codes) and strings sort together."""
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _sorted_samples(values:dict) -> list:
+    return sorted(values.items(), key=lambda kv: tuple(map(str, kv[0])))
+
+
+def _format_value(value:float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing Prometheus counter, optionally split by labels."""
+
+    def __init__(self, name:str, documentation:str, labelnames:tuple[str, ...]=()):
+        self.name:str = name
+        self.documentation:str = documentation
+        self.labelnames:tuple[str, ...] = labelnames
+        self._values:dict[tuple, float] = {}
+        self._lock:threading.Lock = threading.Lock()
+
+
+    def inc(self, amount:float=1.0, **labels):
+        key:tuple = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+    def expose(self) -> list[str]:
+        lines:list[str] = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in _sorted_samples(self._values):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    """Prometheus histogram of observed values (e.g. latencies), optionally split by labels."""
+
+    def __init__(self, name:str, documentation:str, labelnames:tuple[str, ...]=(), buckets:tuple[float, ...]=DEFAULT_BUCKETS):
+        self.name:str = name
+        self.documentation:str = documentation
+        self.labelnames:tuple[str, ...] = labelnames
+        self.buckets:tuple[float, ...] = tuple(sorted(buckets))
+        self._values:dict[tuple, list] = {}   # labels -> [bucket counts..., sum, count]
+        self._lock:threading.Lock = threading.Lock()
+
+
+    def observe(self, value:float, **labels):
+        key:tuple = _label_key(self.labelnames, labels)
+        with self._lock:
+            state:list|None = self._values.get(key)
+            if state is None:
+                state = [0] * len(self.buckets) + [0.0, 0]
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+
+    def expose(self) -> list[str]:
+        lines:list[str] = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, state in _sorted_samples(self._values):
+                for bound, count in zip(self.buckets, state):
+                    lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, _format_value(bound))} {count}')
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, "+Inf")} {state[-1]}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}')
+                lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}')
+        return lines
+
+
+class Registry:
+    """Holds the metrics exported on /api/metrics, plus collectors that report values computed at
+    scrape time (e.g. cache counters kept by the caches themselves).
+
+    Pre-forked server workers each keep their own metrics. Once share_with_workers is called,
+    every worker writes its samples to a snapshot file in a common directory, periodically and
+    whenever it serves a scrape, and a scrape exposes the samples of all workers, each labeled
+    with its worker slot (so sum by the other labels to aggregate them)."""
+
+    def __init__(self):
+        self.metrics:list = []
+        self.collectors:list[Callable[[], list[str]]] = []
+        self.snapshot_dir:str|None = None
+        self.worker:str|None = None
+
+
+    def counter(self, name:str, documentation:str, labelnames:tuple[str, ...]=()) -> Counter:
+        metric:Counter = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+
+    def histogram(self, name:str, documentation:str, labelnames:tuple[str, ...]=(), buckets:tuple[float, ...]=DEFAULT_BUCKETS) -> Histogram:
+        metric:Histogram = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+
+    def register_collector(self, collector:Callable[[], list[str]]):
+        """Register a function returning exposition lines, called on every scrape."""
+        self.collectors.append(collector)
+
+
+    def share_with_workers(self, directory:str, worker:int, interval:float):
+        """Expose this worker's metrics alongside the other workers' (see the class docstring), writing
+        a snapshot to directory every interval seconds. Call it in the worker, after the fork."""
+        self.snapshot_dir = directory
+        self.worker = str(worker)
+        self.write_snapshot()
+
+        def flush():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_snapshot()
+                except Exception as e:
+                    print(f"Metrics snapshot failed: {e}")
+
+        threading.Thread(target=flush, daemon=True).start()
+
+
+    def write_snapshot(self):
+        """Write this worker's samples to its snapshot file (atomically, so scrapes never read half of it)."""
+        path:str = os.path.join(self.snapshot_dir, f'worker-{self.worker}.prom')
+        with open(path + '.tmp', 'w') as file:
+            file.write(self.expose_local())
+        os.replace(path + '.tmp', path)
+
+
+    def expose(self) -> str:
+        """Render every metric in the Prometheus text exposition format, of every worker if shared."""
+        if self.snapshot_dir is None:
+            return self.expose_local()
+
+        self.write_snapshot()
+        families:dict[str, list[str]] = {}   # metric name -> HELP and TYPE lines, then the samples of every worker
+        for path in sorted(glob.glob(os.path.join(self.snapshot_dir, 'worker-*.prom'))):
+            worker:str = os.path.basename(path)[len('worker-'):-len('.prom')]
+            with open(path, 'r') as file:
+                lines:list[str] = file.read().splitlines()
+
+            name:str = ''
+            for line in lines:
+                if line.startswith('# '):
+                    name = line.split(' ')[2]
+                    if line not in families.get(name, []):
+                        families.setdefault(name, []).append(line)
+                elif line:
+                    families.setdefault(name, []).append(_with_label(line, 'worker', worker))
+
+        return '\n'.join(line for lines in families.values() for line in lines) + '\n'
+
+
+    def expose_local(self) -> str:
+        """Render this process's metrics. A metric or collector that fails is left out (and logged)
+        rather than failing the whole scrape."""
+        lines:list[str] = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.expose())
+            except Exception as e:
+                print(f"Metric {metric.name} failed: {e}")
+        for collector in self.collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+def _with_label(sample:str, name:str, value:str) -> str:
+    """An exposition sample line with one more label."""
+    metric, rest = sample.split(' ', 1)
+    label:str = f'{name}="{_escape(value)}"'
+    if metric.endswith('}'):
+        return f'{metric[:-1]},{label}}} {rest}'
+    return f'{metric}{{{label}}} {rest}'
+
+
+def gauge_lines(name:str, documentation:str, labelname:str, values:dict[str, float], metric_type:str='gauge') -> list[str]:
+    """Exposition lines of a metric computed at scrape time, one sample per label value."""
+    lines:list[str] = [f'# HELP {name} {documentation}', f'# TYPE {name} {metric_type}']
+    for label, value in values.items():
+        lines.append(f'{name}{_format_labels((labelname,), (label,))} {_format_value(value)}')
+    return lines
+
+
+registry:Registry = Registry()
+
+STAGE_SECONDS:Histogram = registry.histogram('vthax_stage_seconds', 'Wall time of each submission stage', ('stage',))
+SPAN_SECONDS:Histogram = registry.histogram('vthax_span_seconds', 'Wall time of instrumented operations within stages', ('span',))
+UPSTREAM_SECONDS:Histogram = registry.histogram('vthax_upstream_request_seconds', 'Latency of outbound HTTP requests', ('host',))
+UPSTREAM_REQUESTS:Counter = registry.counter('vthax_upstream_requests_total', 'Outbound HTTP requests by host and status', ('host', 'status'))
+UPSTREAM_ERRORS:Counter = registry.counter('vthax_upstream_errors_total', 'Outbound HTTP requests that failed or returned an error status', ('host',))
+TERRAIN_POINTS:Counter = registry.counter('vthax_terrain_points_total', 'Terrain sample points by where they were resolved', ('source',))
+REQUEST_SECONDS:Histogram = registry.histogram('vthax_http_request_seconds', 'Latency of API requests', ('endpoint', 'method', 'status'))
+
+
+# ---- Spans ---- #
+
+class SpanRecorder:
+    """Collects the spans of one request, for the optional timing breakdown in the response."""
+
+    def __init__(self):
+        self._lock:threading.Lock = threading.Lock()
+        self.spans:dict[str, list[float]] = {}   # name -> [count, total seconds, max seconds]
+
+
+    def add(self, name:str, seconds:float):
+        with self._lock:
+            entry:list[float] = self.spans.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                name: {'count': int(count), 'total': round(total, 4), 'max': round(longest, 4)}
+                for name, (count, total, longest) in sorted(self.spans.items())
+            }
+
+
+_recorder:contextvars.ContextVar[SpanRecorder|None] = contextvars.ContextVar('span_recorder', default=None)
+
+
+def observe_span(name:str, seconds:float):
+    """Record a finished span in the span histogram and the current request's recorder, if any."""
+    SPAN_SECONDS.observe(seconds, span=name)
+    recorder:SpanRecorder|None = _recorder.get()
+    if recorder is not None:
+        recorder.add(name, seconds)
+
+
+@contextmanager
+def span(name:str):
+    """Time the enclosed block as the span `name`."""
+    start:float = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_span(name, time.perf_counter() - start)
+
+
+@contextmanager
+def record_spans():
+    """Collect the spans recorded by the enclosed block (and the threads it starts through
+    in_context or the pipeline) into a SpanRecorder."""
+    recorder:SpanRecorder = SpanRecorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+def in_context(func:Callable) -> Callable:
+    """Wrap func so it runs in (a copy of) the caller's context when called from another thread,
+    which keeps spans attributed to the request that started the work."""
+    context:contextvars.Context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+
+    return run
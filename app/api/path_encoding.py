@@ -0,0 +1,111 @@
+import numpy as np
+
+
+def _scaled(points, precision:int) -> np.ndarray:
+    """Points as an (n, 2) array of (lat, lon) rounded to integers at 10^-precision degrees."""
+    return np.round(np.asarray(points, dtype=np.float64).reshape(-1, 2) * 10 ** precision).astype(np.int64)
+
+
+def encode_polyline(points, precision:int=5) -> str:
+    """
+    Encode a path with Google's encoded polyline algorithm.
+
+    Each coordinate is stored as the zigzag-encoded difference from the previous point, in 5-bit
+    chunks of printable ASCII. At the default precision (1e-5 degrees, about a meter) a point
+    takes 4-8 characters instead of the ~40 of a full precision JSON pair.
+
+    Args:
+        points: sequence of (lat, lon) pairs.
+        precision (int): decimal places kept; 5 is what Google's decoders expect.
+
+    Returns:
+        str: the encoded polyline.
+    """
+    values:np.ndarray = _scaled(points, precision)
+    if not len(values):
+        return ''
+
+    deltas:np.ndarray = np.diff(values, axis=0, prepend=0).ravel()
+    zigzag:np.ndarray = (deltas << 1) ^ (deltas >> 63)
+
+    # Split every value into 5-bit chunks, least significant first, with 0x20 on all but its last chunk
+    shifts:np.ndarray = np.arange(0, 64, 5)
+    shifted:np.ndarray = zigzag[:, None] >> shifts
+    chunks:np.ndarray = shifted & 0x1F
+    lengths:np.ndarray = 1 + (shifted[:, 1:] > 0).sum(axis=1)
+    chunk_index:np.ndarray = np.arange(len(shifts))
+    used:np.ndarray = chunk_index < lengths[:, None]
+    chunks |= np.where(chunk_index < lengths[:, None] - 1, 0x20, 0)
+
+    return (chunks[used] + 63).astype(np.uint8).tobytes().decode('ascii')
+
+
+def decode_polyline(encoded:str, precision:int=5) -> list[list[float]]:
+    """Decode a polyline made by encode_polyline back into [lat, lon] pairs."""
+    values:list[int] = []
+    value:int = 0
+    shift:int = 0
+    for char in encoded.encode('ascii'):
+        chunk:int = char - 63
+        value |= (chunk & 0x1F) << shift
+        shift += 5
+        if chunk < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value, shift = 0, 0
+
+    coordinates:np.ndarray = np.cumsum(np.array(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return coordinates.tolist()
+
+
+def encode_delta(points, precision:int=6) -> list[int]:
+    """
+    Encode a path as fixed-precision integer deltas.
+
+    The first point is stored as its coordinates times 10^precision and every later point as
+    the difference from the previous one, flattened to [lat0, lon0, dlat1, dlon1, ...]. The small
+    integers serialize to a fraction of the size of full precision floats in any format.
+    """
+    values:np.ndarray = _scaled(points, precision)
+    return np.diff(values, axis=0, prepend=0).ravel().tolist()
+
+
+def decode_delta(deltas:list[int], precision:int=6) -> list[list[float]]:
+    """Decode a path made by encode_delta back into [lat, lon] pairs."""
+    return (np.cumsum(np.array(deltas, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision).tolist()
+
+
+def encode_float32(points) -> bytes:
+    """Encode a path as little-endian float32 lat, lon pairs (8 bytes a point, about a meter of precision)."""
+    return np.asarray(points, dtype='<f4').reshape(-1, 2).tobytes()
+
+
+def decode_float32(data:bytes) -> list[list[float]]:
+    """Decode a path made by encode_float32 back into [lat, lon] pairs."""
+    return np.frombuffer(data, dtype='<f4').reshape(-1, 2).astype(np.float64).tolist()
+
+
+def is_path(value) -> bool:
+    """Whether a value looks like a path: a non-empty list of (lat, lon) pairs."""
+    return (
+        isinstance(value, (list, tuple)) and len(value) > 0
+        and isinstance(value[0], (list, tuple, np.ndarray)) and len(value[0]) == 2
+    )
+
+
+def encode_paths(obj, encode):
+    """
+    Return a copy of a response payload with every path replaced by encode(path).
+
+    Paths are the values under 'path' keys (terrain details, routes) and the items of 'paths'
+    lists; everything else is copied as is.
+    """
+    if isinstance(obj, dict):
+        return {
+            key: encode(value) if key == 'path' and is_path(value)
+            else [encode(p) if is_path(p) else encode_paths(p, encode) for p in value] if key == 'paths' and isinstance(value, list)
+            else encode_paths(value, encode)
+            for key, value in obj.items()
+        }
+    if isinstance(obj, list):
+        return [encode_paths(item, encode) for item in obj]
+    return obj
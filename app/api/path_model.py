@@ -1,76 +1,171 @@
-import pandas as pd
 import numpy as np
-import json
+
+
+class CostTable:
+    """Terrain x vehicle cost matrix compiled into a dense NumPy array.
+
+    Impossible combinations ("inf" or missing entries in cost-matrix.json) are stored as inf.
+    Compile it once at startup and reuse it for every request.
+
+    Args:
+        cost_matrix (dict): terrain -> vehicle -> cost mapping as loaded from cost-matrix.json.
+    """
+
+    def __init__(self, cost_matrix:dict):
+        terrains:list[str] = list(cost_matrix.keys())
+        vehicles:list[str] = list(dict.fromkeys(v for costs in cost_matrix.values() for v in costs))
+        terrain_index:dict[str, int] = {terrain: i for i, terrain in enumerate(terrains)}
+        vehicle_index:dict[str, int] = {vehicle: j for j, vehicle in enumerate(vehicles)}
+
+        costs_array:np.ndarray = np.full((len(terrains), len(vehicles)), np.inf)
+        for terrain, costs in cost_matrix.items():
+            for vehicle, cost in costs.items():
+                try:
+                    costs_array[terrain_index[terrain], vehicle_index[vehicle]] = float(cost)
+                except (TypeError, ValueError):
+                    pass   # Unparseable entries are treated as impossible
+
+        self._set_costs(terrains, vehicles, costs_array)
+
+
+    @classmethod
+    def from_arrays(cls, terrains:list[str], vehicles:list[str], costs:np.ndarray) -> 'CostTable':
+        """Rebuild a compiled table from its terrains, vehicles and (terrains x vehicles) costs, e.g.
+        as stored in the static-data snapshot."""
+        table:CostTable = cls({})
+        table._set_costs(list(terrains), list(vehicles), np.asarray(costs, dtype=np.float64))
+        return table
+
+
+    def _set_costs(self, terrains:list[str], vehicles:list[str], costs:np.ndarray):
+        self.terrains:list[str] = terrains
+        self.vehicles:list[str] = vehicles
+        self.terrain_index:dict[str, int] = {terrain: i for i, terrain in enumerate(terrains)}
+        self.vehicle_index:dict[str, int] = {vehicle: j for j, vehicle in enumerate(vehicles)}
+
+        self.costs:np.ndarray = costs
+        self.possible:np.ndarray = np.isfinite(costs)
+        self.finite_costs:np.ndarray = np.where(self.possible, costs, 0.0)
+
+
+    def count_matrix(self, terrain_counts_list:list[dict]) -> np.ndarray:
+        """Build a (paths x terrains) count matrix; terrain names are matched case-insensitively by
+        capitalizing them and terrains missing from the table are ignored."""
+        counts:np.ndarray = np.zeros((len(terrain_counts_list), len(self.terrains)))
+        for i, terrain_counts in enumerate(terrain_counts_list):
+            for terrain, count in terrain_counts.items():
+                t:int|None = self.terrain_index.get(terrain.capitalize())
+                if t is not None:
+                    counts[i, t] += count
+
+        return counts
+
+
+    def score(self, counts:np.ndarray, vehicles:list[str]|None=None) -> np.ndarray:
+        """
+        Score every path with every vehicle as one matrix product.
+
+        Args:
+            counts (np.ndarray): (paths x terrains) terrain counts (or any per-terrain weights).
+            vehicles (list[str] | None): vehicles to score, defaults to all vehicles in the table.
+
+        Returns:
+            np.ndarray: (paths x vehicles) costs, NaN where a path crosses terrain the vehicle can't.
+        """
+        cols:list[int] = [self.vehicle_index[v] for v in (vehicles if vehicles is not None else self.vehicles)]
+
+        scores:np.ndarray = counts @ self.finite_costs[:, cols]
+        impossible:np.ndarray = (counts > 0) @ ~self.possible[:, cols]
+        scores[impossible] = np.nan
+        return scores
+
+
+def top_k_combinations(scores:np.ndarray, k:int) -> list[tuple[int, int]]:
+    """
+    Return the (path, vehicle) indices of the k lowest scores, cheapest first.
+
+    Impossible (NaN) combinations rank after all possible ones. Ties are broken by the order
+    of the candidates, vehicle-major (every path for the first vehicle, then the second, ...),
+    both in which of them make the top k and in the order they're returned, as a stable sort
+    on (cost, index) would.
+    """
+    flat:np.ndarray = np.nan_to_num(scores.T.ravel(), nan=np.inf)
+    k = min(k, flat.size)
+    if k == 0:
+        return []
+
+    if k < flat.size:
+        # argpartition picks arbitrarily among candidates tied with the k-th cost, so take every
+        # cheaper one and then the first of the tied ones
+        kth:float = flat[np.argpartition(flat, k - 1)[k - 1]]
+        cheaper:np.ndarray = np.flatnonzero(flat < kth)
+        candidates:np.ndarray = np.concatenate((cheaper, np.flatnonzero(flat == kth)[:k - cheaper.size]))
+    else:
+        candidates = np.arange(flat.size)
+    candidates = candidates[np.lexsort((candidates, flat[candidates]))]
+
+    num_paths:int = scores.shape[0]
+    return [(int(c % num_paths), int(c // num_paths)) for c in candidates]
 
 
 # Function to calculate cost for a given path
-def calculate_path_costs(terrain_counts, vehicle, costs_matrix):
-    total_cost = 0
-    for terrain, count in terrain_counts.items():
-        if count > 0:
-            if terrain in costs_matrix.index:
-                cost = costs_matrix.at[terrain, vehicle]
-                if pd.notna(cost):
-                    total_cost += cost * count
-                else:
-                    total_cost += np.inf  # Impossible route, so set to infinity
-    return total_cost if total_cost != np.inf else np.nan
+def calculate_path_costs(terrain_counts, vehicle, cost_table:CostTable):
+    return float(cost_table.score(cost_table.count_matrix([terrain_counts]), [vehicle])[0, 0])
 
 
 def get_top_5_combinations(terrain_data, cost_matrix, vehicles):
-    # Extract and reformat the terrain counts
-    static_path_data = {}
-    for path, details in terrain_data.items():
-        terrain_counts = details['terrain_counts']
-        
-        # Capitalize the first letter of each terrain type
-        formatted_terrain = {terrain.capitalize(): count for terrain, count in terrain_counts.items()}
-        
-        static_path_data[path] = formatted_terrain
-
-    # Create DataFrame for terrain data
-    terrain_df = pd.DataFrame(static_path_data).T.fillna(0)
-
-    # Convert all values in costs_matrix to numeric, replacing 'inf' with np.inf
-    costs_matrix = pd.DataFrame(cost_matrix).applymap(lambda x: np.inf if x == "inf" else pd.to_numeric(x, errors='coerce'))
-
-    # Transpose the costs_matrix if needed to align terrain types with index
-    if set(costs_matrix.columns).intersection(terrain_df.columns):
-        costs_matrix = costs_matrix.T
-
-    # Check alignment between terrain types
-    common_terrains = terrain_df.columns.intersection(costs_matrix.index)
-
-    # Subset both DataFrames to the common terrain types
-    terrain_df = terrain_df[common_terrains]
-    costs_matrix = costs_matrix.loc[common_terrains]
-
-    # Calculate costs for each vehicle
-    all_costs = []
-    for vehicle in vehicles:
-        costs_for_vehicle = [
-            (path, vehicle, calculate_path_costs(terrain_df.loc[path].to_dict(), vehicle, costs_matrix))
-            for path in terrain_df.index
-        ]
-        all_costs.extend(costs_for_vehicle)
-
-    # Convert to DataFrame and sort by cost
-    cost_df = pd.DataFrame(all_costs, columns=['Path', 'Vehicle', 'Cost'])
-    cost_df = cost_df.sort_values(by='Cost')
-
-    # Get top 5 path/vehicle combinations
-    top_5_combos = cost_df.head(5)
-    cost_df = cost_df.fillna('Impossible')
-    
-    # Format output for top 5 combos
+    """Return the five cheapest path/vehicle combinations as {path: {vehicle: cost}}.
+
+    Paths are scored by the km travelled through each terrain ('terrain_km') when known, so the
+    ranking doesn't depend on how densely they were sampled, and by terrain counts otherwise.
+    cost_matrix is either a compiled CostTable or the raw cost-matrix.json dict."""
+    cost_table:CostTable = cost_matrix if isinstance(cost_matrix, CostTable) else CostTable(cost_matrix)
+
+    vehicles = [v for v in vehicles if v in cost_table.vehicle_index]
+    scores:np.ndarray = cost_table.score(terrain_weights(cost_table, terrain_data), vehicles)
+
+    return format_top_5(list(terrain_data.keys()), vehicles, scores)
+
+
+def terrain_weights(cost_table:CostTable, terrain_data:dict) -> np.ndarray:
+    """The (paths x terrains) weights paths are scored by: km per terrain when known, else terrain counts."""
+    return cost_table.count_matrix([details.get('terrain_km', details['terrain_counts']) for details in terrain_data.values()])
+
+
+def format_top_5(paths:list[str], vehicles:list[str], scores:np.ndarray) -> dict:
+    """The five cheapest combinations of a (paths x vehicles) score matrix as {path: {vehicle: cost}}."""
     top_5_dict = {}
-    for _, row in top_5_combos.iterrows():
-        path = row['Path']
-        vehicle = row['Vehicle']
-        cost = row['Cost']
-        if path not in top_5_dict:
-            top_5_dict[path] = {}
-        top_5_dict[path][vehicle] = cost
+    for p, v in top_k_combinations(scores, 5):
+        top_5_dict.setdefault(paths[p], {})[vehicles[v]] = float(scores[p, v])
 
     return top_5_dict
 
+
+def get_top_5_combinations_many(terrain_data_list:list[dict], cost_table:CostTable, vehicles_list:list[list[str]]) -> list[dict]:
+    """
+    get_top_5_combinations for many missions at once.
+
+    The paths of all missions are scored against every vehicle in a single matrix product;
+    each mission then picks the rows of its paths and the columns of its vehicles.
+
+    Args:
+        terrain_data_list (list[dict]): fetch_terrain_for_paths result of each mission.
+        cost_table (CostTable): compiled cost matrix.
+        vehicles_list (list[list[str]]): selected vehicles of each mission.
+
+    Returns:
+        list[dict]: the top five combinations of each mission, as get_top_5_combinations returns them.
+    """
+    all_data:list[dict] = [details for terrain_data in terrain_data_list for details in terrain_data.values()]
+    scores:np.ndarray = cost_table.score(terrain_weights(cost_table, {i: details for i, details in enumerate(all_data)}))
+
+    results:list[dict] = []
+    offset:int = 0
+    for terrain_data, vehicles in zip(terrain_data_list, vehicles_list):
+        vehicles = [v for v in vehicles if v in cost_table.vehicle_index]
+        cols:list[int] = [cost_table.vehicle_index[v] for v in vehicles]
+        mission_scores:np.ndarray = scores[offset:offset + len(terrain_data)][:, cols]
+        results.append(format_top_5(list(terrain_data.keys()), vehicles, mission_scores))
+        offset += len(terrain_data)
+
+    return results
@@ -0,0 +1,78 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Callable
+
+
+class Pipeline:
+    """A small dependency graph of named stages run on a thread pool.
+
+    Each stage starts as soon as all of the stages it depends on have finished, so independent
+    stages (e.g. terrain fetching and the weather lookup) overlap and the total latency is the
+    critical path rather than the sum of all stages. A stage's function is called with the
+    results of its dependencies as positional arguments, in the order they were declared.
+
+    Args:
+        max_workers (int): maximum number of stages running at the same time.
+    """
+
+    def __init__(self, max_workers:int=8):
+        self.max_workers:int = max_workers
+        self.stages:dict[str, tuple[Callable, tuple[str, ...]]] = {}
+
+
+    def add(self, name:str, func:Callable, deps:list[str]|tuple[str, ...]=()) -> 'Pipeline':
+        """Add a stage; its dependencies must already have been added."""
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f'Stage "{name}" depends on unknown stage "{dep}"')
+
+        self.stages[name] = (func, tuple(deps))
+        return self
+
+
+    def run(self, on_stage_done:Callable[[str, object, float], None]|None=None) -> tuple[dict, dict]:
+        """
+        Run every stage and wait for all of them to finish.
+
+        Args:
+            on_stage_done (Callable | None): called as on_stage_done(name, result, seconds) from the
+                calling thread as each stage finishes.
+
+        Returns:
+            tuple[dict, dict]: the result of each stage and the wall time of each stage in seconds
+                (plus 'total' for the whole run).
+
+        Raises:
+            Exception: the first exception raised by a stage; stages not yet started are skipped.
+        """
+        results:dict = {}
+        timings:dict[str, float] = {}
+        pending:dict[str, tuple[Callable, tuple[str, ...]]] = dict(self.stages)
+        running:dict[Future, str] = {}
+        run_start:float = time.perf_counter()
+
+        def timed(func:Callable, args:list) -> tuple[object, float]:
+            start:float = time.perf_counter()
+            return func(*args), time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # Start every stage whose dependencies are done
+                for name, (func, deps) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        del pending[name]
+                        # Run in a copy of the caller's context so context variables (e.g. the
+                        # request's span recorder) are visible inside the stage
+                        context:contextvars.Context = contextvars.copy_context()
+                        running[executor.submit(context.run, timed, func, [results[dep] for dep in deps])] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name:str = running.pop(future)
+                    results[name], timings[name] = future.result()   # Re-raises a failed stage's exception
+                    if on_stage_done is not None:
+                        on_stage_done(name, results[name], timings[name])
+
+        timings['total'] = time.perf_counter() - run_start
+        return results, timings
@@ -0,0 +1,86 @@
+import os
+import signal
+import socket
+import time
+from typing import Callable
+
+import gevent
+from gevent import socket as gevent_socket
+from gevent.pywsgi import WSGIServer
+
+
+def serve(app, host:str, port:int, workers:int, backlog:int=1024, on_worker_start:Callable[[int], None]|None=None,
+          on_exit:Callable[[], None]|None=None):
+    """
+    Serve a WSGI app from several pre-forked worker processes sharing one listening socket.
+
+    The app (and everything it loaded at import: static tables, compiled cost matrices) is set
+    up once in this process and inherited by the workers, which each run their own gevent server,
+    so CPU-bound request work runs on as many cores as there are workers. The inherited tables are
+    shared copy-on-write: they're never written after startup, so the pages holding them (NumPy
+    buffers included) stay shared between all workers. Workers that die are restarted; SIGTERM or
+    SIGINT stops all of them.
+
+    Must be called before any threads are started, since only the forking thread survives a fork.
+
+    Args:
+        app: the WSGI application.
+        host (str): address to listen on.
+        port (int): port to listen on.
+        workers (int): number of worker processes.
+        backlog (int): listen backlog of the shared socket.
+        on_worker_start (Callable | None): called in each worker, with its slot (0 to workers - 1), before it serves.
+        on_exit (Callable | None): called in this process after all workers have exited.
+    """
+    # gevent's server needs a gevent socket to accept without blocking its event loop
+    bound:socket.socket = socket.create_server((host, port), backlog=backlog)
+    listener:gevent_socket.socket = gevent_socket.socket(bound.family, bound.type, fileno=bound.detach())
+    children:dict[int, int] = {}   # pid -> worker slot
+    stopping:bool = False
+
+    def spawn(slot:int):
+        pid:int = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            gevent.reinit()
+            try:
+                if on_worker_start is not None:
+                    on_worker_start(slot)
+                WSGIServer(listener, app).serve_forever()
+            finally:
+                os._exit(0)
+
+        children[pid] = slot
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(workers):
+        spawn(slot)
+    print(f'\033[0m[{time.strftime("%H:%M:%S")}] \033[92mServing on {host}:{port} with {workers} workers.\033[0m')
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+
+        slot:int|None = children.pop(pid, None)
+        if slot is not None and not stopping:
+            print(f'Worker {pid} exited ({status}), restarting it')
+            time.sleep(1)   # Don't spin if workers crash on startup
+            spawn(slot)
+
+    listener.close()
+    if on_exit is not None:
+        on_exit()
@@ -0,0 +1,288 @@
+import base64
+import collections
+import contextvars
+import datetime as dt
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import config
+
+
+ARCHIVE_VERSION:int = 1
+
+# Query parameters and form fields that hold credentials; they're masked in archives and match keys
+REDACTED_PARAMS:set[str] = {'appid', 'api_key', 'apikey', 'key', 'token'}
+REDACTED_FIELDS:set[str] = {'openai-api-key'}
+REDACTED:str = '***'
+
+# Settings that shape the upstream requests and the result of a submission; they're stored in
+# archives so a replay can run with the configuration the recording was made with
+SETTINGS:tuple[str, ...] = (
+    'OVERPASS_URL', 'OVERPASS_BATCH_SIZE', 'OVERPASS_QUERY_TIMEOUT', 'OPENWEATHER_URL', 'NOMINATIM_URL', 'OPENAI_BASE_URL',
+    'TERRAIN_BACKEND', 'TERRAIN_CACHE_CELL_METERS', 'TERRAIN_SAMPLING', 'TERRAIN_SAMPLING_MAX_DEPTH', 'TERRAIN_SAMPLING_MIN_SEGMENT_M',
+    'PATH_MODE', 'ROUTING_GRID_CELLS', 'ROUTING_MARGIN', 'ROUTING_ROUTES_PER_VEHICLE',
+    'COUNTRY_BACKEND', 'COUNTRY_NOMINATIM_FALLBACK', 'HTTP_MAX_RETRIES'
+)
+
+# Response headers kept in archives (the ones the HTTP client and callers look at)
+KEPT_HEADERS:tuple[str, ...] = ('Content-Type', 'Retry-After')
+
+_tape:contextvars.ContextVar = contextvars.ContextVar('replay_tape', default=None)
+
+
+class ReplayMissError(RuntimeError):
+    """A replayed request made an upstream call that isn't in its archive, i.e. it diverged from the recording."""
+
+
+def redact(values:dict|None, names:set[str], keep_empty:bool=False) -> dict:
+    """A copy of values with the ones under names masked (but empty ones kept empty if keep_empty)."""
+    return {k: REDACTED if k in names and (v or not keep_empty) else v for k, v in (values or {}).items()}
+
+
+def exchange_key(*parts) -> str:
+    """Content address of an upstream call, used to match replayed calls to recorded ones."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def comparable(result:dict) -> dict:
+    """A form result without its timings, as plain JSON types, for comparing a replay with its recording."""
+    return json.loads(json.dumps({k: v for k, v in result.items() if k not in ('timings', 'spans')}, default=float))
+
+
+class Tape:
+    """The upstream calls of one form submission, recorded or being replayed.
+
+    While recording, every outbound HTTP exchange (Overpass, OpenWeather, Nominatim) and OpenAI
+    completion is appended with its latency. While replaying, calls are matched to the recording by
+    content (method, URL, parameters and body, or model and prompt) and answered from it, in recorded
+    order for repeated calls, after the original latency or none at all. The form (with its RNG seed)
+    and the clock the request started at are kept too, so the whole pipeline reruns identically.
+
+    Args:
+        mode (str): 'record' or 'replay'.
+        form (dict): the submitted form, including 'seed'.
+        now (dt.datetime | None): clock the request runs at, defaults to the current time.
+        exchanges (list[dict] | None): recorded calls to replay.
+        latency (str): 'original' to replay each call after its recorded latency, 'zero' to answer at once.
+        streamed (bool): whether the form was submitted to the streaming endpoint, which looks up
+            terrain path by path and so makes different upstream calls.
+    """
+
+    def __init__(self, mode:str, form:dict, now:dt.datetime|None=None, exchanges:list[dict]|None=None, latency:str='original',
+                 streamed:bool=False):
+        self.mode:str = mode
+        self.form:dict = form
+        self.streamed:bool = streamed
+        self.now:dt.datetime = now or dt.datetime.now()
+        self.latency:str = latency
+        self.exchanges:list[dict] = []
+        self.result:dict|None = None
+        self.misses:int = 0
+        self._lock:threading.Lock = threading.Lock()
+
+        self._queued:dict[str, collections.deque] = collections.defaultdict(collections.deque)
+        for exchange in exchanges or []:
+            self._queued[exchange['key']].append(exchange)
+
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+
+    def _append(self, exchange:dict):
+        with self._lock:
+            self.exchanges.append(exchange)
+
+
+    def _next(self, key:str, description:str) -> dict:
+        """The next recorded exchange for key, waiting out its latency when replaying with original latency."""
+        with self._lock:
+            queue:collections.deque|None = self._queued.get(key)
+            if not queue:
+                self.misses += 1
+                raise ReplayMissError(f'No recorded response for {description}')
+            exchange:dict = queue.popleft()
+
+        if self.latency == 'original':
+            time.sleep(exchange['elapsed'])
+        return exchange
+
+
+    def http(self, method:str, url:str, kwargs:dict, send:Callable[[], requests.Response]) -> requests.Response:
+        """Send (and record) an HTTP request, or answer it from the recording."""
+        params:dict = redact(kwargs.get('params'), REDACTED_PARAMS)
+        key:str = exchange_key('http', method.upper(), url, params, kwargs.get('data'))
+
+        if self.replaying:
+            exchange:dict = self._next(key, f'{method} {url}')
+            if exchange.get('error'):
+                raise getattr(requests, exchange['error'], requests.ConnectionError)(exchange['message'])
+
+            response:requests.Response = requests.Response()
+            response.status_code = exchange['status']
+            response.reason = exchange['reason']
+            response.headers = CaseInsensitiveDict(exchange['headers'])
+            response._content = base64.b64decode(exchange['body_b64']) if 'body_b64' in exchange else exchange['body'].encode()
+            response.encoding = 'utf-8'
+            response.url = url
+            return response
+
+        exchange = {'key': key, 'kind': 'http', 'method': method.upper(), 'url': url, 'params': params, 'data': kwargs.get('data')}
+        start:float = time.perf_counter()
+        try:
+            response = send()
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self._append({**exchange, 'elapsed': time.perf_counter() - start, 'error': type(e).__name__, 'message': str(e)})
+            raise
+
+        exchange.update({
+            'elapsed': time.perf_counter() - start,
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+        })
+        try:
+            exchange['body'] = response.content.decode('utf-8')
+        except UnicodeDecodeError:
+            exchange['body_b64'] = base64.b64encode(response.content).decode()
+        self._append(exchange)
+        return response
+
+
+    def call(self, service:str, request:dict, func:Callable[[], object]):
+        """Run (and record) a non-HTTP upstream call whose result is JSON data, or answer it from the recording."""
+        key:str = exchange_key(service, request)
+        if self.replaying:
+            exchange:dict = self._next(key, f'{service} call')
+            # A streamed recording answers the whole call too (the form was submitted to the stream endpoint)
+            return exchange['result'] if 'result' in exchange else ''.join(piece for _, piece in exchange['pieces'])
+
+        start:float = time.perf_counter()
+        result = func()
+        self._append({'key': key, 'kind': service, 'request': request, 'elapsed': time.perf_counter() - start, 'result': result})
+        return result
+
+
+    def stream(self, service:str, request:dict, func:Callable[[], Iterator[str]]) -> Iterator[str]:
+        """Like call, for a streamed upstream response: records each piece with its offset and replays them at the same pace."""
+        key:str = exchange_key(service, request)
+        if self.replaying:
+            exchange:dict = self._next(key, f'{service} stream')
+            if 'pieces' not in exchange:
+                yield exchange['result']
+                return
+
+            previous:float = exchange['elapsed']
+            for offset, piece in exchange['pieces']:
+                if self.latency == 'original':
+                    time.sleep(max(offset - previous, 0.0))
+                previous = offset
+                yield piece
+            return
+
+        start:float = time.perf_counter()
+        pieces:list[tuple[float, str]] = []
+        for piece in func():
+            pieces.append((time.perf_counter() - start, piece))
+            yield piece
+        # 'elapsed' is the time to the first piece, the rest are paced by their offsets
+        self._append({'key': key, 'kind': service, 'request': request, 'elapsed': pieces[0][0] if pieces else 0.0, 'pieces': pieces})
+
+
+    def to_archive(self) -> dict:
+        return {
+            'version': ARCHIVE_VERSION,
+            'recorded_at': dt.datetime.now().isoformat(),
+            'now': self.now.isoformat(),
+            'seed': self.form.get('seed'),
+            'form': redact(self.form, REDACTED_FIELDS, keep_empty=True),
+            'streamed': self.streamed,   # An empty key skips the AI plan, so it stays empty
+            'settings': {name: getattr(config, name) for name in SETTINGS},
+            'result': self.result,
+            'exchanges': self.exchanges
+        }
+
+
+    def save(self, directory:str) -> str:
+        """Write the recording to a gzipped JSON archive in directory and return its path."""
+        os.makedirs(directory, exist_ok=True)
+        path:str = os.path.join(directory, f'{self.now.strftime("%Y%m%d-%H%M%S-%f")}-{self.form.get("seed")}.json.gz')
+        with gzip.open(path, 'wt', encoding='utf-8') as file:
+            json.dump(self.to_archive(), file, separators=(',', ':'))
+        return path
+
+
+def load_archive(path:str) -> dict:
+    """Read an archive written by Tape.save."""
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def replay_tape(archive:dict, latency:str='original') -> Tape:
+    """A tape that replays an archive."""
+    if archive.get('version') != ARCHIVE_VERSION:
+        raise ValueError(f'Archive version {archive.get("version")} can\'t be replayed, expected {ARCHIVE_VERSION}')
+    return Tape('replay', archive['form'], dt.datetime.fromisoformat(archive['now']), archive['exchanges'], latency, archive['streamed'])
+
+
+def current() -> Tape|None:
+    """The tape of the request being handled in this context, if it's recorded or replayed."""
+    return _tape.get()
+
+
+def active() -> bool:
+    """Whether the current request is recorded or replayed. Such requests skip the response caches
+    (and share no in-flight calls), so every upstream response they use is in the archive."""
+    return _tape.get() is not None
+
+
+def instant() -> bool:
+    """Whether the current request is replayed with zero latency, so the waits upstreams impose (retry backoff) are skipped too."""
+    tape:Tape|None = _tape.get()
+    return tape is not None and tape.replaying and tape.latency == 'zero'
+
+
+def now() -> dt.datetime:
+    """The current time, or the time a recorded request ran at while it's recorded or replayed."""
+    tape:Tape|None = _tape.get()
+    return tape.now if tape is not None else dt.datetime.now()
+
+
+@contextmanager
+def use(tape:Tape):
+    """Make tape the tape of the current context (and of the threads it hands work to with copied contexts)."""
+    token:contextvars.Token = _tape.set(tape)
+    try:
+        yield tape
+    finally:
+        _tape.reset(token)
+
+
+@contextmanager
+def session(form:dict, streamed:bool=False):
+    """
+    Scope of one form submission: yields the tape it's replayed from if one is already in use,
+    a new recording tape if config.REPLAY_MODE is 'record' (saved to config.REPLAY_DIR when the
+    submission finishes), else None. streamed tells whether it came through the streaming endpoint.
+    """
+    tape:Tape|None = _tape.get()
+    if tape is not None or config.REPLAY_MODE != 'record':
+        yield tape
+        return
+
+    with use(Tape('record', form, streamed=streamed)) as tape:
+        try:
+            yield tape
+        finally:
+            path:str = tape.save(config.REPLAY_DIR)
+            print(f'\033[0m[{dt.datetime.now().strftime("%H:%M:%S")}] \033[92mRecorded {len(tape.exchanges)} upstream calls to {path}.\033[0m')
@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+import importlib.util
+import json
+
+from flask import Response, jsonify, request
+
+import config
+from path_encoding import encode_delta, encode_float32, encode_paths, encode_polyline
+
+
+# Media types a client can ask for in its Accept header to get paths in a compact encoding
+JSON:str = 'application/json'
+POLYLINE_JSON:str = 'application/vnd.vthax.polyline+json'   # Paths as Google encoded polylines
+DELTA_JSON:str = 'application/vnd.vthax.delta+json'         # Paths as fixed-precision integer deltas
+MSGPACK:str = 'application/msgpack'                         # MessagePack with paths as float32 bytes
+MSGPACK_LEGACY:str = 'application/x-msgpack'
+
+# MessagePack is optional and only offered when the msgpack package is installed
+MSGPACK_AVAILABLE:bool = importlib.util.find_spec('msgpack') is not None
+
+PATH_FORMATS:list[str] = [JSON, POLYLINE_JSON, DELTA_JSON] + ([MSGPACK, MSGPACK_LEGACY] if MSGPACK_AVAILABLE else [])
+
+# Likewise Brotli: precompressed responses are offered as br only when the brotli package is installed
+BROTLI_AVAILABLE:bool = importlib.util.find_spec('brotli') is not None
+
+
+def paths_response(payload:dict, status:int=200) -> Response:
+    """
+    Respond with a payload containing paths, in the encoding negotiated from the Accept header.
+
+    Plain JSON (the default) keeps full precision [lat, lon] arrays. The compact formats replace
+    every path (see path_encoding.encode_paths) and describe the encoding in 'path_encoding':
+
+    - application/vnd.vthax.polyline+json: Google encoded polyline strings.
+    - application/vnd.vthax.delta+json: [lat0, lon0, dlat1, dlon1, ...] integers at 10^-precision degrees.
+    - application/msgpack: MessagePack with paths as little-endian float32 (lat, lon) bytes.
+    """
+    mimetype:str = request.accept_mimetypes.best_match(PATH_FORMATS, default=JSON)
+
+    if mimetype == JSON:
+        response:Response = jsonify(payload)
+        response.status_code = status
+    elif mimetype == POLYLINE_JSON:
+        precision:int = config.PATH_POLYLINE_PRECISION
+        encoded:dict = encode_paths(payload, lambda path: encode_polyline(path, precision))
+        encoded['path_encoding'] = {'format': 'polyline', 'precision': precision}
+        response = Response(json.dumps(encoded, default=float, separators=(',', ':')), status, mimetype=mimetype)
+    elif mimetype == DELTA_JSON:
+        precision = config.PATH_DELTA_PRECISION
+        encoded = encode_paths(payload, lambda path: encode_delta(path, precision))
+        encoded['path_encoding'] = {'format': 'delta', 'precision': precision}
+        response = Response(json.dumps(encoded, default=float, separators=(',', ':')), status, mimetype=mimetype)
+    else:
+        import msgpack
+
+        encoded = encode_paths(payload, encode_float32)
+        encoded['path_encoding'] = {'format': 'float32'}
+        response = Response(msgpack.packb(encoded, use_bin_type=True, default=float), status, mimetype=mimetype)
+
+    response.vary.add('Accept')
+    return response
+
+
+class PrecompressedResponse:
+    """A response whose body never changes, serialized and compressed once up front.
+
+    Each request is answered with the stored gzip or Brotli body its Accept-Encoding allows (Flask-Compress
+    leaves responses that already have a Content-Encoding alone), and with 304 Not Modified if its
+    If-None-Match matches the body's ETag. Brotli is only offered when the brotli package is installed.
+
+    Args:
+        payload (dict): JSON payload of the response.
+        max_age (int): seconds clients and proxies may reuse the response without revalidating it.
+    """
+
+    def __init__(self, payload:dict, max_age:int=0):
+        body:bytes = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()
+        self.bodies:dict[str, bytes] = {}
+        if BROTLI_AVAILABLE:
+            import brotli
+
+            self.bodies['br'] = brotli.compress(body, quality=11)
+        self.bodies['gzip'] = gzip.compress(body, compresslevel=9)
+        self.bodies['identity'] = body
+        self.encodings:list[str] = list(self.bodies)   # In order of preference
+        # The encodings are byte-for-byte different but equivalent, which is what a weak ETag is for
+        self.etag:str = hashlib.sha256(body).hexdigest()[:32]
+        self.max_age:int = max_age
+
+
+    def response(self) -> Response:
+        """Build the response to the current request."""
+        if request.if_none_match.contains_weak(self.etag):
+            response:Response = Response(status=304)
+        else:
+            encoding:str = request.accept_encodings.best_match(self.encodings, default='identity')
+            response = Response(self.bodies[encoding], mimetype=JSON)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(self.etag, weak=True)
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        response.vary.add('Accept-Encoding')
+        return response
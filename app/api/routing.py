@@ -0,0 +1,260 @@
+import heapq
+
+import numpy as np
+
+import config
+import geodesy
+from path_model import CostTable
+from terrain import fetch_terrain_batch
+
+
+# Neighbour offsets (row, col) of the 8-connected grid graph
+NEIGHBOURS:tuple[tuple[int, int], ...] = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def routing_available() -> bool:
+    """
+    Whether grid routing may be used, which requires the offline terrain backend.
+
+    A grid resolves the terrain of every cell, about cells^2 / 2 lookups (some 1,100-2,300 at
+    the default 48 cells) per request. The offline index answers them locally, but against
+    Overpass they would be far more upstream load than the handful of lookups per path of the
+    triangular sampler, so routing is disabled unless config.TERRAIN_BACKEND is 'offline'.
+    """
+    return config.TERRAIN_BACKEND == 'offline'
+
+
+class TerrainGrid:
+    """Terrain rasterized over the region around a start and end point.
+
+    The bounding box of the two points is padded by margin (a fraction of its size) and divided
+    into cells, cells cells along its longer side; the terrain of each cell is the terrain at its
+    center, resolved with one fetch_terrain_batch call. That's one lookup per cell, so it's only
+    built with the offline terrain backend (see routing_available).
+
+    Args:
+        start (tuple[float, float]): start point (lat, lon).
+        end (tuple[float, float]): end point (lat, lon).
+        cells (int): number of cells along the longer side of the region.
+        margin (float): padding around the bounding box, as a fraction of its size.
+    """
+
+    def __init__(self, start:tuple[float, float], end:tuple[float, float], cells:int=48, margin:float=0.25):
+        lat_min, lat_max = sorted((start[0], end[0]))
+        lon_min, lon_max = sorted((start[1], end[1]))
+        pad_lat:float = max((lat_max - lat_min) * margin, 0.01)
+        pad_lon:float = max((lon_max - lon_min) * margin, 0.01)
+        lat_min, lat_max = lat_min - pad_lat, lat_max + pad_lat
+        lon_min, lon_max = lon_min - pad_lon, lon_max + pad_lon
+
+        # Keep cells roughly square on the ground
+        mid_lat:float = (lat_min + lat_max) / 2
+        height_km:float = float(geodesy.haversine_km(lat_min, 0.0, lat_max, 0.0))
+        width_km:float = float(geodesy.haversine_km(mid_lat, lon_min, mid_lat, lon_max))
+        cell_km:float = max(height_km, width_km) / cells
+        self.rows:int = max(2, int(np.ceil(height_km / cell_km)))
+        self.cols:int = max(2, int(np.ceil(width_km / cell_km)))
+
+        self.lat_min:float = lat_min
+        self.lon_min:float = lon_min
+        self.lat_step:float = (lat_max - lat_min) / self.rows
+        self.lon_step:float = (lon_max - lon_min) / self.cols
+        self.lats:np.ndarray = lat_min + (np.arange(self.rows) + 0.5) * self.lat_step
+        self.lons:np.ndarray = lon_min + (np.arange(self.cols) + 0.5) * self.lon_step
+
+        centers_lat, centers_lon = np.meshgrid(self.lats, self.lons, indexing='ij')
+        self.terrains:np.ndarray = np.array(
+            fetch_terrain_batch(list(zip(centers_lat.ravel().tolist(), centers_lon.ravel().tolist()))), dtype=object
+        ).reshape(self.rows, self.cols)
+
+        # Ground distance of a step from each cell in each neighbour direction (inf off the grid)
+        self.step_km:np.ndarray = np.full((len(NEIGHBOURS), self.rows, self.cols), np.inf)
+        for d, (dr, dc) in enumerate(NEIGHBOURS):
+            r0, r1 = max(0, -dr), self.rows - max(0, dr)
+            c0, c1 = max(0, -dc), self.cols - max(0, dc)
+            self.step_km[d, r0:r1, c0:c1] = geodesy.haversine_km(
+                centers_lat[r0:r1, c0:c1], centers_lon[r0:r1, c0:c1],
+                centers_lat[r0 + dr:r1 + dr, c0 + dc:c1 + dc], centers_lon[r0 + dr:r1 + dr, c0 + dc:c1 + dc]
+            )
+
+
+    def cell(self, lat:float, lon:float) -> tuple[int, int]:
+        """Return the (row, col) of the cell containing a point, clamped to the grid."""
+        row:int = int(np.clip((lat - self.lat_min) // self.lat_step, 0, self.rows - 1))
+        col:int = int(np.clip((lon - self.lon_min) // self.lon_step, 0, self.cols - 1))
+        return row, col
+
+
+    def cost_grid(self, cost_table:CostTable, vehicle:str) -> np.ndarray:
+        """
+        Cost per km of crossing each cell with a vehicle.
+
+        A cell costs its most expensive terrain type and is impassable (inf) if the vehicle can't
+        cross any of them. Cells of unknown terrain cost the vehicle's median finite cost.
+        """
+        column:np.ndarray = cost_table.costs[:, cost_table.vehicle_index[vehicle]]
+        finite:np.ndarray = column[np.isfinite(column)]
+        unknown_cost:float = float(np.median(finite)) if finite.size else np.inf
+
+        cost_of:dict[str, float] = {}
+        for terrain_info in set(self.terrains.ravel().tolist()):
+            costs:list[float] = [
+                float(column[cost_table.terrain_index[t.capitalize()]])
+                for t in terrain_info.split(', ') if t.capitalize() in cost_table.terrain_index
+            ]
+            cost_of[terrain_info] = max(costs) if costs else unknown_cost
+
+        return np.vectorize(cost_of.__getitem__, otypes=[np.float64])(self.terrains)
+
+
+def astar(grid:TerrainGrid, costs:np.ndarray, start:tuple[int, int], goal:tuple[int, int]) -> tuple[list[tuple[int, int]], float]|None:
+    """
+    Cheapest route between two cells with A*.
+
+    Stepping between neighbouring cells costs the step's ground distance times the mean cost
+    per km of the two cells. The heuristic is the great-circle distance to the goal times the
+    cheapest finite cost per km on the grid, which never overestimates, so the route is optimal.
+
+    Returns:
+        tuple[list[tuple[int, int]], float] | None: the cells of the route from start to goal and
+            its cost, or None if the goal can't be reached.
+    """
+    if not np.isfinite(costs[start]) or not np.isfinite(costs[goal]):
+        return None
+
+    finite:np.ndarray = costs[np.isfinite(costs)]
+    min_cost:float = float(finite.min())
+    lats, lons = np.meshgrid(grid.lats, grid.lons, indexing='ij')
+    heuristic:np.ndarray = geodesy.haversine_km(lats, lons, grid.lats[goal[0]], grid.lons[goal[1]]) * min_cost
+
+    cols:int = grid.cols
+    start_idx:int = start[0] * cols + start[1]
+    goal_idx:int = goal[0] * cols + goal[1]
+    best:np.ndarray = np.full(grid.rows * cols, np.inf)
+    came_from:np.ndarray = np.full(grid.rows * cols, -1, dtype=np.int64)
+    closed:np.ndarray = np.zeros(grid.rows * cols, dtype=bool)
+    flat_costs:np.ndarray = costs.ravel()
+    flat_heuristic:np.ndarray = heuristic.ravel()
+    flat_steps:np.ndarray = grid.step_km.reshape(len(NEIGHBOURS), -1)
+
+    best[start_idx] = 0.0
+    frontier:list[tuple[float, int]] = [(flat_heuristic[start_idx], start_idx)]
+    while frontier:
+        _, idx = heapq.heappop(frontier)
+        if closed[idx]:
+            continue
+        if idx == goal_idx:
+            break
+        closed[idx] = True
+
+        row, col = divmod(idx, cols)
+        for d, (dr, dc) in enumerate(NEIGHBOURS):
+            step:float = flat_steps[d, idx]
+            if step == np.inf:
+                continue
+            neighbour:int = (row + dr) * cols + col + dc
+            if closed[neighbour] or flat_costs[neighbour] == np.inf:
+                continue
+            cost:float = best[idx] + step * (flat_costs[idx] + flat_costs[neighbour]) / 2
+            if cost < best[neighbour]:
+                best[neighbour] = cost
+                came_from[neighbour] = idx
+                heapq.heappush(frontier, (cost + flat_heuristic[neighbour], neighbour))
+
+    if best[goal_idx] == np.inf:
+        return None
+
+    route:list[tuple[int, int]] = []
+    idx = goal_idx
+    while idx != -1:
+        route.append(divmod(int(idx), cols))
+        idx = came_from[idx]
+    return route[::-1], float(best[goal_idx])
+
+
+def route_cost(grid:TerrainGrid, costs:np.ndarray, cells:list[tuple[int, int]]) -> float:
+    """Cost of a route of neighbouring cells, with the same step costs as astar."""
+    total:float = 0.0
+    for (r0, c0), (r1, c1) in zip(cells[:-1], cells[1:]):
+        step:float = grid.step_km[NEIGHBOURS.index((r1 - r0, c1 - c0)), r0, c0]
+        total += step * (costs[r0, c0] + costs[r1, c1]) / 2
+    return float(total)
+
+
+def diverse_routes(grid:TerrainGrid, costs:np.ndarray, start:tuple[int, int], goal:tuple[int, int], k:int,
+                   penalty:float=1.5, max_overlap:float=0.7, max_attempts:int|None=None) -> list[tuple[list[tuple[int, int]], float]]:
+    """
+    Up to k cheap routes that differ from each other.
+
+    After each search the cells of the route found are made penalty times more expensive and
+    the search is repeated, which pushes later searches onto alternative corridors. Routes
+    sharing more than max_overlap of their cells with a route already kept are dropped.
+
+    Returns:
+        list[tuple[list[tuple[int, int]], float]]: the routes and their (unpenalized) costs, cheapest first.
+    """
+    penalized:np.ndarray = costs.copy()
+    routes:list[tuple[list[tuple[int, int]], float]] = []
+    kept_cells:list[set[tuple[int, int]]] = []
+
+    for _ in range(max_attempts or 3 * k):
+        if len(routes) >= k:
+            break
+        found = astar(grid, penalized, start, goal)
+        if found is None:
+            break
+
+        cells, _ = found
+        cell_set:set[tuple[int, int]] = set(cells)
+        if all(len(cell_set & kept) / len(cell_set | kept) <= max_overlap for kept in kept_cells):
+            routes.append((cells, route_cost(grid, costs, cells)))
+            kept_cells.append(cell_set)
+
+        for cell in cells[1:-1]:
+            penalized[cell] *= penalty
+
+    return sorted(routes, key=lambda route: route[1])
+
+
+def plan_routes(start:tuple[float, float], end:tuple[float, float], vehicles:list[str], cost_table:CostTable, k:int=3,
+                cells:int=48, margin:float=0.25) -> dict[str, list[dict]]:
+    """
+    Find the k best diverse routes between two points for each vehicle.
+
+    The terrain is rasterized once and shared by all vehicles; each vehicle searches its own cost
+    grid, so e.g. a boat follows water and a land vehicle avoids it. Vehicles missing from the
+    cost table are skipped.
+
+    Args:
+        start (tuple[float, float]): start point (lat, lon).
+        end (tuple[float, float]): end point (lat, lon).
+        vehicles (list[str]): vehicle names as in cost-matrix.json.
+        cost_table (CostTable): compiled cost matrix.
+        k (int): routes per vehicle.
+        cells (int): grid cells along the longer side of the region.
+        margin (float): padding around the start/end bounding box, as a fraction of its size.
+
+    Returns:
+        dict[str, list[dict]]: vehicle -> routes ({'path': [[lat, lon], ...], 'cost', 'length_km'}),
+            cheapest first; empty if the vehicle can't get from start to end.
+    """
+    grid:TerrainGrid = TerrainGrid(start, end, cells, margin)
+    start_cell:tuple[int, int] = grid.cell(*start)
+    goal_cell:tuple[int, int] = grid.cell(*end)
+
+    routes:dict[str, list[dict]] = {}
+    for vehicle in vehicles:
+        if vehicle not in cost_table.vehicle_index:
+            continue
+
+        routes[vehicle] = []
+        for cells_on_route, cost in diverse_routes(grid, grid.cost_grid(cost_table, vehicle), start_cell, goal_cell, k):
+            # Route through the cell centers, from the exact start to the exact end
+            path:list[list[float]] = [list(start)] + [[float(grid.lats[r]), float(grid.lons[c])] for r, c in cells_on_route[1:-1]] + [list(end)]
+            routes[vehicle].append({
+                'path': path,
+                'cost': round(cost, 3),
+                'length_km': round(float(geodesy.segment_lengths_km(path).sum()), 3)
+            })
+
+    return routes
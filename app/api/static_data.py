@@ -0,0 +1,141 @@
+import csv
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from path_model import CostTable
+
+
+# Bump when the layout of the snapshot changes, so snapshots written by older code are rebuilt
+SNAPSHOT_VERSION:int = 1
+
+# Source files of the snapshot, in STATIC_DATA_DIR
+SOURCES:tuple[str, ...] = (
+    'vehicle-definitions.csv',
+    'terrain-definitions.csv',
+    'terrain-vehicle-matrix.csv',
+    'strategy-definitions.csv',
+    'cost-matrix.json'
+)
+
+
+def read_csv_columns(path:str) -> dict[str, list[str]]:
+    """Read a CSV file with a header row into a column name -> values mapping (a leading BOM is dropped)."""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as file:
+        rows:list[list[str]] = list(csv.reader(file))
+
+    header:list[str] = rows[0]
+    return {name: [row[i] for row in rows[1:] if row] for i, name in enumerate(header)}
+
+
+def sources_fingerprint(source_dir:str) -> str:
+    """Hash of the contents of the source files, which the snapshot is only valid for."""
+    digest = hashlib.sha256()
+    for name in SOURCES:
+        with open(os.path.join(source_dir, name), 'rb') as file:
+            digest.update(name.encode())
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def compile_sources(source_dir:str) -> dict[str, np.ndarray]:
+    """Parse the CSV/JSON source files into the arrays stored in a snapshot."""
+    vehicles:dict[str, list[str]] = read_csv_columns(os.path.join(source_dir, 'vehicle-definitions.csv'))
+    terrains:dict[str, list[str]] = read_csv_columns(os.path.join(source_dir, 'terrain-definitions.csv'))
+    strategies:dict[str, list[str]] = read_csv_columns(os.path.join(source_dir, 'strategy-definitions.csv'))
+    matrix:dict[str, list[str]] = read_csv_columns(os.path.join(source_dir, 'terrain-vehicle-matrix.csv'))
+    matrix_terrains:list[str] = matrix.pop('')   # The unnamed first column holds the terrain ids
+
+    with open(os.path.join(source_dir, 'cost-matrix.json'), 'r') as file:
+        cost_table:CostTable = CostTable(json.load(file))
+
+    return {
+        'vehicle_ids': np.array(vehicles['vehicle_id'], dtype=str),
+        'vehicle_names': np.array(vehicles['vehicle_name'], dtype=str),
+        'vehicle_descriptions': np.array(vehicles['description'], dtype=str),
+        'terrain_ids': np.array(terrains['terrain_id'], dtype=str),
+        'terrain_names': np.array(terrains['terrain_name'], dtype=str),
+        'terrain_descriptions': np.array(terrains['description'], dtype=str),
+        'strategy_names': np.array(strategies['strategy_name'], dtype=str),
+        'strategy_descriptions': np.array(strategies['strategy_description'], dtype=str),
+        'matrix_terrains': np.array(matrix_terrains, dtype=str),
+        'matrix_vehicles': np.array(list(matrix.keys()), dtype=str),
+        'matrix': np.array(list(zip(*matrix.values())), dtype=np.float64).reshape(len(matrix_terrains), len(matrix)),
+        'cost_terrains': np.array(cost_table.terrains, dtype=str),
+        'cost_vehicles': np.array(cost_table.vehicles, dtype=str),
+        'costs': cost_table.costs
+    }
+
+
+class StaticData:
+    """Vehicle, terrain and strategy definitions and the compiled cost matrix, loaded from a
+    versioned binary snapshot of the files in data/static.
+
+    Parsing the CSVs and compiling the cost matrix happens once; the result is written to an
+    uncompressed .npz that loads in about a millisecond. The snapshot records SNAPSHOT_VERSION and a
+    hash of its source files and is rebuilt (atomically, so concurrent workers never read a partial
+    file) whenever either changes.
+
+    Args:
+        source_dir (str): directory of the source CSV/JSON files.
+        snapshot_path (str): path of the snapshot, or '' to parse the sources every time.
+    """
+
+    def __init__(self, source_dir:str, snapshot_path:str):
+        self.source_dir:str = source_dir
+        self.snapshot_path:str = snapshot_path
+        self.rebuilt:bool = False
+
+        fingerprint:str|None = sources_fingerprint(source_dir) if snapshot_path else None
+        arrays:dict[str, np.ndarray]|None = self._load_snapshot(fingerprint) if fingerprint else None
+        if arrays is None:
+            arrays = compile_sources(source_dir)
+            self.rebuilt = True
+            if fingerprint:
+                self._write_snapshot(arrays, fingerprint)
+
+        self.vehicle_ids:list[str] = arrays['vehicle_ids'].tolist()
+        self.vehicle_names:list[str] = arrays['vehicle_names'].tolist()
+        self.vehicle_descriptions:list[str] = arrays['vehicle_descriptions'].tolist()
+        self.terrain_ids:list[str] = arrays['terrain_ids'].tolist()
+        self.terrain_names:list[str] = arrays['terrain_names'].tolist()
+        self.terrain_descriptions:list[str] = arrays['terrain_descriptions'].tolist()
+        self.strategy_descriptions:dict[str, str] = dict(zip(arrays['strategy_names'].tolist(), arrays['strategy_descriptions'].tolist()))
+        self.matrix_terrains:list[str] = arrays['matrix_terrains'].tolist()
+        self.matrix_vehicles:list[str] = arrays['matrix_vehicles'].tolist()
+        self.matrix:np.ndarray = arrays['matrix']
+        self.cost_table:CostTable = CostTable.from_arrays(arrays['cost_terrains'].tolist(), arrays['cost_vehicles'].tolist(), arrays['costs'])
+
+        self.vehicle_name_by_id:dict[str, str] = dict(zip(self.vehicle_ids, self.vehicle_names))
+        self._graph = None
+
+
+    def _load_snapshot(self, fingerprint:str) -> dict[str, np.ndarray]|None:
+        """Return the arrays of the snapshot if it exists and matches this code and the sources, else None."""
+        try:
+            with np.load(self.snapshot_path, allow_pickle=False) as snapshot:
+                if int(snapshot['version']) != SNAPSHOT_VERSION or str(snapshot['fingerprint']) != fingerprint:
+                    return None
+                return {name: snapshot[name] for name in snapshot.files if name not in ('version', 'fingerprint')}
+        except (OSError, KeyError, ValueError):
+            return None   # Missing, unreadable or from an incompatible layout
+
+
+    def _write_snapshot(self, arrays:dict[str, np.ndarray], fingerprint:str):
+        tmp_path:str = f'{self.snapshot_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, version=np.array(SNAPSHOT_VERSION), fingerprint=np.array(fingerprint), **arrays)
+        os.replace(tmp_path, self.snapshot_path)
+
+
+    def terrain_vehicle_graph(self):
+        """The terrain-vehicle matrix as a networkx graph (see utils.df_to_graph), built on first use
+        so pandas and networkx are only imported if something needs it."""
+        if self._graph is None:
+            import pandas as pd
+            from utils import df_to_graph
+
+            self._graph = df_to_graph(pd.DataFrame(self.matrix, index=self.matrix_terrains, columns=self.matrix_vehicles))
+        return self._graph
@@ -0,0 +1,63 @@
+import collections
+import threading
+from typing import Iterator
+
+import gevent
+from gevent.event import Event
+
+
+_DONE = object()
+
+
+class ThreadStream:
+    """Events produced by a worker thread, for the response generator of a streaming endpoint.
+
+    The WSGI server runs every connection of a worker as a greenlet of one gevent hub, and the
+    standard library isn't monkey-patched (the planning thread pools must stay real threads), so
+    a generator blocking on a queue.Queue would hold the hub, and every other connection of the
+    worker, until the thread finished. Here the thread appends events and wakes the hub through
+    an async watcher (safe to signal from any thread), and the generator waits on a gevent Event,
+    which only suspends its own greenlet.
+
+    Create it where it's iterated (in the serving greenlet), since the watcher belongs to that
+    thread's hub.
+    """
+
+    def __init__(self):
+        self._events:collections.deque = collections.deque()
+        self._ready:Event = Event()
+        self._lock:threading.Lock = threading.Lock()
+        self._closed:bool = False
+        self._watcher = gevent.get_hub().loop.async_()
+        self._watcher.start(self._ready.set)
+
+
+    def put(self, event):
+        """Add an event, from any thread. Dropped once the consumer has gone (e.g. the client disconnected)."""
+        with self._lock:
+            if self._closed:
+                return
+            self._events.append(event)
+            self._watcher.send()
+
+
+    def finish(self):
+        """Mark the end of the stream, from any thread."""
+        self.put(_DONE)
+
+
+    def __iter__(self) -> Iterator:
+        try:
+            while True:
+                # Cleared before looking, so an event put after the look still wakes the wait
+                self._ready.clear()
+                while self._events:
+                    event = self._events.popleft()
+                    if event is _DONE:
+                        return
+                    yield event
+                self._ready.wait()
+        finally:
+            with self._lock:
+                self._closed = True
+                self._watcher.close()
@@ -1,17 +1,42 @@
 import requests
 from collections import Counter
-from geopy.distance import geodesic
 import numpy as np
-from concurrent.futures import ThreadPoolExecutor
-import json 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import config
+import geodesy
+import metrics
+import replay
+from http_client import http
+from terrain_cache import TerrainCache, cell_key
+from terrain_index import TerrainIndex
+from terrain_categories import classifier
+
+
+# Shared cache of terrain lookups, keyed on ~100 m grid cells
+terrain_cache:TerrainCache|None = TerrainCache(
+    config.TERRAIN_CACHE_PATH,
+    cell_size_m=config.TERRAIN_CACHE_CELL_METERS,
+    max_memory_entries=config.TERRAIN_CACHE_MEMORY_ENTRIES,
+    max_disk_entries=config.TERRAIN_CACHE_DISK_ENTRIES,
+    ttl=config.TERRAIN_CACHE_TTL
+) if config.TERRAIN_CACHE_ENABLED else None
+
+# Local land use index, loaded on first use when the offline backend is selected
+_terrain_index:TerrainIndex|None = None
+
+
+def get_terrain_index() -> TerrainIndex:
+    """Return the offline terrain index, loading it the first time it is needed."""
+    global _terrain_index
+    if _terrain_index is None:
+        _terrain_index = TerrainIndex(config.TERRAIN_INDEX_PATH)
+    return _terrain_index
 
 
 def calculate_distance(start_lat, start_lon, end_lat, end_lon):
     """Calculate the distance between two latitude/longitude points."""
-    start_point = (start_lat, start_lon)
-    end_point = (end_lat, end_lon)
-    return geodesic(start_point, end_point).km
+    return float(geodesy.vincenty_km(float(start_lat), float(start_lon), float(end_lat), float(end_lon)))
 
 
 def generate_intermediate_points(start_lat, start_lon, end_lat, end_lon, num_points):
@@ -22,28 +47,41 @@ def generate_intermediate_points(start_lat, start_lon, end_lat, end_lon, num_poi
 
 
 def fetch_terrain(lat, lon):
+    """Fetch the terrain at a point, served from the terrain cache when its grid cell has been seen before."""
+    if config.TERRAIN_BACKEND == 'offline':
+        return get_terrain_index().lookup(lat, lon)
+
+    if terrain_cache is None or replay.active():
+        return fetch_terrain_uncached(lat, lon)
+
+    terrain:str|None = terrain_cache.get(lat, lon)
+    if terrain is not None:
+        return terrain
+
+    terrain = fetch_terrain_uncached(lat, lon)
+
+    # Don't cache failures so the next request retries the lookup
+    if not terrain.startswith('Error'):
+        terrain_cache.set(lat, lon, terrain)
+
+    return terrain
+
+
+def fetch_terrain_uncached(lat, lon):
     """Fetch land use data from OpenStreetMap."""
+    with metrics.span('terrain_point'):
+        return _fetch_terrain_uncached(lat, lon)
+
+
+def _fetch_terrain_uncached(lat, lon):
     try:
         radius = 100  # Radius in meters for precision
-        url = f"https://overpass-api.de/api/interpreter?data=[out:json][timeout:25];(node(around:{radius},{lat},{lon});way(around:{radius},{lat},{lon});relation(around:{radius},{lat},{lon}););out body;>;out skel qt;"
-        response = requests.get(url)
+        url = f"{config.OVERPASS_URL}?data=[out:json][timeout:25];(node(around:{radius},{lat},{lon});way(around:{radius},{lat},{lon});relation(around:{radius},{lat},{lon}););out body;>;out skel qt;"
+        response = http.get(url)
         response.raise_for_status()
         data = response.json()
 
-        land_use_types = set()
-        for element in data.get('elements', []):
-            if 'tags' in element:
-                tags = element['tags']
-                land_use = tags.get('landuse') or tags.get('natural')
-                if land_use:
-                    land_use_types.add(land_use)
-
-        # Map land use types to categories
-        categorized_terrain = categorize_terrain(land_use_types)
-
-        if categorized_terrain:
-            return ', '.join(categorized_terrain)
-        return 'Unknown'
+        return terrain_from_elements(data.get('elements', []))
     except requests.RequestException as e:
         print(f"HTTP Request error: {e}")
         return 'Error: HTTP Request failed'
@@ -55,6 +93,155 @@ def fetch_terrain(lat, lon):
         return 'Error: Unexpected error'
 
 
+def terrain_from_elements(elements:list[dict]) -> str:
+    """Categorize the land use/natural tags of a list of Overpass elements into a terrain string."""
+    land_use_types = set()
+    for element in elements:
+        if 'tags' in element:
+            tags = element['tags']
+            land_use = tags.get('landuse') or tags.get('natural')
+            if land_use:
+                land_use_types.add(land_use)
+
+    # Map land use types to categories
+    categorized_terrain = categorize_terrain(land_use_types)
+
+    # Sorted, since set order changes with every process's string hashing and the terrain strings must be reproducible
+    if categorized_terrain:
+        return ', '.join(sorted(categorized_terrain))
+    return 'Unknown'
+
+
+def build_batch_query(points:list[tuple[float, float]], radius:int=100) -> str:
+    """
+    Build one Overpass query that looks up the terrain around every point.
+
+    Each point gets its own around-query followed by a `make` marker element carrying the
+    point's index, so the combined response can be split back up per point. Only elements
+    with a landuse or natural tag are requested since those are the only ones categorized.
+
+    Args:
+        points (list[tuple[float, float]]): points (lat, lon) to look up.
+        radius (int): search radius around each point in meters.
+
+    Returns:
+        str: the Overpass QL query.
+    """
+    statements:list[str] = [f'[out:json][timeout:{config.OVERPASS_QUERY_TIMEOUT}];']
+    for idx, (lat, lon) in enumerate(points):
+        statements.append(f'nwr(around:{radius},{lat},{lon})[~"^(landuse|natural)$"~"."];out tags;')
+        statements.append(f'make sample idx={idx};out;')
+
+    return ''.join(statements)
+
+
+def split_batch_response(elements:list[dict], num_points:int) -> list[list[dict]]:
+    """Split the elements of a batched query response into one list of elements per point."""
+    per_point:list[list[dict]] = [[] for _ in range(num_points)]
+
+    current:list[dict] = []
+    for element in elements:
+        if element.get('type') == 'sample':
+            per_point[int(element['tags']['idx'])] = current
+            current = []
+        else:
+            current.append(element)
+
+    return per_point
+
+
+def fetch_terrain_chunk(points:list[tuple[float, float]]) -> list[str]:
+    """Fetch the terrain for a chunk of points with a single Overpass request."""
+    try:
+        with metrics.span('terrain_batch_query'):
+            response = http.post(config.OVERPASS_URL, data={'data': build_batch_query(points)})
+            response.raise_for_status()
+            data = response.json()
+
+        return [terrain_from_elements(elements) for elements in split_batch_response(data.get('elements', []), len(points))]
+    except requests.RequestException as e:
+        print(f"HTTP Request error: {e}")
+        return ['Error: HTTP Request failed'] * len(points)
+    except ValueError as e:
+        print(f"JSON Parsing error: {e}")
+        return ['Error: JSON Parsing failed'] * len(points)
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return ['Error: Unexpected error'] * len(points)
+
+
+def fetch_terrain_batch(points:list[tuple[float, float]], stats:dict|None=None) -> list[str]:
+    """
+    Fetch the terrain for many points with as few Overpass requests as possible.
+
+    With the offline backend every point is looked up in the local terrain index. Otherwise,
+    points falling in the same grid cell (the terrain cache cell) are resolved once, cells
+    already in the terrain cache are served from it, and the rest are folded into batched
+    queries of config.OVERPASS_BATCH_SIZE points each.
+
+    Args:
+        points (list[tuple[float, float]]): points (lat, lon) to look up.
+        stats (dict | None): if given, the number of 'points', distinct 'cells' and
+            'fetched_cells' (cells not served by the cache) are added to it.
+
+    Returns:
+        list[str]: the terrain string for each point, in the same order as the input.
+    """
+    if config.TERRAIN_BACKEND == 'offline':
+        metrics.TERRAIN_POINTS.inc(len(points), source='offline')
+        if stats is not None:
+            stats['points'] = stats.get('points', 0) + len(points)
+        return get_terrain_index().lookup_many(points)
+
+    results:list[str|None] = [None] * len(points)
+
+    # Group the points by grid cell so each cell is resolved once, however many paths share it
+    cell_size_m:float = terrain_cache.cell_size_m if terrain_cache is not None else config.TERRAIN_CACHE_CELL_METERS
+    cells:dict[str, list[int]] = {}
+    for i, (lat, lon) in enumerate(points):
+        cells.setdefault(cell_key(lat, lon, cell_size_m), []).append(i)
+
+    # Recorded and replayed requests (see replay.py) skip the cache, so their archive holds every terrain they
+    # used and a replay's recorded responses never land in the persistent cache
+    use_cache:bool = terrain_cache is not None and not replay.active()
+    pending:dict[str, list[int]] = {}
+    cached_points:int = 0
+    for key, idxs in cells.items():
+        terrain:str|None = terrain_cache.get(*points[idxs[0]]) if use_cache else None
+        if terrain is None:
+            pending[key] = idxs
+            continue
+        for i in idxs:
+            results[i] = terrain
+        cached_points += len(idxs)
+
+    metrics.TERRAIN_POINTS.inc(cached_points, source='cache')
+    metrics.TERRAIN_POINTS.inc(len(points) - cached_points - len(pending), source='deduplicated')
+    metrics.TERRAIN_POINTS.inc(len(pending), source='upstream')
+    if stats is not None:
+        stats['points'] = stats.get('points', 0) + len(points)
+        stats['cells'] = stats.get('cells', 0) + len(cells)
+        stats['fetched_cells'] = stats.get('fetched_cells', 0) + len(pending)
+
+    if pending:
+        lookup_points:list[tuple[float, float]] = [points[idxs[0]] for idxs in pending.values()]
+        chunks:list[list[tuple[float, float]]] = [
+            lookup_points[i:i + config.OVERPASS_BATCH_SIZE] for i in range(0, len(lookup_points), config.OVERPASS_BATCH_SIZE)
+        ]
+
+        with ThreadPoolExecutor(max_workers=max(1, min(len(chunks), config.OVERPASS_CONCURRENCY))) as executor:
+            lookup_terrains:list[str] = [t for chunk in executor.map(metrics.in_context(fetch_terrain_chunk), chunks) for t in chunk]
+
+        for (lat, lon), idxs, terrain in zip(lookup_points, pending.values(), lookup_terrains):
+            # Don't cache failures so the next request retries the lookup
+            if use_cache and not terrain.startswith('Error'):
+                terrain_cache.set(lat, lon, terrain)
+            for i in idxs:
+                results[i] = terrain
+
+    return results
+
+
 def categorize_terrain(land_use_types):
     """Categorize terrain based on land use types."""
     # terrain_categories = {
@@ -69,16 +256,8 @@ def categorize_terrain(land_use_types):
     #     'unknown': {'Unknown'}
     # }
 
-    with open('terrain.json', 'r') as file:
-        data = json.load(file)
-        terrain_categories = data["terrain_categories"]
-
-    categorized_terrain = set()
-    for category, types in terrain_categories.items():
-        if land_use_types & set(types):
-            categorized_terrain.add(category)
-    
-    return categorized_terrain
+    # Definitions are loaded from terrain.json once and reloaded when the file changes
+    return classifier.classify(land_use_types)
 
 
 def count_terrain_categories(terrain_info):
@@ -92,54 +271,65 @@ def count_terrain_categories(terrain_info):
     return [{"terrain": terrain, "count": count} for terrain, count in terrain_counts.items()]
 
 
-def interpolate_point(p1:tuple[float, float], p2:tuple[float, float], t:float) -> tuple[float, float]:
+def interleave_midpoints(paths:np.ndarray) -> np.ndarray:
     """
-    Linearly interpolate between two points p1 and p2 by factor t.
-    
+    Insert the midpoint of every segment between the vertices of each path.
+
     Args:
-        p1 (tuple[float, float]): first point (lat, lon).
-        p2 (tuple[float, float]): second point (lat, lon).
-        t (float): factor to interpolate.
-        
+        paths (np.ndarray): array of shape (paths, points, 2) of (lat, lon) vertices.
+
     Returns:
-        tuple[float, float]: interpolated point (lat, lon).
+        np.ndarray: array of shape (paths, 2 * points - 1, 2) with the vertices at even
+            indices and the segment midpoints at odd indices.
     """
-    return (p1[0] * (1 - t) + p2[0] * t, p1[1] * (1 - t) + p2[1] * t)
+    out:np.ndarray = np.empty((paths.shape[0], 2 * paths.shape[1] - 1, 2), dtype=paths.dtype)
+    out[:, ::2] = paths
+    out[:, 1::2] = (paths[:, :-1] + paths[:, 1:]) / 2
+    return out
 
 
-def add_random_triangle_deviation(start:tuple[float, float], end:tuple[float, float], level:int, factor:float) -> list[tuple[float, float]]:
+def generate_triangular_paths(start:tuple[float, float], end:tuple[float, float], num_paths:int, levels:int, factor:float,
+                              rng:np.random.Generator|int|None=None, with_midpoints:bool=False) -> np.ndarray:
     """
-    Recursively adds random triangle deviations to the path between start and end.
-    
+    Generate paths with random triangle deviations between a start and endpoint, all at once.
+
+    Every refinement step splits each segment of every path at its midpoint and pushes the
+    midpoint a random direction, by factor / 2**level for level = levels, ..., 1 (the same
+    deviation schedule as the original recursive construction).
+
     Args:
         start (tuple[float, float]): Starting point (lat, lon).
         end (tuple[float, float]): Ending point (lat, lon).
-        level (int): Current recursion level.
+        num_paths (int): Number of paths to generate.
+        levels (int): Number of refinement levels; each path has 2**levels + 1 points.
         factor (float): Deviation factor, controls the magnitude of deviation.
-        
+        rng (np.random.Generator | int | None): generator or seed, for reproducible paths.
+        with_midpoints (bool): also return the segment midpoints used for terrain sampling,
+            interleaved at the odd indices (see interleave_midpoints).
+
     Returns:
-        list[tuple[float, float]]: List of points including deviations.
+        np.ndarray: array of shape (num_paths, 2**levels + 1, 2) of (lat, lon) points, or
+            (num_paths, 2**(levels + 1) + 1, 2) with midpoints.
     """
-    if level == 0:
-        return [start, end]
-    
-    mid_point = interpolate_point(start, end, 0.5)
-    
-    # Deviation triangle vertex
-    angle = np.random.uniform(0, 2 * np.pi)
-    distance = factor / (2 ** level)  # Deviation decreases with depth
-    dx = distance * np.cos(angle)
-    dy = distance * np.sin(angle)
-    deviation_point = (mid_point[0] + dx, mid_point[1] + dy)
-    
-    # Recursively generate paths
-    first_half = add_random_triangle_deviation(start, deviation_point, level - 1, factor)
-    second_half = add_random_triangle_deviation(deviation_point, end, level - 1, factor)
-    
-    return first_half + second_half[1:]  # Avoid duplicating the midpoint
+    rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+
+    paths:np.ndarray = np.empty((num_paths, 2, 2), dtype=np.float64)
+    paths[:, 0] = start
+    paths[:, 1] = end
+
+    for level in range(levels, 0, -1):
+        angles:np.ndarray = rng.uniform(0, 2 * np.pi, size=(num_paths, paths.shape[1] - 1))
+        distance:float = factor / (2 ** level)  # Deviation grows as segments get shorter
+
+        paths = interleave_midpoints(paths)
+        paths[:, 1::2, 0] += distance * np.cos(angles)
+        paths[:, 1::2, 1] += distance * np.sin(angles)
 
+    return interleave_midpoints(paths) if with_midpoints else paths
 
-def create_triangular_paths(start:tuple[float, float], end:tuple[float, float], num_paths:int, levels:int, factor:float) -> list[tuple[float, float]]:
+
+def create_triangular_paths(start:tuple[float, float], end:tuple[float, float], num_paths:int, levels:int, factor:float,
+                            seed:int|None=None) -> list[list[list[float]]]:
     """
     Creates multiple paths with triangular deviations between a start and endpoint.
     
@@ -149,67 +339,263 @@ def create_triangular_paths(start:tuple[float, float], end:tuple[float, float],
         num_paths (int): Number of paths to generate.
         levels (int): Number of recursion levels (controls the granularity of deviation).
         factor (float): Deviation factor.
+        seed (int | None): seed of the random deviations, for reproducible paths.
         
     Returns:
-        list[list[tuple[float, float]]]: List of paths, where each path is a list of points.
+        list[list[list[float]]]: List of paths, where each path is a list of [lat, lon] points.
     """
-    paths = []
-    
-    for _ in range(num_paths):
-        path = add_random_triangle_deviation(start, end, levels, factor)
-        paths.append(path)
-    
-    return paths
+    return generate_triangular_paths(start, end, num_paths, levels, factor, rng=seed).tolist()
 
 
-def fetch_terrain_for_single_path(path):
-    """Fetch terrain info for a single path and count terrain types."""
-    terrain_counts = Counter()
-    for lat, lon in path:
-        try:
-            terrain_info = fetch_terrain(lat, lon)
-            terrain_types = terrain_info.split(', ')
-            for terrain_type in terrain_types:
-                if terrain_type != "Unknown":
-                    terrain_counts[terrain_type] += 1
-        except Exception as e:
-            print(f"Error fetching terrain for ({lat}, {lon}): {e}")
-
-    # Fetch terrain for midpoints as well
+def path_sample_points(path) -> list[tuple[float, float]]:
+    """Return the points sampled for terrain along a path: every vertex, then every segment midpoint."""
+    points:list[tuple[float, float]] = [(lat, lon) for lat, lon in path]
     for i in range(len(path) - 1):
         lat1, lon1 = path[i]
         lat2, lon2 = path[i + 1]
+        points.append(((lat1 + lat2) / 2, (lon1 + lon2) / 2))
+
+    return points
 
-        # Compute midpoint
-        mid_lat = (lat1 + lat2) / 2
-        mid_lon = (lon1 + lon2) / 2
 
-        try:
-            terrain_info = fetch_terrain(mid_lat, mid_lon)
-            for terrain_type in terrain_info.split(', '):
-                if terrain_type != "Unknown":
-                    terrain_counts[terrain_type] += 1
-        except Exception as e:
-            print(f"Error fetching terrain for midpoint ({mid_lat}, {mid_lon}): {e}")
+def sample_paths_fixed(paths, stats:dict|None=None) -> list[tuple[list[tuple[float, str]], dict]]:
+    """
+    Sample the terrain of every vertex and every segment midpoint of each path.
+
+    Returns:
+        list[tuple[list[tuple[float, str]], dict]]: for each path, its samples as (position,
+            terrain) sorted along the path (position i is vertex i, i + 0.5 the midpoint after it),
+            and the sampling stats (see sample_paths_adaptive).
+    """
+    sample_points:list[list[tuple[float, float]]] = [path_sample_points(path) for path in paths]
+    terrain_infos:list[str] = fetch_terrain_batch([point for points in sample_points for point in points], stats)
+
+    sampled:list = []
+    offset:int = 0
+    for path, points in zip(paths, sample_points):
+        positions:list[float] = [float(i) for i in range(len(path))] + [i + 0.5 for i in range(len(path) - 1)]
+        samples:list[tuple[float, str]] = sorted(zip(positions, terrain_infos[offset:offset + len(points)]))
+        sampled.append((samples, {'samples': len(points), 'lookups': len(points), 'lookups_saved': 0}))
+        offset += len(points)
+
+    return sampled
+
+
+def sample_paths_adaptive(paths, max_depth:int=3, min_segment_m:float=100.0, stats:dict|None=None) -> list[tuple[list[tuple[float, str]], dict]]:
+    """
+    Sample the terrain along each path, spending lookups only where the terrain changes.
+
+    The vertices are looked up first. A segment whose endpoints have the same terrain is assumed
+    to keep it, so its midpoint is counted with that terrain without a lookup. The midpoint of a
+    segment whose endpoints differ is looked up, and each half whose endpoints still differ is
+    split again, up to max_depth levels or until the segment is shorter than min_segment_m, to
+    place the boundary more precisely. Each level is resolved in one fetch_terrain_batch call
+    across all paths. On a homogeneous path this makes about half the lookups of
+    sample_paths_fixed.
+
+    Terrain counts are taken at the vertices and midpoints like the fixed sampler's (see
+    counted_samples), so they match it unless the terrain changes and changes back between two
+    vertices with the same terrain, whose midpoint is inferred rather than looked up. The deeper
+    samples only move the boundary, so they don't change the counts; they change the km per
+    terrain (terrain_exposure_km), which weighs every sample by the stretch of path it stands for
+    and is what paths are scored on.
+
+    Args:
+        paths (list): paths as lists of [lat, lon] points.
+        max_depth (int): subdivision levels of a segment (1 only samples the midpoints, deeper levels refine boundaries).
+        min_segment_m (float): segments shorter than this are not split below the first level.
+        stats (dict | None): lookup stats accumulated across levels (see fetch_terrain_batch).
+
+    Returns:
+        list[tuple[list[tuple[float, str]], dict]]: for each path, its samples as (position,
+            terrain) sorted along the path (position i is vertex i, fractions lie between
+            vertices), and its stats: 'samples' taken, 'lookups' made and 'lookups_saved'
+            compared to sampling every vertex and midpoint.
+    """
+    vertices:list[list[tuple[float, float]]] = [[(lat, lon) for lat, lon in path] for path in paths]
+    vertex_terrains:list[str] = fetch_terrain_batch([point for points in vertices for point in points], stats)
+
+    samples:list[dict[float, str]] = []
+    lookups:list[int] = []
+    # Segments to sample: (path, start position, end position, start point, end point, start terrain, end terrain)
+    frontier:list[tuple] = []
+    offset:int = 0
+    for p, points in enumerate(vertices):
+        terrains:list[str] = vertex_terrains[offset:offset + len(points)]
+        offset += len(points)
+        samples.append({float(i): terrain for i, terrain in enumerate(terrains)})
+        lookups.append(len(points))
+        frontier.extend(
+            (p, float(i), float(i + 1), points[i], points[i + 1], terrains[i], terrains[i + 1]) for i in range(len(points) - 1)
+        )
+
+    for depth in range(1, max_depth + 1):
+        to_lookup:list[tuple] = []
+        for segment in frontier:
+            p, start_pos, end_pos, start, end, start_terrain, end_terrain = segment
+            errors:bool = start_terrain.startswith('Error') or end_terrain.startswith('Error')
+            if depth == 1:
+                # Every segment contributes its midpoint, looked up unless the terrain is unchanged
+                if start_terrain == end_terrain and not errors:
+                    samples[p][(start_pos + end_pos) / 2] = start_terrain
+                else:
+                    to_lookup.append(segment)
+            elif start_terrain != end_terrain and not errors and geodesy.haversine_km(*start, *end) * 1000 >= min_segment_m:
+                to_lookup.append(segment)
+
+        if not to_lookup:
+            break
+
+        midpoints:list[tuple[float, float]] = [((s[3][0] + s[4][0]) / 2, (s[3][1] + s[4][1]) / 2) for s in to_lookup]
+        midpoint_terrains:list[str] = fetch_terrain_batch(midpoints, stats)
+
+        frontier = []
+        for (p, start_pos, end_pos, start, end, start_terrain, end_terrain), mid, mid_terrain in zip(to_lookup, midpoints, midpoint_terrains):
+            mid_pos:float = (start_pos + end_pos) / 2
+            samples[p][mid_pos] = mid_terrain
+            lookups[p] += 1
+            frontier.append((p, start_pos, mid_pos, start, mid, start_terrain, mid_terrain))
+            frontier.append((p, mid_pos, end_pos, mid, end, mid_terrain, end_terrain))
+
+    sampled:list = []
+    for path, path_samples, path_lookups in zip(vertices, samples, lookups):
+        fixed_lookups:int = max(2 * len(path) - 1, 0)
+        sampled.append((sorted(path_samples.items()), {
+            'samples': len(path_samples),
+            'lookups': path_lookups,
+            'lookups_saved': fixed_lookups - path_lookups
+        }))
+        metrics.TERRAIN_POINTS.inc(len(path_samples) - path_lookups, source='inferred')
+
+    return sampled
+
+
+def sample_paths(paths, stats:dict|None=None) -> list[tuple[list[tuple[float, str]], dict]]:
+    """Sample the terrain along each path with the sampler selected by config.TERRAIN_SAMPLING."""
+    if config.TERRAIN_SAMPLING == 'fixed':
+        return sample_paths_fixed(paths, stats)
+    return sample_paths_adaptive(paths, config.TERRAIN_SAMPLING_MAX_DEPTH, config.TERRAIN_SAMPLING_MIN_SEGMENT_M, stats)
+
+
+def count_terrain_types(terrain_infos:list[str]) -> Counter:
+    """Count the known terrain types in a list of terrain strings."""
+    terrain_counts = Counter()
+    for terrain_info in terrain_infos:
+        for terrain_type in terrain_info.split(', '):
+            if terrain_type != "Unknown":
+                terrain_counts[terrain_type] += 1
 
     return terrain_counts
 
 
-def fetch_terrain_for_paths(paths):
-    """Fetch terrain information for each path and count occurrences of each terrain type."""
-    
-    # Use ThreadPoolExecutor to process each path in parallel
-    with ThreadPoolExecutor(max_workers=min(len(paths), 10)) as executor:
-        # Map paths to the terrain counting function
-        terrain_counts_list = list(executor.map(fetch_terrain_for_single_path, paths))
+def counted_samples(samples:list[tuple[float, str]]) -> list[str]:
+    """The terrain of the samples at the vertices and segment midpoints, which terrain counts are
+    taken from. Deeper adaptive samples would over-weight boundaries in a count; they're used,
+    weighted by length, in terrain_exposure_km instead."""
+    return [terrain for position, terrain in samples if (2 * position).is_integer()]
 
-    # Convert to the required format
-    result = {
-        f'Path {i + 1}': {
-            'path': paths[i],
-            'terrain_counts': dict(terrain_counts_list[i])
-        }
-        for i in range(len(paths))
+
+def terrain_exposure_km(cumulative_km:np.ndarray, samples:list[tuple[float, str]]) -> dict[str, float]:
+    """
+    Kilometers travelled through each known terrain type along a path.
+
+    Each sample stands for the stretch of path closer to it than to its neighbouring samples, so
+    the extra samples adaptive sampling places around a boundary locate it more precisely
+    instead of weighing it more. A sample with several terrain types counts its stretch for each.
+
+    Args:
+        cumulative_km (np.ndarray): distance along the path to each vertex (see geodesy.cumulative_lengths_km).
+        samples (list[tuple[float, str]]): (position, terrain) samples sorted along the path.
+
+    Returns:
+        dict[str, float]: terrain type -> km.
+    """
+    if not samples:
+        return {}
+
+    positions:np.ndarray = np.array([position for position, _ in samples])
+    distances:np.ndarray = np.interp(positions, np.arange(len(cumulative_km)), cumulative_km)
+    bounds:np.ndarray = np.concatenate(([0.0], (distances[:-1] + distances[1:]) / 2, [cumulative_km[-1]]))
+    stretches:np.ndarray = np.diff(bounds)
+
+    exposure:dict[str, float] = {}
+    for (_, terrain_info), km in zip(samples, stretches.tolist()):
+        for terrain_type in terrain_info.split(', '):
+            if terrain_type != "Unknown":
+                exposure[terrain_type] = exposure.get(terrain_type, 0.0) + km
+
+    return exposure
+
+
+def path_details(path, samples:list[tuple[float, str]], stats:dict, cumulative_km:np.ndarray) -> dict:
+    """The terrain details of a path: its points, terrain counts, km per terrain and sampling stats.
+    The km are kept unrounded for scoring, see reported_details for the ones returned to clients."""
+    return {
+        'path': path,
+        'terrain_counts': dict(count_terrain_types(counted_samples(samples))),
+        'terrain_km': terrain_exposure_km(cumulative_km, samples),
+        'length_km': round(float(cumulative_km[-1]), 3) if len(cumulative_km) else 0.0,
+        'sampling': stats
     }
 
-    return result
\ No newline at end of file
+
+def reported_details(details:dict) -> dict:
+    """The terrain details of a path as returned to clients, with the km per terrain rounded to meters.
+
+    Only the response is rounded: a stretch of impassable terrain shorter than half a meter must
+    still make a path impossible for the vehicles that can't cross it when it's scored."""
+    if 'terrain_km' not in details:
+        return details
+    return {**details, 'terrain_km': {terrain: round(km, 3) for terrain, km in details['terrain_km'].items()}}
+
+
+def paths_cumulative_km(paths) -> list[np.ndarray]:
+    """Distance along each path to each of its vertices, computed in one call when the paths have the same number of points."""
+    if paths and len({len(path) for path in paths}) == 1 and len(paths[0]) > 0:
+        return list(geodesy.cumulative_lengths_km(paths))
+    return [geodesy.cumulative_lengths_km(path) if len(path) > 0 else np.zeros(0) for path in paths]
+
+
+def fetch_terrain_for_single_path(path):
+    """Fetch terrain info for a single path and count terrain types."""
+    with metrics.span('terrain_path'):
+        samples, _ = sample_paths([path])[0]
+        return count_terrain_types(counted_samples(samples))
+
+
+def fetch_terrain_for_paths(paths, on_path_done=None, stats:dict|None=None):
+    """
+    Fetch terrain information for each path: the count of each terrain type among its samples
+    and the km travelled through each (see path_details).
+
+    If on_path_done is given, each path is resolved on its own and on_path_done(name, details)
+    is called as soon as that path's terrain is known, so callers can report progress.
+    Otherwise the sample points of all paths are resolved together in shared batched queries,
+    and if stats is given the lookup stats are added to it (see fetch_terrain_batch).
+    """
+    names:list[str] = [f'Path {i + 1}' for i in range(len(paths))]
+    cumulative_km:list[np.ndarray] = paths_cumulative_km(paths)
+
+    if on_path_done is not None:
+        details_list:list[dict|None] = [None] * len(paths)
+
+        def resolve(path) -> tuple:
+            with metrics.span('terrain_path'):
+                return sample_paths([path])[0]
+
+        # Use ThreadPoolExecutor to process each path in parallel
+        with ThreadPoolExecutor(max_workers=max(1, min(len(paths), 10))) as executor:
+            futures = {executor.submit(metrics.in_context(resolve), path): i for i, path in enumerate(paths)}
+            for future in as_completed(futures):
+                i:int = futures[future]
+                details_list[i] = path_details(paths[i], *future.result(), cumulative_km[i])
+                on_path_done(names[i], details_list[i])
+    else:
+        # Resolve the sample points of all paths together so they share batched queries
+        details_list = [
+            path_details(path, samples, path_stats, path_km)
+            for path, (samples, path_stats), path_km in zip(paths, sample_paths(paths, stats), cumulative_km)
+        ]
+
+    # Convert to the required format
+    return {names[i]: details_list[i] for i in range(len(paths))}
@@ -0,0 +1,157 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from caching import LRUCache
+
+
+METERS_PER_DEGREE_LAT:float = 111_320.0
+
+
+def cell_key(lat:float, lon:float, cell_size_m:float) -> str:
+    """Quantize a point to the key of the grid cell of roughly cell_size_m meters containing it."""
+    lat, lon = float(lat), float(lon)
+    lat_step:float = cell_size_m / METERS_PER_DEGREE_LAT
+    row:int = math.floor(lat / lat_step)
+
+    # Keep cells roughly square by widening the longitude step with the latitude of the row
+    row_lat:float = min(abs((row + 0.5) * lat_step), 89.9)
+    lon_step:float = lat_step / math.cos(math.radians(row_lat))
+    col:int = math.floor(lon / lon_step)
+
+    return f'{row}:{col}'
+
+
+class TerrainCache:
+    """Two-tier cache of terrain lookups keyed on a fixed lat/lon grid.
+
+    Points are quantized to square cells roughly cell_size_m on a side, so nearby lookups
+    (e.g. repeated plans over the same corridor) share a single Overpass result. Lookups go
+    to an in-memory LRU first and fall back to a SQLite store that survives restarts.
+
+    Args:
+        db_path (str | None): path of the SQLite file, or None to only cache in memory.
+        cell_size_m (float): side length of a grid cell in meters.
+        max_memory_entries (int): size bound of the in-memory tier.
+        max_disk_entries (int): size bound of the on-disk tier; the oldest rows are evicted first.
+        ttl (float): seconds a cached terrain stays valid in either tier.
+    """
+
+    def __init__(self, db_path:str|None, cell_size_m:float=100.0, max_memory_entries:int=50_000,
+                 max_disk_entries:int=2_000_000, ttl:float=30 * 24 * 3600):
+        self.cell_size_m:float = cell_size_m
+        self.max_disk_entries:int = max_disk_entries
+        self.ttl:float = ttl
+        self.memory:LRUCache = LRUCache(max_memory_entries, ttl)
+
+        self.disk_hits:int = 0
+        self.misses:int = 0
+        self._writes_since_evict:int = 0
+        self._lock:threading.Lock = threading.Lock()
+
+        self.db_path:str|None = db_path
+        self._db:sqlite3.Connection|None = None
+        self._connect()
+
+        # The disk tier is shared by all server workers; each forked worker needs its own connection
+        os.register_at_fork(after_in_child=self._connect)
+
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        if self.db_path:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS terrain (cell TEXT PRIMARY KEY, terrain TEXT NOT NULL, fetched_at REAL NOT NULL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS terrain_fetched_at ON terrain (fetched_at)')
+            self._db.commit()
+
+
+    def cell_key(self, lat:float, lon:float) -> str:
+        """Quantize a point to the key of the grid cell containing it."""
+        return cell_key(lat, lon, self.cell_size_m)
+
+
+    def get(self, lat:float, lon:float) -> str|None:
+        """Return the cached terrain for the cell containing (lat, lon), or None on a miss."""
+        key:str = self.cell_key(lat, lon)
+
+        terrain:str|None = self.memory.get(key)
+        if terrain is not None:
+            return terrain
+
+        if self._db is not None:
+            with self._lock:
+                row = self._db.execute('SELECT terrain, fetched_at FROM terrain WHERE cell = ?', (key,)).fetchone()
+
+            if row and row[1] + self.ttl >= time.time():
+                self.disk_hits += 1
+                self.memory.set(key, row[0], ttl=row[1] + self.ttl - time.time())
+                return row[0]
+
+        self.misses += 1
+        return None
+
+
+    def set(self, lat:float, lon:float, terrain:str):
+        """Store the terrain for the cell containing (lat, lon) in both tiers."""
+        key:str = self.cell_key(lat, lon)
+        self.memory.set(key, terrain)
+
+        if self._db is None:
+            return
+
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO terrain (cell, terrain, fetched_at) VALUES (?, ?, ?)', (key, terrain, time.time()))
+            self._db.commit()
+
+            # Checking the table size on every write is wasteful, so only evict periodically
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= 1000:
+                self._writes_since_evict = 0
+                self._evict()
+
+
+    def _evict(self):
+        """Drop expired rows, then the oldest rows until the disk tier is within its size bound.
+        Must be called with the lock held."""
+        self._db.execute('DELETE FROM terrain WHERE fetched_at < ?', (time.time() - self.ttl,))
+
+        count:int = self._db.execute('SELECT COUNT(*) FROM terrain').fetchone()[0]
+        if count > self.max_disk_entries:
+            self._db.execute(
+                'DELETE FROM terrain WHERE cell IN (SELECT cell FROM terrain ORDER BY fetched_at LIMIT ?)',
+                (count - self.max_disk_entries,)
+            )
+        self._db.commit()
+
+
+    def clear(self):
+        """Remove all entries from both tiers."""
+        self.memory.clear()
+        if self._db is not None:
+            with self._lock:
+                self._db.execute('DELETE FROM terrain')
+                self._db.commit()
+
+
+    def stats(self) -> dict:
+        """Return hit/miss counters for each tier."""
+        memory_stats:dict = self.memory.stats()
+        disk_size:int = 0
+        if self._db is not None:
+            with self._lock:
+                disk_size = self._db.execute('SELECT COUNT(*) FROM terrain').fetchone()[0]
+
+        hits:int = memory_stats['hits'] + self.disk_hits
+        return {
+            'hits': hits,
+            'memory_hits': memory_stats['hits'],
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': hits / (hits + self.misses) if hits + self.misses else 0.0,
+            'memory_size': memory_stats['size'],
+            'disk_size': disk_size
+        }
@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+import time
+
+
+# Default location of the terrain category definitions, next to this module
+TERRAIN_JSON_PATH:str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'terrain.json')
+
+
+class TerrainClassifier:
+    """Maps OSM land use types to terrain categories using an inverted index built from terrain.json.
+
+    The mapping is loaded once and turned into a land use type -> categories dict, so classifying
+    a set of types is one dict lookup per type. The file's modification time is checked at most
+    every check_interval seconds and the index is rebuilt when it changes on disk.
+
+    Args:
+        path (str): path of the terrain category definitions.
+        check_interval (float | None): seconds between checks for changes, or None to never reload.
+    """
+
+    def __init__(self, path:str=TERRAIN_JSON_PATH, check_interval:float|None=2.0):
+        self.path:str = path
+        self.check_interval:float|None = check_interval
+        self._lock:threading.Lock = threading.Lock()
+        self._last_check:float = 0.0
+        self._mtime:float = 0.0
+        self.category_names:list[str] = []
+        self.index:dict[str, frozenset[str]] = {}
+        self.reload()
+
+
+    def reload(self):
+        """(Re)load the definitions from disk and rebuild the inverted index."""
+        with self._lock:
+            mtime:float = os.stat(self.path).st_mtime
+            with open(self.path, 'r') as file:
+                terrain_categories:dict[str, list[str]] = json.load(file)['terrain_categories']
+
+            index:dict[str, set[str]] = {}
+            for category, types in terrain_categories.items():
+                for land_use_type in types:
+                    index.setdefault(land_use_type, set()).add(category)
+
+            # Swap in the new index in one go so concurrent readers see either the old or the new one
+            self.category_names = list(terrain_categories.keys())
+            self.index = {land_use_type: frozenset(categories) for land_use_type, categories in index.items()}
+            self._mtime = mtime
+            self._last_check = time.monotonic()
+
+
+    def _reload_if_changed(self):
+        """Reload the definitions if the file changed since it was last loaded."""
+        now:float = time.monotonic()
+        if self.check_interval is None or now - self._last_check < self.check_interval:
+            return
+
+        self._last_check = now
+        try:
+            changed:bool = os.stat(self.path).st_mtime != self._mtime
+        except OSError:
+            return   # Keep serving the last good mapping if the file is briefly missing mid-write
+
+        if changed:
+            try:
+                self.reload()
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error reloading {self.path}, keeping previous terrain categories: {e}")
+
+
+    def classify(self, land_use_types) -> set[str]:
+        """Return the set of terrain categories matched by any of the given land use types."""
+        self._reload_if_changed()
+
+        index:dict[str, frozenset[str]] = self.index
+        categorized_terrain:set[str] = set()
+        for land_use_type in land_use_types:
+            categories:frozenset[str]|None = index.get(land_use_type)
+            if categories:
+                categorized_terrain |= categories
+
+        return categorized_terrain
+
+
+# Shared classifier used by terrain.categorize_terrain
+classifier:TerrainClassifier = TerrainClassifier()
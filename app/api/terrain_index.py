@@ -0,0 +1,214 @@
+import argparse
+import json
+import math
+
+import numpy as np
+
+from terrain_categories import TerrainClassifier, TERRAIN_JSON_PATH
+
+
+METERS_PER_DEGREE_LAT:float = 111_320.0
+
+
+def categories_to_mask(categories:set[str], category_names:list[str]) -> int:
+    """Encode a set of terrain categories as a bitmask, one bit per category in category_names."""
+    mask:int = 0
+    for bit, name in enumerate(category_names):
+        if name in categories:
+            mask |= 1 << bit
+    return mask
+
+
+def points_in_polygon(lons:np.ndarray, lats:np.ndarray, rings:list[list[list[float]]]) -> np.ndarray:
+    """
+    Even-odd point in polygon test for many points at once.
+
+    Args:
+        lons (np.ndarray): longitudes of the points.
+        lats (np.ndarray): latitudes of the points.
+        rings (list): GeoJSON polygon rings ([[lon, lat], ...]); holes are handled by the even-odd rule.
+
+    Returns:
+        np.ndarray: boolean array, True where the point is inside the polygon.
+    """
+    inside:np.ndarray = np.zeros(lons.shape, dtype=bool)
+    for ring in rings:
+        coords:np.ndarray = np.asarray(ring, dtype=np.float64)
+        for (x0, y0), (x1, y1) in zip(coords[:-1], coords[1:]):
+            if y0 == y1:
+                continue
+            crosses:np.ndarray = (y0 > lats) != (y1 > lats)
+            x_intersect:np.ndarray = x0 + (lats - y0) * (x1 - x0) / (y1 - y0)
+            inside ^= crosses & (lons < x_intersect)
+
+    return inside
+
+
+def iter_polygons(geometry:dict):
+    """Yield the rings of every polygon in a GeoJSON Polygon/MultiPolygon geometry."""
+    if geometry is None:
+        return
+    if geometry['type'] == 'Polygon':
+        yield geometry['coordinates']
+    elif geometry['type'] == 'MultiPolygon':
+        yield from geometry['coordinates']
+
+
+def dilate(grid:np.ndarray, radius_cells:int) -> np.ndarray:
+    """OR every cell with the cells within radius_cells of it, mirroring the Overpass around-radius."""
+    out:np.ndarray = grid.copy()
+    rows, cols = grid.shape
+    for dy in range(-radius_cells, radius_cells + 1):
+        for dx in range(-radius_cells, radius_cells + 1):
+            if (dy, dx) == (0, 0) or dy * dy + dx * dx > radius_cells * radius_cells:
+                continue
+            out[max(dy, 0):rows + min(dy, 0), max(dx, 0):cols + min(dx, 0)] |= \
+                grid[max(-dy, 0):rows + min(-dy, 0), max(-dx, 0):cols + min(-dx, 0)]
+
+    return out
+
+
+def build_index(geojson_path:str, out_path:str, resolution_m:float=100.0, radius_m:float=100.0,
+                terrain_json_path:str=TERRAIN_JSON_PATH):
+    """
+    Rasterize an OSM land use extract into a terrain category grid.
+
+    The extract is a GeoJSON FeatureCollection of landuse/natural polygons, e.g. produced from
+    a PBF with `osmium export --geometry-types=polygon`. Every cell stores a bitmask of the
+    categories `categorize_terrain` assigns to the polygons within radius_m of it. The grid is
+    written to <out_path>.npy and its metadata to <out_path>.json.
+
+    Args:
+        geojson_path (str): path of the GeoJSON extract.
+        out_path (str): path prefix of the index files.
+        resolution_m (float): side length of a grid cell in meters.
+        radius_m (float): search radius around each cell, matching the Overpass query radius.
+        terrain_json_path (str): path of the terrain category definitions.
+    """
+    classifier:TerrainClassifier = TerrainClassifier(terrain_json_path, check_interval=None)
+    category_names:list[str] = classifier.category_names
+    dtype = np.uint8 if len(category_names) <= 8 else np.uint32
+
+    with open(geojson_path, 'r') as file:
+        features:list[dict] = json.load(file)['features']
+
+    # Keep the polygons whose land use maps to at least one category
+    polygons:list[tuple[int, list]] = []
+    for feature in features:
+        tags:dict = feature.get('properties') or {}
+        land_use:str|None = tags.get('landuse') or tags.get('natural')
+        if not land_use:
+            continue
+
+        mask:int = categories_to_mask(classifier.classify({land_use}), category_names)
+        if mask:
+            polygons.extend((mask, rings) for rings in iter_polygons(feature.get('geometry')))
+
+    if not polygons:
+        raise ValueError(f'No categorizable landuse/natural polygons in {geojson_path}')
+
+    all_coords:np.ndarray = np.concatenate([np.asarray(rings[0], dtype=np.float64) for _, rings in polygons])
+    lon_min, lat_min = all_coords.min(axis=0)
+    lon_max, lat_max = all_coords.max(axis=0)
+
+    lat_step:float = resolution_m / METERS_PER_DEGREE_LAT
+    lon_step:float = lat_step / math.cos(math.radians(min(abs((lat_min + lat_max) / 2), 89.9)))
+    rows:int = int(math.ceil((lat_max - lat_min) / lat_step)) + 1
+    cols:int = int(math.ceil((lon_max - lon_min) / lon_step)) + 1
+
+    grid:np.ndarray = np.zeros((rows, cols), dtype=dtype)
+    for mask, rings in polygons:
+        ring:np.ndarray = np.asarray(rings[0], dtype=np.float64)
+        r0, r1 = (int((ring[:, 1].min() - lat_min) / lat_step), int((ring[:, 1].max() - lat_min) / lat_step) + 1)
+        c0, c1 = (int((ring[:, 0].min() - lon_min) / lon_step), int((ring[:, 0].max() - lon_min) / lon_step) + 1)
+
+        # Test the centers of the cells in the polygon's bounding box
+        center_lats, center_lons = np.meshgrid(
+            lat_min + (np.arange(r0, r1) + 0.5) * lat_step,
+            lon_min + (np.arange(c0, c1) + 0.5) * lon_step,
+            indexing='ij'
+        )
+        inside:np.ndarray = points_in_polygon(center_lons, center_lats, rings)
+        grid[r0:r1, c0:c1][inside] |= mask
+
+    grid = dilate(grid, int(round(radius_m / resolution_m)))
+
+    np.save(f'{out_path}.npy', grid)
+    with open(f'{out_path}.json', 'w') as file:
+        json.dump({
+            'lat_min': float(lat_min),
+            'lon_min': float(lon_min),
+            'lat_step': lat_step,
+            'lon_step': lon_step,
+            'rows': rows,
+            'cols': cols,
+            'categories': category_names,
+            'resolution_m': resolution_m,
+            'radius_m': radius_m
+        }, file, indent=4)
+
+
+class TerrainIndex:
+    """Memory-mapped terrain category grid built by build_index.
+
+    Args:
+        path (str): path prefix of the index files (<path>.npy and <path>.json).
+    """
+
+    def __init__(self, path:str):
+        with open(f'{path}.json', 'r') as file:
+            meta:dict = json.load(file)
+
+        self.lat_min:float = meta['lat_min']
+        self.lon_min:float = meta['lon_min']
+        self.lat_step:float = meta['lat_step']
+        self.lon_step:float = meta['lon_step']
+        self.categories:list[str] = meta['categories']
+        self.grid:np.ndarray = np.load(f'{path}.npy', mmap_mode='r')
+
+        # Memoized terrain string of each bitmask seen so far
+        self._mask_terrain:dict[int, str] = {}
+
+
+    def _terrain_for_mask(self, mask:int) -> str:
+        terrain:str|None = self._mask_terrain.get(mask)
+        if terrain is None:
+            categories:set[str] = {name for bit, name in enumerate(self.categories) if mask & (1 << bit)}
+            terrain = ', '.join(sorted(categories)) if categories else 'Unknown'
+            self._mask_terrain[mask] = terrain
+        return terrain
+
+
+    def lookup_masks(self, lats:np.ndarray, lons:np.ndarray) -> np.ndarray:
+        """Return the category bitmask of each point, 0 for points outside the grid."""
+        rows:np.ndarray = np.floor((np.asarray(lats, dtype=np.float64) - self.lat_min) / self.lat_step).astype(np.int64)
+        cols:np.ndarray = np.floor((np.asarray(lons, dtype=np.float64) - self.lon_min) / self.lon_step).astype(np.int64)
+        in_bounds:np.ndarray = (rows >= 0) & (rows < self.grid.shape[0]) & (cols >= 0) & (cols < self.grid.shape[1])
+
+        masks:np.ndarray = np.zeros(rows.shape, dtype=self.grid.dtype)
+        masks[in_bounds] = self.grid[rows[in_bounds], cols[in_bounds]]
+        return masks
+
+
+    def lookup(self, lat:float, lon:float) -> str:
+        """Return the terrain string at a point, in the same format as fetch_terrain."""
+        return self._terrain_for_mask(int(self.lookup_masks([lat], [lon])[0]))
+
+
+    def lookup_many(self, points:list[tuple[float, float]]) -> list[str]:
+        """Return the terrain string at each point."""
+        if not len(points):
+            return []
+        coords:np.ndarray = np.asarray(points, dtype=np.float64)
+        return [self._terrain_for_mask(int(mask)) for mask in self.lookup_masks(coords[:, 0], coords[:, 1])]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the offline terrain index from a GeoJSON land use extract.')
+    parser.add_argument('geojson', help='GeoJSON FeatureCollection of landuse/natural polygons')
+    parser.add_argument('--out', default='terrain_index', help='path prefix of the index files')
+    parser.add_argument('--resolution', type=float, default=100.0, help='cell size in meters')
+    parser.add_argument('--radius', type=float, default=100.0, help='search radius in meters')
+    args = parser.parse_args()
+
+    build_index(args.geojson, args.out, args.resolution, args.radius)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The API modules are imported by name, as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing main sets up the caches; keep the tests off the persistent ones and the recorder
+os.environ.update({'TERRAIN_CACHE_ENABLED': '0', 'SHARED_CACHE_ENABLED': '0', 'PRELOAD_IMPORTS': '0', 'REPLAY_MODE': ''})
@@ -0,0 +1,23 @@
+import gpt_utils
+
+
+def test_completions_are_cached_per_api_key(monkeypatch):
+    calls:list[str] = []
+
+    def complete(prompt, api_key, model, max_tokens):
+        calls.append(api_key)
+        return f'plan for {api_key}'
+
+    monkeypatch.setattr(gpt_utils, '_complete', complete)
+    gpt_utils.response_cache.clear()
+
+    assert gpt_utils.get_chatgpt_response('prompt', 'key-a', 'model') == 'plan for key-a'
+    assert gpt_utils.get_chatgpt_response('prompt', 'key-b', 'model') == 'plan for key-b'
+    assert gpt_utils.get_chatgpt_response('prompt', 'key-a', 'model') == 'plan for key-a'
+    assert calls == ['key-a', 'key-b']
+
+
+def test_response_key_doesnt_contain_the_api_key():
+    key:str = gpt_utils.response_key('prompt', 'model', 700, 'sk-secret')
+    assert 'sk-secret' not in key
+    assert key != gpt_utils.response_key('prompt', 'model', 700, 'sk-other')
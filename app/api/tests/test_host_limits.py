@@ -0,0 +1,80 @@
+import multiprocessing
+import time
+
+import pytest
+
+from http_client import HostState, SharedHostLimits
+
+
+def run_worker(limits:SharedHostLimits, limit:int, interval:float, hold:float, requests:int, results):
+    """A server worker: its own HostState over the shared limits, sending requests that take hold seconds."""
+    host:HostState = HostState('upstream', limit, interval, limits)
+    for _ in range(requests):
+        host.wait_for_slot()
+        with host.slot():
+            start:float = time.time()
+            time.sleep(hold)
+            results.put((start, time.time()))
+
+
+def run_workers(path:str, workers:int, limit:int, interval:float, hold:float, requests:int) -> list[tuple[float, float]]:
+    """(start, end) of every request sent by workers forked processes, in start order."""
+    # Opened before forking, as the server does, so each worker reconnects to a set-up file
+    limits:SharedHostLimits = SharedHostLimits(path)
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=run_worker, args=(limits, limit, interval, hold, requests, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    spans:list[tuple[float, float]] = [results.get(timeout=30) for _ in range(workers * requests)]
+    for process in processes:
+        process.join(timeout=30)
+    return sorted(spans)
+
+
+def reserve_slots(limits:SharedHostLimits, interval:float, requests:int, results):
+    """A server worker reserving the start times of its requests to a host."""
+    for _ in range(requests):
+        results.put(limits.reserve('upstream', interval))
+
+
+def test_interval_holds_across_workers(tmp_path):
+    limits:SharedHostLimits = SharedHostLimits(str(tmp_path / 'shared.sqlite'))
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=reserve_slots, args=(limits, 0.1, 5, results)) for _ in range(3)]
+    for process in processes:
+        process.start()
+    slots:list[float] = sorted(results.get(timeout=30) for _ in range(15))
+    for process in processes:
+        process.join(timeout=30)
+
+    assert min(b - a for a, b in zip(slots, slots[1:])) >= 0.1 - 1e-6
+
+
+def test_wait_for_slot_waits_for_the_reserved_slot(tmp_path):
+    host:HostState = HostState('upstream', 1, 0.1, SharedHostLimits(str(tmp_path / 'shared.sqlite')))
+    started:float = time.time()
+    for _ in range(3):
+        host.wait_for_slot()
+    assert time.time() - started >= 0.2
+
+
+@pytest.mark.parametrize('limit', [1, 2])
+def test_concurrency_limit_holds_across_workers(tmp_path, limit):
+    spans = run_workers(str(tmp_path / 'shared.sqlite'), workers=4, limit=limit, interval=0.0, hold=0.05, requests=3)
+    events:list[tuple[float, int]] = sorted([(start, 1) for start, _ in spans] + [(end, -1) for _, end in spans])
+    in_flight:int = 0
+    most:int = 0
+    for _, change in events:
+        in_flight += change
+        most = max(most, in_flight)
+    assert most == limit
+
+
+def test_expired_leases_are_freed(tmp_path):
+    limits:SharedHostLimits = SharedHostLimits(str(tmp_path / 'shared.sqlite'), lease_ttl=0.05)
+    assert limits.try_acquire('upstream', 1) is not None
+    assert limits.try_acquire('upstream', 1) is None
+    time.sleep(0.1)
+    assert limits.try_acquire('upstream', 1) is not None
@@ -0,0 +1,47 @@
+import requests
+
+from http_client import HttpClient
+
+
+class StubResponse(requests.Response):
+    """A response that forgets its headers once closed, like one whose connection went back to the pool."""
+
+    def __init__(self, status:int, headers:dict|None=None):
+        super().__init__()
+        self.status_code = status
+        self.headers.update(headers or {})
+        self.closed:bool = False
+
+
+    def close(self):
+        self.closed = True
+        self.headers.clear()
+
+
+def test_retried_responses_are_closed(monkeypatch):
+    responses:list[StubResponse] = [StubResponse(503, {'Retry-After': '0'}), StubResponse(429), StubResponse(200)]
+    pending:list[StubResponse] = list(responses)
+    client:HttpClient = HttpClient(max_retries=3, backoff=0.0)
+    monkeypatch.setattr(client, '_send', lambda method, url, kwargs: pending.pop(0))
+
+    # Retry-After has to be read before the response is closed
+    retry_after:list[str|None] = []
+    retry_delay = client._retry_delay
+    def spy(attempt, response):
+        retry_after.append(response.headers.get('Retry-After'))
+        return retry_delay(attempt, response)
+    monkeypatch.setattr(client, '_retry_delay', spy)
+
+    final:requests.Response = client.get('http://upstream.test/')
+
+    assert final is responses[-1] and not final.closed
+    assert [response.closed for response in responses[:-1]] == [True, True]
+    assert retry_after == ['0', None]
+
+
+def test_last_attempt_is_returned_open(monkeypatch):
+    client:HttpClient = HttpClient(max_retries=1, backoff=0.0)
+    monkeypatch.setattr(client, '_send', lambda method, url, kwargs: StubResponse(503))
+
+    final:requests.Response = client.get('http://upstream.test/')
+    assert final.status_code == 503 and not final.closed
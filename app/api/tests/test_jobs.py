@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from jobs import JobManager, JobQueueFull, parse_priority
+
+
+class StubRunner:
+    """A job handler that records the order jobs ran in; the job 'block' holds its worker until released."""
+
+    def __init__(self):
+        self.ran:list[str] = []
+        self.started:threading.Event = threading.Event()
+        self.release:threading.Event = threading.Event()
+
+
+    def __call__(self, payload:str):
+        if payload == 'block':
+            self.started.set()
+            self.release.wait(5)
+        elif payload == 'fail':
+            raise RuntimeError('failed on purpose')
+        self.ran.append(payload)
+        return payload.upper()
+
+
+def busy_manager(runner:StubRunner, **kwargs) -> JobManager:
+    """A single worker manager whose worker is busy, so submitted jobs stay queued."""
+    manager:JobManager = JobManager(runner, workers=1, **kwargs)
+    manager.submit('block')
+    assert runner.started.wait(5)
+    return manager
+
+
+def wait_done(manager:JobManager, job_ids:list[str]):
+    deadline:float = time.time() + 5
+    while any(manager.get(job_id)['status'] in ('queued', 'running') for job_id in job_ids):
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_jobs_run_by_priority_then_submission_order():
+    runner:StubRunner = StubRunner()
+    manager:JobManager = busy_manager(runner)
+
+    submitted:list[tuple[str, int]] = [('low', 2), ('normal-1', 1), ('high', 0), ('normal-2', 1), ('high-2', 0)]
+    job_ids:list[str] = [manager.submit(payload, priority) for payload, priority in submitted]
+    runner.release.set()
+    wait_done(manager, job_ids)
+
+    assert runner.ran == ['block', 'high', 'high-2', 'normal-1', 'normal-2', 'low']
+    assert [manager.get(job_id)['result'] for job_id in job_ids] == ['LOW', 'NORMAL-1', 'HIGH', 'NORMAL-2', 'HIGH-2']
+
+
+def test_queue_full_at_the_configured_depth():
+    runner:StubRunner = StubRunner()
+    manager:JobManager = busy_manager(runner, max_queue=3)
+
+    job_ids:list[str] = [manager.submit(str(i)) for i in range(3)]
+    with pytest.raises(JobQueueFull):
+        manager.submit('one too many')
+    assert manager.stats()['rejected'] == 1 and manager.stats()['queued'] == 3
+
+    # Room again once the queue drains
+    runner.release.set()
+    wait_done(manager, job_ids)
+    wait_done(manager, [manager.submit('after')])
+    assert runner.ran == ['block', '0', '1', '2', 'after']
+
+
+def test_results_expire():
+    runner:StubRunner = StubRunner()
+    runner.release.set()
+    manager:JobManager = JobManager(runner, workers=1, result_ttl=0.2)
+
+    done_id:str = manager.submit('done')
+    failed_id:str = manager.submit('fail')
+    wait_done(manager, [done_id, failed_id])
+    assert manager.get(done_id)['result'] == 'DONE'
+    assert manager.get(failed_id)['status'] == 'failed' and manager.get(failed_id)['error'] == 'failed on purpose'
+
+    time.sleep(0.3)
+    assert manager.get(done_id) is None and manager.get(failed_id) is None
+
+
+def test_oldest_results_are_evicted_past_max_results():
+    runner:StubRunner = StubRunner()
+    runner.release.set()
+    manager:JobManager = JobManager(runner, workers=1, max_results=2)
+
+    job_ids:list[str] = [manager.submit(str(i)) for i in range(3)]
+    wait_done(manager, job_ids[1:])
+    assert manager.get(job_ids[0]) is None
+
+
+@pytest.mark.parametrize('value, expected', [('high', 0), ('normal', 1), ('low', 2), ('0', 0), ('2', 2), (1, 1)])
+def test_parse_priority(value, expected):
+    assert parse_priority(value) == expected
+
+
+@pytest.mark.parametrize('value', ['-1000000', '-1', '3', '1.5', 'urgent', '', None])
+def test_parse_priority_rejects_values_outside_the_named_range(value):
+    with pytest.raises(ValueError):
+        parse_priority(value)
@@ -0,0 +1,84 @@
+import json
+import re
+
+import requests
+
+import config
+import terrain
+
+
+def way(**tags) -> dict:
+    return {'type': 'way', 'tags': tags}
+
+
+def marker(idx:int) -> dict:
+    # What Overpass returns for `make sample idx=N;out;`
+    return {'type': 'sample', 'id': 1, 'tags': {'idx': str(idx)}}
+
+
+def test_elements_are_attributed_to_their_point():
+    elements:list[dict] = [
+        way(natural='water'), marker(0),
+        way(landuse='forest'), way(landuse='residential'), marker(1),
+        marker(2),                                     # Nothing around the point
+        way(natural='wood'), marker(3),
+        marker(4)                                      # Empty trailing section
+    ]
+    per_point = terrain.split_batch_response(elements, 5)
+
+    assert [len(elements) for elements in per_point] == [1, 2, 0, 1, 0]
+    assert [terrain.terrain_from_elements(elements) for elements in per_point] == ['water', 'forest, urban', 'Unknown', 'forest', 'Unknown']
+
+
+def test_truncated_response_leaves_trailing_points_without_terrain():
+    # A response cut short (e.g. by the server timeout) loses the markers of the last points
+    elements:list[dict] = [way(natural='water'), marker(0), way(landuse='forest')]
+    per_point = terrain.split_batch_response(elements, 3)
+
+    assert per_point == [[way(natural='water')], [], []]
+
+
+def test_query_marks_every_point_in_order():
+    query:str = terrain.build_batch_query([(42.0, -72.0), (-33.9, 151.2), (0.0, 179.99)])
+
+    assert re.findall(r'around:100,([-\d.]+),([-\d.]+)', query) == [('42.0', '-72.0'), ('-33.9', '151.2'), ('0.0', '179.99')]
+    assert re.findall(r'make sample idx=(\d+);out;', query) == ['0', '1', '2']
+
+
+class FakeOverpass:
+    """Answers batched queries from a terrain per latitude: water below 0, forest above, nothing at 0."""
+
+    def __init__(self):
+        self.queries:int = 0
+
+
+    def post(self, url:str, data:dict) -> requests.Response:
+        self.queries += 1
+        elements:list[dict] = []
+        for idx, (lat, _) in enumerate(re.findall(r'around:100,([-\d.]+),([-\d.]+)', data['data'])):
+            if float(lat) < 0:
+                elements.append(way(natural='water'))
+            elif float(lat) > 0:
+                elements.append(way(landuse='forest'))
+            elements.append(marker(idx))
+
+        response:requests.Response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({'elements': elements}).encode()
+        return response
+
+
+def test_chunked_lookups_keep_point_order(monkeypatch):
+    overpass:FakeOverpass = FakeOverpass()
+    monkeypatch.setattr(terrain, 'http', overpass)
+    monkeypatch.setattr(terrain, 'terrain_cache', None)
+    monkeypatch.setattr(config, 'TERRAIN_BACKEND', 'overpass')
+    monkeypatch.setattr(config, 'OVERPASS_BATCH_SIZE', 3)
+
+    # Points in distinct cache cells (so none are deduplicated), alternating terrain
+    lats:list[float] = [(-1) ** i * (i + 1) * 0.01 if i % 5 else 0.0 for i in range(11)]
+    points:list[tuple[float, float]] = [(lat, i * 0.01) for i, lat in enumerate(lats)]
+    expected:list[str] = ['Unknown' if lat == 0 else 'water' if lat < 0 else 'forest' for lat in lats]
+
+    assert terrain.fetch_terrain_batch(points) == expected
+    assert overpass.queries == 4
@@ -0,0 +1,127 @@
+import json
+
+import numpy as np
+import pytest
+from flask import Flask
+
+import responses
+from path_encoding import decode_delta, decode_float32, decode_polyline, encode_delta, encode_float32, encode_paths, encode_polyline
+
+
+# Negative latitudes and longitudes, values rounding both ways at the encoders' precision,
+# and a crossing of the antimeridian (a jump of almost 360 degrees between points)
+PATHS:list[list[list[float]]] = [
+    [[-33.8688197, 151.2092955], [-33.870004, 151.2100049], [-33.8700051, 151.2100051]],
+    [[-0.0000049, -0.0000051], [0.0000051, 0.0000049], [-0.0000151, -72.9999949], [-89.999999, -179.999999]],
+    [[64.8377785, 179.9999951], [64.84, -179.9999951], [64.85, -179.5], [64.85, 179.5]],
+    [[42.0, -72.0]]
+]
+
+
+def max_error(decoded, path) -> float:
+    return float(np.max(np.abs(np.asarray(decoded) - np.asarray(path))))
+
+
+def test_polyline_matches_googles_example():
+    assert encode_polyline([(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]) == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+    assert decode_polyline('_p~iF~ps|U_ulLnnqC_mqNvxq`@') == [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+
+
+@pytest.mark.parametrize('path', PATHS)
+@pytest.mark.parametrize('precision', [5, 6])
+def test_polyline_round_trip(path, precision):
+    decoded = decode_polyline(encode_polyline(path, precision), precision)
+    assert len(decoded) == len(path)
+    # Every point is rounded on its own, so the error doesn't accumulate along the path
+    assert max_error(decoded, path) <= 0.5 * 10 ** -precision + 1e-12
+    assert decode_polyline(encode_polyline(decoded, precision), precision) == decoded
+
+
+@pytest.mark.parametrize('path', PATHS)
+def test_delta_round_trip(path):
+    decoded = decode_delta(encode_delta(path, 6), 6)
+    assert len(decoded) == len(path)
+    assert max_error(decoded, path) <= 0.5e-6 + 1e-12
+
+
+@pytest.mark.parametrize('path', PATHS)
+def test_float32_round_trip(path):
+    decoded = decode_float32(encode_float32(path))
+    assert decoded == np.asarray(path, dtype=np.float32).astype(np.float64).tolist()
+    assert max_error(decoded, path) < 1e-5
+
+
+def test_empty_path():
+    assert encode_polyline([]) == '' and decode_polyline('') == []
+    assert encode_delta([]) == [] and decode_delta([]) == []
+
+
+PAYLOAD:dict = {
+    'paths': PATHS[:2],
+    'terrain': {'Path 1': {'path': PATHS[2], 'terrain_counts': {'water': 1}}},
+    'routes': [{'path': PATHS[3], 'cost': 1.5}]
+}
+
+
+@pytest.fixture
+def client():
+    app:Flask = Flask(__name__)
+    app.add_url_rule('/paths', 'paths', lambda: responses.paths_response(PAYLOAD))
+    return app.test_client()
+
+
+def get(client, accept:str|None):
+    return client.get('/paths', headers={'Accept': accept} if accept is not None else {})
+
+
+@pytest.mark.parametrize('accept', [None, '*/*', 'application/json', 'text/html', f'{responses.POLYLINE_JSON};q=0.1, application/json'])
+def test_plain_json_by_default(client, accept):
+    response = get(client, accept)
+    assert response.mimetype == responses.JSON
+    assert response.get_json() == PAYLOAD
+    assert 'Accept' in response.vary
+
+
+def test_polyline_negotiated(client):
+    response = get(client, f'application/json;q=0.5, {responses.POLYLINE_JSON}')
+    body:dict = json.loads(response.data)
+    assert response.mimetype == responses.POLYLINE_JSON and 'Accept' in response.vary
+
+    precision:int = body['path_encoding']['precision']
+    assert body['path_encoding']['format'] == 'polyline'
+    assert body['terrain']['Path 1']['terrain_counts'] == {'water': 1} and body['routes'][0]['cost'] == 1.5
+    decoded = [decode_polyline(p, precision) for p in body['paths']] + [decode_polyline(body['terrain']['Path 1']['path'], precision)]
+    for path, original in zip(decoded, PATHS):
+        assert max_error(path, original) <= 0.5 * 10 ** -precision + 1e-12
+
+
+def test_delta_negotiated(client):
+    response = get(client, responses.DELTA_JSON)
+    body:dict = json.loads(response.data)
+    assert response.mimetype == responses.DELTA_JSON
+
+    precision:int = body['path_encoding']['precision']
+    assert body['path_encoding']['format'] == 'delta'
+    assert max_error(decode_delta(body['routes'][0]['path'], precision), PATHS[3]) <= 0.5 * 10 ** -precision + 1e-12
+
+
+@pytest.mark.skipif(not responses.MSGPACK_AVAILABLE, reason='msgpack is not installed')
+@pytest.mark.parametrize('accept', [responses.MSGPACK, responses.MSGPACK_LEGACY])
+def test_msgpack_negotiated(client, accept):
+    import msgpack
+
+    response = get(client, accept)
+    body:dict = msgpack.unpackb(response.data, raw=False)
+    assert response.mimetype == accept and body['path_encoding'] == {'format': 'float32'}
+    assert decode_float32(body['paths'][0]) == decode_float32(encode_float32(PATHS[0]))
+
+
+@pytest.mark.skipif(responses.MSGPACK_AVAILABLE, reason='msgpack is installed')
+def test_msgpack_falls_back_to_json_without_msgpack(client):
+    response = get(client, f'{responses.MSGPACK}, application/json;q=0.1')
+    assert response.mimetype == responses.JSON and response.get_json() == PAYLOAD
+
+
+def test_only_paths_are_encoded():
+    encoded:dict = encode_paths({'path': [[1.0, 2.0]], 'paths': [[[3.0, 4.0]], 'x'], 'center': [1.0, 2.0], 'path_count': 2}, lambda path: 'encoded')
+    assert encoded == {'path': 'encoded', 'paths': ['encoded', 'x'], 'center': [1.0, 2.0], 'path_count': 2}
@@ -0,0 +1,88 @@
+import math
+
+import numpy as np
+import pytest
+
+from path_model import CostTable, get_top_5_combinations, get_top_5_combinations_many, top_k_combinations
+
+
+# Small integer costs, so many combinations tie
+COST_MATRIX:dict = {
+    'Forest': {'truck': '2', 'quad': '1', 'boat': 'inf', 'walker': '1'},
+    'Water': {'truck': 'inf', 'quad': 'inf', 'boat': '1', 'walker': '3'},
+    'Urban': {'truck': '1', 'quad': '1', 'boat': 'inf', 'walker': '2'},
+    'Sand': {'truck': '3', 'quad': '2', 'boat': 'inf'}   # No walker entry: impossible
+}
+VEHICLES:list[str] = ['truck', 'quad', 'boat', 'walker']
+
+
+def reference_top_5(terrain_data:dict, cost_matrix:dict, vehicles:list[str]) -> dict:
+    """The per-combination loop scoring replaced, with a stable sort on (cost, vehicle-major order)."""
+    combinations:list[tuple[str, str, float]] = []
+    for vehicle in vehicles:
+        for path, details in terrain_data.items():
+            total:float = 0.0
+            for terrain, count in details['terrain_counts'].items():
+                costs:dict|None = cost_matrix.get(terrain.capitalize())
+                if costs is None or count <= 0:
+                    continue
+                total += float(costs.get(vehicle, 'inf')) * count
+            combinations.append((path, vehicle, total if math.isfinite(total) else math.nan))
+
+    combinations.sort(key=lambda c: (math.isnan(c[2]), 0.0 if math.isnan(c[2]) else c[2]))
+    top:dict = {}
+    for path, vehicle, cost in combinations[:5]:
+        top.setdefault(path, {})[vehicle] = cost
+    return top
+
+
+def ordered(top:dict) -> list:
+    """A top five in its order, with NaN costs made comparable."""
+    return [(path, [(vehicle, None if math.isnan(cost) else cost) for vehicle, cost in costs.items()]) for path, costs in top.items()]
+
+
+def random_terrain_data(rng:np.random.Generator, num_paths:int) -> dict:
+    terrains:list[str] = ['forest', 'water', 'urban', 'sand', 'swamp']   # Swamp isn't in the table
+    return {
+        f'Path {i + 1}': {'terrain_counts': {t: int(c) for t, c in zip(terrains, rng.integers(0, 3, len(terrains))) if c > 0 or rng.random() < 0.2}}
+        for i in range(num_paths)
+    }
+
+
+def test_fixed_table_with_ties():
+    terrain_data:dict = {
+        'Path 1': {'terrain_counts': {'forest': 2}},              # truck 4, quad 2, walker 2
+        'Path 2': {'terrain_counts': {'urban': 2}},               # truck 2, quad 2, walker 4
+        'Path 3': {'terrain_counts': {'forest': 1, 'urban': 1}},  # truck 3, quad 2, walker 3
+        'Path 4': {'terrain_counts': {'water': 2}}                # boat 2, walker 6
+    }
+    top:dict = get_top_5_combinations(terrain_data, CostTable(COST_MATRIX), VEHICLES)
+
+    # Six combinations cost 2; the first five in vehicle-major order make it
+    assert ordered(top) == ordered({'Path 2': {'truck': 2.0, 'quad': 2.0}, 'Path 1': {'quad': 2.0}, 'Path 3': {'quad': 2.0}, 'Path 4': {'boat': 2.0}})
+    assert ordered(top) == ordered(reference_top_5(terrain_data, COST_MATRIX, VEHICLES))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_reference(seed):
+    rng:np.random.Generator = np.random.default_rng(seed)
+    terrain_data:dict = random_terrain_data(rng, int(rng.integers(1, 8)))
+    vehicles:list[str] = [v for v in VEHICLES if rng.random() < 0.8] or ['truck']
+
+    expected:dict = reference_top_5(terrain_data, COST_MATRIX, vehicles)
+    assert ordered(get_top_5_combinations(terrain_data, COST_MATRIX, vehicles)) == ordered(expected)
+    assert ordered(get_top_5_combinations_many([terrain_data], CostTable(COST_MATRIX), [vehicles])[0]) == ordered(expected)
+
+
+def test_ties_at_the_cut_are_deterministic():
+    # Every candidate costs the same, so the top k is the first k in vehicle-major order
+    scores:np.ndarray = np.ones((50, 4))
+    expected:list[tuple[int, int]] = [(p, 0) for p in range(5)]
+    for _ in range(5):
+        assert top_k_combinations(scores, 5) == expected
+
+
+def test_impossible_combinations_rank_last():
+    scores:np.ndarray = np.array([[np.nan, 3.0], [1.0, np.nan]])
+    assert top_k_combinations(scores, 4) == [(1, 0), (0, 1), (0, 0), (1, 1)]
+    assert top_k_combinations(scores, 3) == [(1, 0), (0, 1), (0, 0)]
@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+import config
+import country
+import replay
+import terrain
+from caching import LRUCache, SQLiteCache, TieredCache
+from terrain_cache import TerrainCache
+
+
+PARIS:tuple[float, float] = (48.85, 2.35)
+POINTS:list[tuple[float, float]] = [(1.0, 1.0), (2.0, 2.0)]
+
+
+@pytest.fixture
+def caches(tmp_path, monkeypatch) -> dict:
+    """Persistent terrain and country caches on temporary files, seeded with stale entries, and upstreams answering 'water'."""
+    terrain_cache:TerrainCache = TerrainCache(str(tmp_path / 'terrain.sqlite'))
+    country_cache:TieredCache = TieredCache(LRUCache(), SQLiteCache(str(tmp_path / 'shared.sqlite'), 'countries'))
+    terrain_cache.set(*POINTS[0], 'stale')
+    country_cache.set(PARIS, 'Atlantis')
+
+    monkeypatch.setattr(terrain, 'terrain_cache', terrain_cache)
+    monkeypatch.setattr(country, 'country_cache', country_cache)
+    monkeypatch.setattr(terrain, 'fetch_terrain_chunk', lambda points: ['water'] * len(points))
+    monkeypatch.setattr(terrain, 'fetch_terrain_uncached', lambda lat, lon: 'water')
+    monkeypatch.setattr(config, 'TERRAIN_BACKEND', 'overpass')
+    monkeypatch.setattr(config, 'COUNTRY_BACKEND', 'offline')
+    monkeypatch.setattr(config, 'REPLAY_DIR', str(tmp_path / 'replays'))
+    return {'terrain': terrain_cache, 'country': country_cache, 'dir': tmp_path}
+
+
+def contents(caches:dict) -> dict:
+    """Everything stored in both tiers of both caches, read from the files as another process would."""
+    with sqlite3.connect(caches['dir'] / 'terrain.sqlite') as db:
+        terrain_rows:list = sorted(db.execute('SELECT cell, terrain FROM terrain').fetchall())
+    with sqlite3.connect(caches['dir'] / 'shared.sqlite') as db:
+        country_rows:list = sorted(db.execute('SELECT key, value FROM countries').fetchall())
+    return {
+        'terrain': terrain_rows,
+        'terrain_memory': len(caches['terrain'].memory),
+        'country': country_rows,
+        'country_memory': len(caches['country'].memory)
+    }
+
+
+def look_up_everything() -> tuple:
+    return terrain.fetch_terrain_batch(POINTS), terrain.fetch_terrain(3.0, 3.0), country.get_country_from_coords(*PARIS)
+
+
+def test_recording_leaves_caches_untouched(caches, monkeypatch):
+    monkeypatch.setattr(config, 'REPLAY_MODE', 'record')
+    before:dict = contents(caches)
+
+    with replay.session({'seed': 1}) as tape:
+        assert tape is not None and not tape.replaying
+        # The stale entries aren't read either, so the recording holds what the upstreams answered
+        assert look_up_everything() == (['water', 'water'], 'water', 'France')
+
+    assert contents(caches) == before
+
+
+def test_replaying_leaves_caches_untouched(caches):
+    before:dict = contents(caches)
+
+    with replay.use(replay.Tape('replay', {'seed': 1}, latency='zero')), replay.session({'seed': 1}) as tape:
+        assert tape.replaying
+        assert look_up_everything() == (['water', 'water'], 'water', 'France')
+
+    assert contents(caches) == before
+
+
+def test_live_requests_use_the_caches(caches):
+    before:dict = contents(caches)
+
+    assert look_up_everything() == (['stale', 'water'], 'water', 'Atlantis')
+
+    after:dict = contents(caches)
+    assert len(after['terrain']) == len(before['terrain']) + 2
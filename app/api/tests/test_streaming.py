@@ -0,0 +1,67 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+from gevent.pywsgi import WSGIServer
+
+import main
+
+
+PLANNING_SECONDS:float = 1.0
+
+
+@pytest.fixture(scope='module')
+def base_url() -> str:
+    """The app on a gevent server of its own thread (and hub), as a server worker runs it."""
+    started:threading.Event = threading.Event()
+    address:dict = {}
+
+    def serve():
+        server:WSGIServer = WSGIServer(('127.0.0.1', 0), main.app, log=None)
+        server.start()
+        address['port'] = server.server_port
+        started.set()
+        server.serve_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    started.wait(10)
+    return f'http://127.0.0.1:{address["port"]}'
+
+
+@pytest.fixture
+def slow_planning(monkeypatch):
+    """Planning that holds its worker thread for PLANNING_SECONDS and then fails."""
+    def selected_vehicles(data):
+        time.sleep(PLANNING_SECONDS)
+        raise RuntimeError('planned slowly')
+
+    monkeypatch.setattr(main, 'selected_vehicles', selected_vehicles)
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/api/submit-form/stream', {'data': {'start-lat': '42.0'}}),
+    ('/api/missions/batch', {'json': {'missions': [{'start-lat': 42.0}, {'start-lat': 42.1}]}})
+])
+def test_stream_doesnt_block_other_requests(base_url, slow_planning, path, body):
+    events:list[dict] = []
+
+    def stream():
+        with requests.post(base_url + path, stream=True, timeout=10, **body) as response:
+            events.extend(json.loads(line) for line in response.iter_lines() if line)
+
+    streaming:threading.Thread = threading.Thread(target=stream)
+    started:float = time.perf_counter()
+    streaming.start()
+    time.sleep(0.2)
+
+    # Served while the stream waits for its planning thread
+    response:requests.Response = requests.get(base_url + '/api/get-input-params', timeout=10)
+    answered:float = time.perf_counter() - started
+    streaming.join(10)
+
+    assert response.status_code == 200
+    assert answered < PLANNING_SECONDS / 2
+    assert events == [{'event': 'error', 'data': 'planned slowly'}]
+    assert time.perf_counter() - started >= PLANNING_SECONDS
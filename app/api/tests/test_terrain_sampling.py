@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import terrain
+
+
+# Synthetic terrain: bands of latitude, so the terrain between two points with the same band is that band
+BANDS:list[tuple[float, str]] = [(42.05, 'forest'), (42.1, 'water'), (90.0, 'urban')]
+
+
+def band(lat:float) -> str:
+    return next(name for bound, name in BANDS if lat < bound)
+
+
+@pytest.fixture
+def backend(monkeypatch) -> dict:
+    """Replace the terrain lookups with the latitude bands and count them."""
+    calls:dict = {'points': 0}
+
+    def fetch_terrain_batch(points, stats=None):
+        calls['points'] += len(points)
+        return [band(lat) for lat, lon in points]
+
+    monkeypatch.setattr(terrain, 'fetch_terrain_batch', fetch_terrain_batch)
+    return calls
+
+
+def straight_paths(num_points:int=9) -> list[list[list[float]]]:
+    """Paths heading north across every band boundary, at different longitudes and lengths."""
+    return [
+        np.column_stack((np.linspace(42.0, end_lat, num_points), np.full(num_points, lon))).tolist()
+        for end_lat, lon in ((42.15, -72.0), (42.12, -71.9), (42.08, -71.8))
+    ]
+
+
+def counts(sampled) -> list[dict]:
+    return [dict(terrain.count_terrain_types(terrain.counted_samples(samples))) for samples, _ in sampled]
+
+
+def exposure(paths, sampled) -> list[dict[str, float]]:
+    return [terrain.terrain_exposure_km(km, samples) for km, (samples, _) in zip(terrain.paths_cumulative_km(paths), sampled)]
+
+
+@pytest.mark.parametrize('max_depth', [1, 2, 3])
+def test_adaptive_counts_match_fixed(backend, max_depth):
+    paths = straight_paths()
+
+    fixed = terrain.sample_paths_fixed(paths)
+    fixed_lookups:int = backend['points']
+    adaptive = terrain.sample_paths_adaptive(paths, max_depth=max_depth, min_segment_m=1.0)
+    adaptive_lookups:int = backend['points'] - fixed_lookups
+
+    assert counts(adaptive) == counts(fixed)
+    assert adaptive_lookups < fixed_lookups
+    assert sum(stats['lookups'] for _, stats in adaptive) == adaptive_lookups
+
+
+def test_deeper_levels_refine_km(backend):
+    paths = straight_paths()
+    # Fixed sampling of the same paths with 64 times the points is close to the exact km per band
+    exact = exposure(straight_paths(513), terrain.sample_paths_fixed(straight_paths(513)))
+
+    def error(max_depth:int) -> float:
+        km = exposure(paths, terrain.sample_paths_adaptive(paths, max_depth=max_depth, min_segment_m=1.0))
+        return sum(abs(path_km.get(name, 0.0) - exact_km[name]) for path_km, exact_km in zip(km, exact) for name in exact_km)
+
+    assert error(3) < error(2) < error(1)
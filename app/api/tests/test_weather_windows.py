@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import weather
+
+
+def baseline_best_time_window(time_windows, start_date, end_date, duration_hours, vehicles, strategy, objective):
+    """The brute-force window scan find_best_time_window replaced, on already fetched time windows."""
+    duration = timedelta(hours=duration_hours)
+    window_duration = timedelta(hours=3)
+
+    best_cost = float('inf')
+    best_time_window = None
+    best_vehicle = None
+    best_weather_conditions = None
+
+    for vehicle in vehicles:
+        vehicle_capitalized = vehicle.capitalize()
+        if vehicle_capitalized not in weather.cost_matrix:
+            continue
+
+        for i in range(len(time_windows)):
+            start_time = datetime.strptime(time_windows[i]['interval'], '%Y-%m-%d %H:%M:%S')
+
+            if start_time >= start_date and start_time <= end_date:
+                end_time = start_time + duration
+
+                if end_time <= end_date:
+                    weather_conditions = []
+                    valid = True
+                    current_time = start_time
+
+                    while current_time < end_time:
+                        found_window = False
+                        for time_window in time_windows:
+                            if datetime.strptime(time_window['interval'], '%Y-%m-%d %H:%M:%S') == current_time:
+                                weather_conditions.append(time_window['weather'])
+                                found_window = True
+                                break
+                        if not found_window:
+                            valid = False
+                            break
+                        current_time += window_duration
+
+                    if valid:
+                        avg_cost = weather.evaluate_cost(vehicle_capitalized, weather_conditions, strategy, objective)
+                        if avg_cost < best_cost:
+                            best_cost = avg_cost
+                            best_time_window = start_time.strftime('%Y-%m-%d %H:%M:%S')
+                            best_vehicle = vehicle_capitalized
+                            best_weather_conditions = weather_conditions
+
+    if best_time_window is None and time_windows:
+        best_time_window = time_windows[0]['interval']
+        best_weather_conditions = [time_windows[0]['weather']]
+        best_cost = float('inf')
+
+    return best_time_window, best_vehicle, best_cost, best_weather_conditions
+
+
+FORECAST_START:datetime = datetime(2026, 10, 18, 0, 0)
+
+
+def canned_forecast(seed:int=0) -> list[dict]:
+    """Five days of 3-hourly windows, with a gap, a repeated timestamp and one entry off the 3-hour grid."""
+    rng:np.random.Generator = np.random.default_rng(seed)
+    times:list[datetime] = [FORECAST_START + timedelta(hours=3 * i) for i in range(40) if i not in (13, 14, 27)]
+    times.insert(20, times[19])                                    # Repeated: the first entry wins
+    times.append(FORECAST_START + timedelta(hours=61, minutes=30))  # Off the grid, only a window on its own
+    return [{'interval': t.strftime('%Y-%m-%d %H:%M:%S'), 'weather': str(rng.choice(weather.WEATHER_CONDITIONS))} for t in times]
+
+
+def run_vectorized(monkeypatch, time_windows, *args):
+    monkeypatch.setattr(weather, 'fetch_forecast', lambda api_key, lat, lon: weather.parse_forecast(time_windows))
+    return weather.find_best_time_window('key', 0.0, 0.0, *args)
+
+
+def assert_same(result, expected):
+    (window, vehicle, cost, conditions), (expected_window, expected_vehicle, expected_cost, expected_conditions) = result, expected
+    assert (window, vehicle, conditions) == (expected_window, expected_vehicle, expected_conditions)
+    assert cost == pytest.approx(expected_cost) if np.isfinite(expected_cost) else cost == expected_cost
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('duration_hours', [1, 3, 4, 8, 9, 24, 60])
+@pytest.mark.parametrize('strategy, objective', [('stealth', 'defensive'), ('aggressive', 'infiltrate target')])
+def test_matches_baseline_scan(monkeypatch, seed, duration_hours, strategy, objective):
+    time_windows:list[dict] = canned_forecast(seed)
+    vehicles:list[str] = ['helicopter', 'land vehicle', 'submarine', 'boat']
+    # The end date is past the end of the forecast, so windows running off its end must be rejected
+    args:tuple = (FORECAST_START + timedelta(hours=5), FORECAST_START + timedelta(days=7), duration_hours, vehicles, strategy, objective)
+
+    assert_same(run_vectorized(monkeypatch, time_windows, *args), baseline_best_time_window(time_windows, *args))
+
+
+@pytest.mark.parametrize('end_hours', [12, 47, 48, 121, 200])
+def test_windows_past_the_end_date_or_forecast(monkeypatch, end_hours):
+    time_windows:list[dict] = canned_forecast(1)
+    args:tuple = (FORECAST_START, FORECAST_START + timedelta(hours=end_hours), 12, ['foot', 'boat'], 'stealth', 'capture/extract HVT')
+
+    assert_same(run_vectorized(monkeypatch, time_windows, *args), baseline_best_time_window(time_windows, *args))
+
+
+def test_no_window_fits_falls_back_to_the_first_forecast(monkeypatch):
+    time_windows:list[dict] = canned_forecast(2)
+    args:tuple = (FORECAST_START, FORECAST_START + timedelta(days=30), 200, ['foot'], 'stealth', 'defensive')
+
+    result = run_vectorized(monkeypatch, time_windows, *args)
+    assert_same(result, baseline_best_time_window(time_windows, *args))
+    assert result == (time_windows[0]['interval'], None, float('inf'), [time_windows[0]['weather']])
@@ -1,11 +1,15 @@
-import pandas as pd 
-import numpy as np
-import networkx as nx
+from typing import TYPE_CHECKING
 
+# pandas and networkx are slow to import and only needed to build the graph, so they're imported on first use
+if TYPE_CHECKING:
+    import pandas as pd
+    import networkx as nx
 
-def df_to_graph(df:pd.DataFrame) -> nx.Graph: 
+
+def df_to_graph(df:'pd.DataFrame') -> 'nx.Graph': 
     """Takes in a dataframe with the index as the terrains and columns as vehicles, and the
     values as the edge weights, and constructs a graph to match this format."""
+    import networkx as nx
 
     # Init a new graph
     G:nx.Graph = nx.Graph()
@@ -1,10 +1,32 @@
 import requests
 import json
-from datetime import datetime, timedelta
+import os
+import time
+import numpy as np
 
-# Load API key from JSON file
-with open('weather_api.json', 'r') as file:
-    api_key = json.load(file)['api_key']
+import config
+from caching import LRUCache, SingleFlight, shareable
+from http_client import http
+import replay
+
+
+def load_api_key() -> str:
+    """Load the OpenWeather API key from the environment, or else from weather_api.json."""
+    if config.OPENWEATHER_API_KEY:
+        return config.OPENWEATHER_API_KEY
+
+    with open(os.path.join(config.APP_DIR, 'weather_api.json'), 'r') as file:
+        return json.load(file)['api_key']
+
+
+# Load API key once at startup
+api_key = load_api_key()
+
+# Parsed forecasts keyed on rounded coordinates, and the fetches currently in flight
+forecast_cache = shareable(
+    LRUCache(config.WEATHER_CACHE_ENTRIES), 'forecasts', config.SHARED_CACHE_ENABLED, config.SHARED_CACHE_PATH, config.SHARED_CACHE_ENTRIES
+)
+forecast_fetches = SingleFlight()
 
 # Revised cost matrix with refined values
 cost_matrix = {
@@ -14,6 +36,9 @@ cost_matrix = {
     "Foot": {"rain": 9, "clouds": 7, "clear": 5, "fog": 14}
 }
 
+# Weather conditions considered, in the column order of the vectorized cost tables
+WEATHER_CONDITIONS = ['rain', 'clouds', 'clear', 'fog']
+
 # Strategy and objective cost modifiers with more impact for adjustments
 strategy_modifier = {
     "aggressive": {"defensive": 2, "capture/extract HVT": 5, "infiltrate target": 6},
@@ -21,9 +46,12 @@ strategy_modifier = {
 }
 
 def fetch_weather(api_key, lat, lon):
-    url = f'https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={api_key}'
-    response = requests.get(url)
-    
+    try:
+        response = http.get(config.OPENWEATHER_URL, params={'lat': lat, 'lon': lon, 'appid': api_key})
+    except requests.RequestException as e:
+        print(f"Error fetching weather data: {e}")
+        return {'time_windows': []}
+
     if response.status_code != 200:
         print(f"Error fetching weather data: {response.status_code}")
         return {'time_windows': []}
@@ -34,7 +62,7 @@ def fetch_weather(api_key, lat, lon):
     for entry in weather_data['list']:
         date_time = entry['dt_txt']
         weather_main = entry['weather'][0]['main'].lower()
-        if weather_main in ['rain', 'clouds', 'clear', 'fog']:
+        if weather_main in WEATHER_CONDITIONS:
             time_windows.append({
                 'interval': date_time,
                 'weather': weather_main
@@ -64,66 +92,187 @@ def evaluate_cost(vehicle, weather_conditions, strategy, objective):
             avg_base_cost *= 1.1  # Slightly higher cost due to reduced visibility from clouds    
     return avg_base_cost + strategy_cost
 
+def parse_forecast(time_windows:list[dict]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Parse forecast time windows once into compact arrays.
+
+    Args:
+        time_windows (list[dict]): the 'time_windows' returned by fetch_weather.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: datetime64[s] timestamps and the index of each window's
+            weather in WEATHER_CONDITIONS.
+    """
+    timestamps:np.ndarray = np.array([w['interval'] for w in time_windows], dtype='datetime64[s]')
+    codes:np.ndarray = np.array([WEATHER_CONDITIONS.index(w['weather']) for w in time_windows], dtype=np.int8)
+    return timestamps, codes
+
+
+def fetch_forecast(api_key, lat, lon) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fetch and parse the forecast for a location, sharing it between nearby and concurrent requests.
+
+    Forecasts are cached on coordinates rounded to config.WEATHER_CACHE_DECIMALS until the next
+    forecast issuance (every config.WEATHER_FORECAST_INTERVAL seconds), and concurrent requests
+    for the same cell wait for a single upstream fetch. Recorded and replayed requests (see
+    replay.py) always fetch, so their archive holds the forecast they used.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: the forecast as returned by parse_forecast.
+    """
+    if replay.active():
+        return parse_forecast(fetch_weather(api_key, lat, lon)['time_windows'])
+
+    key = (round(float(lat), config.WEATHER_CACHE_DECIMALS), round(float(lon), config.WEATHER_CACHE_DECIMALS))
+
+    forecast = forecast_cache.get(key)
+    if forecast is not None:
+        return forecast
+
+    def fetch():
+        forecast = parse_forecast(fetch_weather(api_key, lat, lon)['time_windows'])
+
+        # Failed fetches come back empty; don't cache them so the next request retries
+        if len(forecast[0]):
+            interval = config.WEATHER_FORECAST_INTERVAL
+            forecast_cache.set(key, forecast, ttl=interval - time.time() % interval)
+        return forecast
+
+    return forecast_fetches.do(key, fetch)
+
+
+def forecast_interval(timestamp:np.datetime64) -> str:
+    """Format a forecast timestamp like OpenWeather's dt_txt ('%Y-%m-%d %H:%M:%S')."""
+    return np.datetime_as_string(timestamp, unit='s').replace('T', ' ')
+
+
+def window_costs(timestamps:np.ndarray, codes:np.ndarray, steps:int, vehicle_costs:np.ndarray, strategy:str, objective:str) -> np.ndarray:
+    """
+    Cost of a window of `steps` consecutive 3-hour forecasts starting at every forecast entry.
+
+    Forecast entries are laid out on a dense 3-hour slot grid so that per-condition counts of
+    every window come from prefix sums, and a window is valid only if each of its slots has a
+    forecast. The cost is the same as evaluate_cost on the window's conditions.
+
+    Args:
+        timestamps (np.ndarray): datetime64[s] forecast timestamps.
+        codes (np.ndarray): weather condition index of each forecast entry.
+        steps (int): number of 3-hour forecasts in a window.
+        vehicle_costs (np.ndarray): (vehicles x conditions) base costs.
+        strategy (str): mission strategy.
+        objective (str): mission objective.
+
+    Returns:
+        np.ndarray: (vehicles x entries) cost of the window starting at each entry, NaN where the
+            window isn't fully covered by the forecast.
+    """
+    num_conditions:int = len(WEATHER_CONDITIONS)
+    costs:np.ndarray = np.full((vehicle_costs.shape[0], len(timestamps)), np.nan)
+    if steps <= 0 or not len(timestamps):
+        return costs
+
+    seconds:np.ndarray = (timestamps - timestamps.min()).astype(np.int64)
+    window_seconds:int = 3 * 3600
+
+    # Entries not aligned to the same 3-hour grid can never share a window, so handle each phase separately
+    for phase in np.unique(seconds % window_seconds):
+        entries:np.ndarray = np.flatnonzero(seconds % window_seconds == phase)
+        slots:np.ndarray = seconds[entries] // window_seconds
+        slots -= slots.min()
+
+        # Dense slot grid: which slots have a forecast and each slot's condition (first entry wins, like the linear scan)
+        num_slots:int = int(slots.max()) + 1
+        present:np.ndarray = np.zeros(num_slots, dtype=bool)
+        condition_counts:np.ndarray = np.zeros((num_slots, num_conditions), dtype=np.int64)
+        first:np.ndarray = np.unique(slots, return_index=True)[1]
+        present[slots[first]] = True
+        condition_counts[slots[first], codes[entries[first]]] = 1
+
+        # Window sums via prefix sums over the slot grid
+        present_prefix:np.ndarray = np.concatenate(([0], np.cumsum(present)))
+        counts_prefix:np.ndarray = np.vstack((np.zeros(num_conditions, dtype=np.int64), np.cumsum(condition_counts, axis=0)))
+
+        valid:np.ndarray = slots + steps <= num_slots
+        starts:np.ndarray = slots[valid]
+        valid_entries:np.ndarray = entries[valid]
+        covered:np.ndarray = present_prefix[starts + steps] - present_prefix[starts] == steps
+        starts, valid_entries = starts[covered], valid_entries[covered]
+
+        window_counts:np.ndarray = counts_prefix[starts + steps] - counts_prefix[starts]   # (windows x conditions)
+        present_conditions:np.ndarray = window_counts > 0
+
+        with np.errstate(invalid='ignore'):
+            # Keep inf costs out of the product (inf * 0 is NaN) and flag windows containing them separately
+            finite_costs:np.ndarray = np.where(np.isfinite(vehicle_costs), vehicle_costs, 0.0)
+            avg_base_cost:np.ndarray = (window_counts @ finite_costs.T) / steps                      # (windows x vehicles)
+            avg_base_cost[(present_conditions @ ~np.isfinite(vehicle_costs).T) > 0] = np.inf
+
+        rain, clouds, clear = (present_conditions[:, WEATHER_CONDITIONS.index(c)][:, None] for c in ('rain', 'clouds', 'clear'))
+        if strategy == "stealth":
+            avg_base_cost = np.where(rain, avg_base_cost * 0.85, avg_base_cost)
+            avg_base_cost = np.where(clouds, avg_base_cost * 0.90, avg_base_cost)
+            avg_base_cost = np.where(clear, avg_base_cost * 1.2, avg_base_cost)
+        elif strategy == "aggressive":
+            avg_base_cost = np.where(rain, avg_base_cost * 1.15, avg_base_cost)
+            avg_base_cost = np.where(clouds, avg_base_cost * 1.1, avg_base_cost)
+
+        costs[:, valid_entries] = (avg_base_cost + strategy_modifier[strategy].get(objective, 0)).T
+
+    return costs
+
+
 def find_best_time_window(api_key, lat, lon, start_date, end_date, duration_hours, vehicles, strategy, objective):
-    weather_data = fetch_weather(api_key, lat, lon)
+    # Parsed once (and cached) instead of for every candidate window
+    timestamps, codes = fetch_forecast(api_key, lat, lon)
     
-    if not weather_data['time_windows']:
+    if not len(timestamps):
         print("No weather data available.")
         return None, None, float('inf'), None
-    
-    duration = timedelta(hours=duration_hours)
-    window_duration = timedelta(hours=3)  # Each window represents a 3-hour forecast
+
+    duration_seconds = int(round(duration_hours * 3600))
+    duration = np.timedelta64(duration_seconds, 's')
+    steps = -(-duration_seconds // (3 * 3600))  # Each window represents a 3-hour forecast
 
     best_cost = float('inf')
     best_time_window = None
     best_vehicle = None
     best_weather_conditions = None
 
+    known_vehicles = []
     for vehicle in vehicles:
         vehicle_capitalized = vehicle.capitalize()  # Ensure the vehicle name is capitalized to match the cost matrix
         if vehicle_capitalized not in cost_matrix:
             print(f"Vehicle {vehicle_capitalized} not found in cost matrix.")
             continue
+        known_vehicles.append(vehicle_capitalized)
+
+    if known_vehicles:
+        vehicle_costs = np.array([[cost_matrix[v].get(c, float('inf')) for c in WEATHER_CONDITIONS] for v in known_vehicles], dtype=np.float64)
+        costs = window_costs(timestamps, codes, steps, vehicle_costs, strategy, objective)
+
+        # Windows must start and finish within the requested dates
+        in_range = (timestamps >= np.datetime64(start_date)) & (timestamps <= np.datetime64(end_date)) & (timestamps + duration <= np.datetime64(end_date))
+        costs[:, ~in_range] = np.nan
+
+        for v, vehicle_capitalized in enumerate(known_vehicles):
+            candidates = np.flatnonzero(~np.isnan(costs[v]))
+            if not len(candidates):
+                continue
 
-        for i in range(len(weather_data['time_windows'])):
-            start_time = datetime.strptime(weather_data['time_windows'][i]['interval'], '%Y-%m-%d %H:%M:%S')
-
-            if start_time >= start_date and start_time <= end_date:
-                end_time = start_time + duration
-                
-                if end_time <= end_date:
-                    total_cost = 0
-                    weather_conditions = []
-                    valid = True
-                    current_time = start_time
-
-                    while current_time < end_time:
-                        found_window = False
-                        for time_window in weather_data['time_windows']:
-                            window_time = datetime.strptime(time_window['interval'], '%Y-%m-%d %H:%M:%S')
-                            if window_time == current_time:
-                                current_weather = time_window['weather']
-                                weather_conditions.append(current_weather)
-                                found_window = True
-                                break
-                        if not found_window:
-                            valid = False
-                            break
-                        current_time += window_duration
-
-                    if valid:
-                        avg_cost = evaluate_cost(vehicle_capitalized, weather_conditions, strategy, objective)
-                        
-                        if avg_cost < best_cost:
-                            best_cost = avg_cost
-                            best_time_window = start_time.strftime('%Y-%m-%d %H:%M:%S')
-                            best_vehicle = vehicle_capitalized
-                            best_weather_conditions = weather_conditions
+            i = candidates[np.argmin(costs[v, candidates])]
+            if costs[v, i] < best_cost:
+                best_cost = float(costs[v, i])
+                best_time_window = forecast_interval(timestamps[i])
+                best_vehicle = vehicle_capitalized
+                start = timestamps[i]
+                best_weather_conditions = [
+                    WEATHER_CONDITIONS[codes[np.flatnonzero(timestamps == start + np.timedelta64(3 * j, 'h'))[0]]] for j in range(steps)
+                ]
 
     if best_time_window is None:
-        if weather_data['time_windows']:
-            best_time_window = weather_data['time_windows'][0]['interval']
-            best_weather_conditions = [weather_data['time_windows'][0]['weather']]
+        if len(timestamps):
+            best_time_window = forecast_interval(timestamps[0])
+            best_weather_conditions = [WEATHER_CONDITIONS[codes[0]]]
             best_cost = float('inf')
             print("No suitable time window found for the given duration. Using fallback window.")
 